@@ -0,0 +1,79 @@
+"""Benchmark for the analytics export in tools/export_analytics.py.
+
+Fills an in-memory DynamoDB stand-in with generated accounts and runs the
+export against it for each table size, reporting the time taken and the peak
+memory allocated, which should stay flat as the table grows.
+
+Usage: python benchmarks/analytics_export.py [--sizes 1000 10000 50000] [--segments N]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from envelopes import ROOT, add_lambda_to_path
+
+add_lambda_to_path()
+sys.path.insert(0, os.path.join(ROOT, "tools"))
+os.environ.setdefault("DYNAMODB_PERSISTENCE_TABLE_NAME", "benchmark-table")
+
+import persistence
+from export_analytics import export_analytics
+from fakes import InMemoryDynamoDbResource
+from load_test import make_words
+
+
+def fill_table(table, profiles, words_per_list=20):
+    #InMemoryTable, int, int -> None
+    """Store profiles children, two to an account, each practising words from a shared vocabulary
+    and with the marking results of their last few tests.
+    """
+    vocabulary = make_words(500)
+    rng = random.Random(profiles)
+    for child in range(profiles):
+        user_id = "amzn1.ask.account.user{}".format(child // 2)
+        profile_id = "child{}".format(child % 2)
+        words = rng.sample(vocabulary, words_per_list)
+        attempts = rng.randint(0, 10)
+        if child % 2 == 0:
+            table.items[user_id] = {"id": user_id, "version": 1, "attributes": {
+                "profiles": {"child0": {"userName": "Child0"}, "child1": {"userName": "Child1"}},
+                "activeProfile": "child0"}}
+        key = "{}#{}#".format(user_id, profile_id)
+        table.items[key + "words"] = {"id": key + "words", "version": 1, "attributes": {"words": words, "listVersion": 1}}
+        table.items[key + "stats"] = {"id": key + "stats", "version": 1, "attributes": {
+            "wordReport": dict((word, rng.randint(0, attempts)) for word in words),
+            "testAttempts": attempts}}
+        #a marking result of some of the words for each of the last few tests, see utils.record_test_result
+        for test in range(min(attempts, 3)):
+            marked = rng.sample(words, 10)
+            record_key = "{}result#{}#0".format(key, test)
+            table.items[record_key] = {"id": record_key, "version": 1, "attributes": {
+                "time": test, "listVersion": 1, "marked": marked, "missed": marked[:rng.randint(0, 3)]}}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000], help="number of children in the table")
+    parser.add_argument("--segments", type=int, default=4, help="segments scanned at the same time")
+    args = parser.parse_args()
+    print("{:>10} {:>10} {:>10} {:>14}".format("children", "items", "seconds", "peak alloc KB"))
+    for size in args.sizes:
+        resource = InMemoryDynamoDbResource()
+        persistence.configure(resource)
+        table = resource.Table(os.environ["DYNAMODB_PERSISTENCE_TABLE_NAME"])
+        fill_table(table, size)
+        adapter = persistence.DynamoDbPersistenceAdapter(cache=persistence.ItemCache(size=0))
+        #the stand-in indexes its keys on the first scan, which is not part of the export's memory
+        table.scan(Segment=0, TotalSegments=args.segments, Limit=1)
+        with tempfile.TemporaryDirectory() as output:
+            tracemalloc.start()
+            started = time.perf_counter()
+            export_analytics(adapter, output, args.segments)
+            elapsed = time.perf_counter() - started
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        print("{:>10} {:>10} {:>10.2f} {:>14.1f}".format(size, len(table.items), elapsed, peak / 1024.0))
@@ -0,0 +1,61 @@
+"""Benchmark for the bulk word list importer in tools/import_word_lists.py.
+
+Writes a CSV file of generated pupil word lists, with a few rows that should be
+rejected, and imports it into an in-memory DynamoDB stand-in that adds a delay
+to every call and leaves some batched items unprocessed, as a throttled table would.
+
+Usage: python benchmarks/bulk_import.py [--lists N] [--words N] [--workers N]
+                                        [--latency-ms MS] [--max-batch-items N]
+"""
+import argparse
+import csv
+import os
+import sys
+import tempfile
+
+from envelopes import ROOT, add_lambda_to_path
+
+add_lambda_to_path()
+sys.path.insert(0, os.path.join(ROOT, "tools"))
+os.environ.setdefault("DYNAMODB_PERSISTENCE_TABLE_NAME", "benchmark-table")
+
+import persistence
+from fakes import InMemoryDynamoDbResource
+from import_word_lists import import_word_lists
+from load_test import make_words
+
+
+def write_lists(path, lists, words_per_list):
+    #str, int, int -> None
+    """Write lists word lists for pupils in classes of 30, one account per pupil."""
+    words = make_words(words_per_list * 4)
+    with open(path, "w", newline="") as lists_file:
+        writer = csv.writer(lists_file)
+        writer.writerow(["userId", "child", "words"])
+        for pupil in range(lists):
+            start = (pupil // 30) % 4 * words_per_list
+            writer.writerow(["amzn1.ask.account.pupil{}".format(pupil), "Pupil {}".format(pupil),
+                             " ".join(words[start:start + words_per_list])])
+        writer.writerow(["", "No Account", "ship"])
+        writer.writerow(["amzn1.ask.account.pupil0", "Pupil 0", "ship"])
+        writer.writerow(["amzn1.ask.account.extra", "Extra", "sh1p 42"])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--lists", type=int, default=10000, help="number of pupil word lists to import")
+    parser.add_argument("--words", type=int, default=20, help="words in each list")
+    parser.add_argument("--workers", type=int, default=16, help="writes sent at the same time")
+    parser.add_argument("--latency-ms", type=float, default=5, help="delay added to every DynamoDB call")
+    parser.add_argument("--max-batch-items", type=int, default=20, help="items written per BatchWriteItem call, the rest are left unprocessed")
+    args = parser.parse_args()
+    resource = InMemoryDynamoDbResource(max_batch_items=args.max_batch_items, latency=args.latency_ms / 1000.0)
+    persistence.configure(resource)
+    table = resource.Table(os.environ["DYNAMODB_PERSISTENCE_TABLE_NAME"])
+    adapter = persistence.DynamoDbPersistenceAdapter(cache=persistence.ItemCache(size=0))
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "lists.csv")
+        write_lists(path, args.lists, args.words)
+        report = import_word_lists(path, "csv", adapter, args.workers)
+    report.print_summary()
+    print("DynamoDB calls: " + ", ".join("{} {}".format(op, count) for op, count in sorted(table.calls.items())))
@@ -0,0 +1,113 @@
+"""Cold-start benchmark for the skill.
+
+Every sample runs in a fresh Python process so module imports are not cached.
+For each handler it records how long importing ``lambda_function`` takes and
+how long the first request takes to produce a response, using an in-memory
+DynamoDB stand-in so no AWS account is needed.
+
+Usage: python benchmarks/cold_start.py [--runs N]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from envelopes import add_lambda_to_path, build_request
+
+TABLE_NAME = "benchmark-table"
+
+USER_ITEM = {
+    "userName": "Sam",
+    "words": ["ship", "train", "because", "friend", "laugh"],
+    "wordReport": {"ship": 0, "train": 2, "because": 1, "friend": 0, "laugh": 3},
+    "testAttempts": 2,
+}
+
+TEST_SESSION = {
+    "profile": "sam", "listVersion": 1, "nextWordIndex": 1, "numOfWords": 5, "correctAnswers": 0,
+    "pronounciation": "phonetic", "markingResults": {},
+}
+
+#(label, request type, intent name, slots, state)
+SCENARIOS = [
+    ("LaunchRequest", "LaunchRequest", None, None, None),
+    ("GetUsernameIntent", "IntentRequest", "GetUsernameIntent", {"userName": "Sam"}, "ADDUSER"),
+    ("AddSpellingIntent", "IntentRequest", "AddSpellingIntent", {"words": "school"}, None),
+    ("BeginQuizIntent", "IntentRequest", "BeginQuizIntent", None, None),
+    ("TellWordIntent", "IntentRequest", "TellWordIntent", None, "TEST"),
+    ("BeginMarkingIntent", "IntentRequest", "BeginMarkingIntent", None, None),
+    ("TellAnswerIntent", "IntentRequest", "TellAnswerIntent", None, "MARKING"),
+    ("ConfirmWordIntent", "IntentRequest", "ConfirmWordIntent", {"yesNo": "no"}, "MARKING"),
+    ("ChildPractiseReportIntent", "IntentRequest", "ChildPractiseReportIntent", None, None),
+    ("ClearSpellingListIntent", "IntentRequest", "ClearSpellingListIntent", None, None),
+    ("AMAZON.HelpIntent", "IntentRequest", "AMAZON.HelpIntent", None, None),
+    ("AMAZON.StopIntent", "IntentRequest", "AMAZON.StopIntent", None, None),
+    ("SessionEndedRequest", "SessionEndedRequest", None, None, None),
+]
+
+
+def build_event(label):
+    #str -> dict
+    for name, request_type, intent_name, slots, state in SCENARIOS:
+        if name == label:
+            session = dict(TEST_SESSION)
+            if state is not None:
+                session["state"] = state
+            return build_request(request_type, intent_name, slots, session)
+    raise ValueError("Unknown scenario: " + label)
+
+
+def run_child(label):
+    """Measure one cold start inside this (fresh) process and print the result as JSON."""
+    event = build_event(label)
+    start = time.perf_counter()
+    import lambda_function
+    imported = time.perf_counter()
+
+    import persistence
+    from fakes import InMemoryDynamoDbResource, seed_user
+    persistence.configure(InMemoryDynamoDbResource())
+    seed_user(event["context"]["System"]["user"]["userId"], USER_ITEM["userName"], USER_ITEM["words"],
+              USER_ITEM["wordReport"], USER_ITEM["testAttempts"])
+    ready = time.perf_counter()
+
+    lambda_function.lambda_handler(event, None)
+    responded = time.perf_counter()
+    print(json.dumps({
+        "import_ms": (imported - start) * 1000,
+        "first_response_ms": (responded - ready) * 1000,
+        "boto3_loaded": "boto3" in sys.modules,
+    }))
+
+
+def run_parent(runs):
+    here = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ)
+    env["DYNAMODB_PERSISTENCE_TABLE_NAME"] = TABLE_NAME
+    env.setdefault("AWS_DEFAULT_REGION", "eu-west-1")
+    print("{:<28} {:>12} {:>18} {:>8}".format("handler", "import ms", "first response ms", "boto3"))
+    for label, _, _, _, _ in SCENARIOS:
+        samples = []
+        for _ in range(runs):
+            output = subprocess.check_output([sys.executable, __file__, "--child", label], cwd=here, env=env)
+            samples.append(json.loads(output.decode().strip().splitlines()[-1]))
+        print("{:<28} {:>12.1f} {:>18.1f} {:>8}".format(
+            label,
+            statistics.median(s["import_ms"] for s in samples),
+            statistics.median(s["first_response_ms"] for s in samples),
+            "yes" if samples[-1]["boto3_loaded"] else "no"))
+
+
+if __name__ == "__main__":
+    add_lambda_to_path()
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5, help="cold starts to sample per handler")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        run_child(args.child)
+    else:
+        run_parent(args.runs)
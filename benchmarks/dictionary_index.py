@@ -0,0 +1,96 @@
+"""Benchmark of the dictionary index added words are checked against.
+
+Builds an index of generated words of the size of a real dictionary and reports
+its size, how long a fresh process takes to open it and make its first lookup
+(what it adds to the AddSpellingIntent turn of a cold start), and the time taken
+by lookups of words in and not in the index and by near-match suggestions.
+Lookups of random words are timed as well as a few words looked up again and
+again, as the words of a child's list are.
+
+Usage: python benchmarks/dictionary_index.py [--words N] [--lookups N]
+"""
+import argparse
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+
+from envelopes import add_lambda_to_path
+
+add_lambda_to_path()
+
+import dictionary
+
+LETTERS = "etaoinshrdlcumwfgypbvkjxqz"
+
+OPEN_SCRIPT = """
+import sys, time
+sys.path.insert(0, {lambda_path!r})
+started = time.perf_counter()
+import dictionary
+dictionary.configure({path!r})
+"{word}" in dictionary.get_word_index()
+print((time.perf_counter() - started) * 1000)
+"""
+
+
+def make_words(count, seed=1):
+    #int, int -> str list
+    """Return count distinct words of 3 to 10 letters."""
+    rng = random.Random(seed)
+    words = set()
+    while len(words) < count:
+        words.add("".join(rng.choice(LETTERS[:18] if i % 2 else LETTERS) for i in range(rng.randint(3, 10))))
+    return sorted(words, key=lambda word: rng.random())
+
+
+def time_open(path, word):
+    #str, str -> float
+    """Return the milliseconds a new process takes to import dictionary, open the index and look up a word."""
+    lambda_path = os.path.dirname(dictionary.__file__)
+    output = subprocess.check_output([sys.executable, "-c", OPEN_SCRIPT.format(lambda_path=lambda_path, path=path, word=word)])
+    return float(output.decode().strip().splitlines()[-1])
+
+
+def per_call(function, values, repeat=5):
+    #function, list, int -> float
+    """Return the fewest nanoseconds function took per value over repeat runs."""
+    best = min(timeit.repeat(lambda: [function(value) for value in values], number=1, repeat=repeat))
+    return best / len(values) * 1e9
+
+
+def run_benchmark(count, lookups):
+    words = make_words(count)
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, "dictionary.idx")
+        started = time.perf_counter()
+        with open(path, "wb") as index_file:
+            index_file.write(dictionary.build_index(words))
+        build_time = time.perf_counter() - started
+        print("Built an index of {} words ({:.1f} MB) in {:.2f}s".format(count, os.path.getsize(path) / 1e6, build_time))
+        opens = sorted(time_open(path, words[0]) for _ in range(5))
+        print("Import, open and first lookup in a new process: {:.2f} ms (median of 5)".format(opens[2]))
+
+        dictionary.configure(path)
+        index = dictionary.get_word_index()
+        rng = random.Random(2)
+        hits = [rng.choice(words) for _ in range(lookups)]
+        misses = [word + "q" for word in hits]
+        contains = index.__contains__
+        print("Lookup of a word in the index:     {:7.0f} ns".format(per_call(contains, hits)))
+        print("  the same 200 words again and again:{:5.0f} ns".format(per_call(contains, hits[:200] * (lookups // 200))))
+        print("Lookup of a word not in the index: {:7.0f} ns".format(per_call(contains, misses)))
+        misspelt = [word[:2] + word[3:] for word in hits[:200]]
+        print("Suggestions for a misspelt word:   {:7.1f} us".format(per_call(index.suggest, misspelt, repeat=3) / 1000))
+        dictionary.configure()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--words", type=int, default=100000, help="words in the index")
+    parser.add_argument("--lookups", type=int, default=100000, help="lookups timed")
+    args = parser.parse_args()
+    run_benchmark(args.words, args.lookups)
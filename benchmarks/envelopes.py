@@ -0,0 +1,98 @@
+"""Builders for Alexa request envelopes used by the offline benchmarks.
+
+The envelopes are plain dicts in the same shape Alexa posts to the skill, so
+they can be passed straight to ``lambda_function.lambda_handler``.
+"""
+import json
+import os
+import sys
+import uuid
+from datetime import datetime, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LAMBDA_DIR = os.path.join(ROOT, "lambda")
+
+INTERACTION_MODEL_PATH = os.path.join(ROOT, "en-Gb.json")
+
+#Spoken values used for built-in slot types that have no values in the interaction model
+BUILT_IN_SLOT_VALUES = {
+    "AMAZON.FirstName": "Sam",
+    "AMAZON.CreativeWorkType": "ship train because",
+}
+
+APPLICATION_ID = "amzn1.ask.skill.benchmark"
+DEFAULT_USER_ID = "amzn1.ask.account.benchmark"
+
+
+def add_lambda_to_path():
+    """Make the skill modules in lambda/ importable."""
+    if LAMBDA_DIR not in sys.path:
+        sys.path.insert(0, LAMBDA_DIR)
+
+
+def build_request(request_type, intent_name=None, slots=None, session_attributes=None,
+                  user_id=DEFAULT_USER_ID, new_session=False):
+    #str, str, dict, dict, str, bool -> dict
+    """Return a request envelope for the given request type and intent.
+
+    slots maps slot names to their spoken values.
+    """
+    application = {"applicationId": APPLICATION_ID}
+    user = {"userId": user_id}
+    request = {
+        "type": request_type,
+        "requestId": "amzn1.echo-api.request." + str(uuid.uuid4()),
+        "timestamp": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "locale": "en-GB",
+    }
+    if request_type == "IntentRequest":
+        request["intent"] = {
+            "name": intent_name,
+            "confirmationStatus": "NONE",
+            "slots": {
+                name: {"name": name, "value": value, "confirmationStatus": "NONE"}
+                for name, value in (slots or {}).items()
+            },
+        }
+    elif request_type == "SessionEndedRequest":
+        request["reason"] = "USER_INITIATED"
+    return {
+        "version": "1.0",
+        "session": {
+            "new": new_session,
+            "sessionId": "amzn1.echo-api.session.benchmark",
+            "application": application,
+            "attributes": session_attributes or {},
+            "user": user,
+        },
+        "context": {
+            "System": {
+                "application": application,
+                "user": user,
+                "device": {"deviceId": "amzn1.ask.device.benchmark", "supportedInterfaces": {}},
+                "apiEndpoint": "https://api.eu.amazonalexa.com",
+            }
+        },
+        "request": request,
+    }
+
+
+def intent_slot_values(model_path=INTERACTION_MODEL_PATH):
+    #str -> dict
+    """Map every intent in the interaction model to example values for its slots.
+
+    Custom slot types use their first value, built-in types use BUILT_IN_SLOT_VALUES.
+    """
+    with open(model_path) as model_file:
+        language_model = json.load(model_file)["interactionModel"]["languageModel"]
+    type_values = {
+        slot_type["name"]: slot_type["values"][0]["name"]["value"]
+        for slot_type in language_model.get("types", []) if slot_type.get("values")
+    }
+    return {
+        intent["name"]: {
+            slot["name"]: type_values.get(slot["type"], BUILT_IN_SLOT_VALUES.get(slot["type"], "test"))
+            for slot in intent.get("slots", [])
+        }
+        for intent in language_model["intents"]
+    }
@@ -0,0 +1,265 @@
+"""In-memory stand-ins for the AWS resources used by the skill."""
+import bisect
+import copy
+import re
+import time
+import zlib
+
+_CLAUSE = re.compile(r"\b(SET|REMOVE|ADD)\b")
+_NOT_EXISTS = re.compile(r"^attribute_not_exists\((\S+)\)$")
+_LIST_APPEND = re.compile(r"^list_append\((\S+),\s*(:\w+)\)$")
+#commas that are not inside the brackets of a function such as list_append
+_ACTION_SEPARATOR = re.compile(r",(?![^(]*\))")
+_LIST_INDEX = re.compile(r"\[(\d+)\]")
+
+
+class ConditionalCheckFailedException(Exception):
+    """Raised like botocore's ClientError when a write's condition is not met."""
+    def __init__(self):
+        super(ConditionalCheckFailedException, self).__init__("The conditional request failed")
+        self.response = {"Error": {"Code": "ConditionalCheckFailedException", "Message": str(self)}}
+
+
+def _resolve_path(path, names):
+    #str, dict -> list
+    """Split a document path such as '#attr.#s0' or '#attr.#d0[3]' into its attribute names and list indices."""
+    resolved = []
+    for part in path.strip().split("."):
+        name = part.split("[", 1)[0]
+        resolved.append(names.get(name, name))
+        resolved.extend(int(index) for index in _LIST_INDEX.findall(part))
+    return resolved
+
+
+def _parse_update(expression, names):
+    #str, dict -> list
+    """Return (action, path, operand) tuples for a SET/REMOVE/ADD update expression."""
+    actions = []
+    parts = _CLAUSE.split(expression)
+    for keyword, body in zip(parts[1::2], parts[2::2]):
+        for action in _ACTION_SEPARATOR.split(body):
+            action = action.strip()
+            if not action:
+                continue
+            if keyword == "SET":
+                path, operand = action.split("=", 1)
+                match = _LIST_APPEND.match(operand.strip())
+                if match:
+                    actions.append(("APPEND", _resolve_path(path, names), match.group(2)))
+                else:
+                    actions.append(("SET", _resolve_path(path, names), operand.strip()))
+            elif keyword == "REMOVE":
+                actions.append(("REMOVE", _resolve_path(action, names), None))
+            else:
+                path, operand = action.split()
+                actions.append(("ADD", _resolve_path(path, names), operand))
+    return actions
+
+
+def _check_condition(item, expression, names, values):
+    #dict, str, dict, dict -> None
+    """Raise ConditionalCheckFailedException unless item meets a simple condition expression.
+
+    Only the conditions the skill uses are understood: 'attribute_not_exists(path)' and 'path = :value'.
+    """
+    if expression is None:
+        return
+    match = _NOT_EXISTS.match(expression.strip())
+    if match:
+        path, operand = match.group(1), None
+    else:
+        path, operand = [part.strip() for part in expression.split("=", 1)]
+    value = item
+    for name in _resolve_path(path, names):
+        value = value.get(name) if isinstance(value, dict) else None
+    if (operand is None and value is not None) or (operand is not None and value != values[operand]):
+        raise ConditionalCheckFailedException()
+
+
+class InMemoryTable(object):
+    """Minimal DynamoDB Table stand-in that keeps items in a dict."""
+    def __init__(self, name, key_name="id", latency=0):
+        self.name = name
+        self.key_name = key_name
+        self.latency = latency
+        self.items = {}
+        self.calls = {}
+        #(total segments, key count) -> sorted keys of each segment, for scan
+        self._segments = None
+
+    def _count(self, operation):
+        self.calls[operation] = self.calls.get(operation, 0) + 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def get_item(self, Key, ConsistentRead=False):
+        self._count("get_item")
+        item = self.items.get(Key[self.key_name])
+        if item is None:
+            return {}
+        return {"Item": copy.deepcopy(item)}
+
+    def put_item(self, Item, ConditionExpression=None, ExpressionAttributeNames=None,
+                 ExpressionAttributeValues=None):
+        self._count("put_item")
+        _check_condition(self.items.get(Item[self.key_name], {}), ConditionExpression,
+                         ExpressionAttributeNames or {}, ExpressionAttributeValues or {})
+        self.items[Item[self.key_name]] = copy.deepcopy(Item)
+        return {}
+
+    def update_item(self, Key, UpdateExpression, ConditionExpression=None, ExpressionAttributeNames=None,
+                    ExpressionAttributeValues=None, **kwargs):
+        self._count("update_item")
+        names = ExpressionAttributeNames or {}
+        values = ExpressionAttributeValues or {}
+        _check_condition(self.items.get(Key[self.key_name], {}), ConditionExpression, names, values)
+        #changes are made to a copy so a failed update leaves the item as it was
+        item = copy.deepcopy(self.items.get(Key[self.key_name], dict(Key)))
+        actions = _parse_update(UpdateExpression, names)
+        #list indices refer to the list before the update, so the highest are removed first
+        actions.sort(key=lambda action: -action[1][-1] if action[0] == "REMOVE" and isinstance(action[1][-1], int) else 0)
+        for action, path, operand in actions:
+            parent = item
+            for name in path[:-1]:
+                if name not in parent:
+                    raise ValueError("The document path provided in the update expression is invalid for update")
+                parent = parent[name]
+            if action == "SET":
+                parent[path[-1]] = copy.deepcopy(values[operand])
+            elif action == "APPEND":
+                parent[path[-1]] = parent[path[-1]] + copy.deepcopy(values[operand])
+            elif action == "REMOVE" and isinstance(path[-1], int):
+                if path[-1] < len(parent):
+                    del parent[path[-1]]
+            elif action == "REMOVE":
+                parent.pop(path[-1], None)
+            else:
+                parent[path[-1]] = parent.get(path[-1], 0) + values[operand]
+        self.items[Key[self.key_name]] = item
+        return {}
+
+    def scan(self, Segment=0, TotalSegments=1, Limit=100, ExclusiveStartKey=None):
+        """Return a page of the items in one segment, segments are picked by a hash of the key."""
+        self._count("scan")
+        if self._segments is None or self._segments[0] != (TotalSegments, len(self.items)):
+            segments = [[] for _ in range(TotalSegments)]
+            for key in list(self.items):
+                segments[zlib.crc32(key.encode("utf-8")) % TotalSegments].append(key)
+            self._segments = ((TotalSegments, len(self.items)), [sorted(keys) for keys in segments])
+        keys = self._segments[1][Segment]
+        start = 0 if ExclusiveStartKey is None else bisect.bisect_right(keys, ExclusiveStartKey[self.key_name])
+        page = keys[start:start + Limit]
+        response = {"Items": [copy.deepcopy(self.items[key]) for key in page if key in self.items]}
+        if start + Limit < len(keys):
+            response["LastEvaluatedKey"] = {self.key_name: page[-1]}
+        return response
+
+    def delete_item(self, Key):
+        self._count("delete_item")
+        self.items.pop(Key[self.key_name], None)
+        return {}
+
+
+class InMemoryDynamoDbResource(object):
+    """Stand-in for ``boto3.resource('dynamodb')``.
+
+    max_batch_items: int
+        If set, batch_write_item only writes this many items per call and returns the
+        rest as UnprocessedItems, like DynamoDB does when a table is being throttled.
+    latency: float
+        Seconds each call waits before returning, to stand in for the network round trip.
+    """
+    def __init__(self, max_batch_items=None, latency=0):
+        self.tables = {}
+        self.max_batch_items = max_batch_items
+        self.latency = latency
+
+    def batch_write_item(self, RequestItems):
+        unprocessed = {}
+        for name, requests in RequestItems.items():
+            table = self.Table(name)
+            table._count("batch_write_item")
+            if len(requests) > 25:
+                raise ValueError("Too many items requested for the BatchWriteItem call")
+            processed = requests if self.max_batch_items is None else requests[:self.max_batch_items]
+            for request in processed:
+                item = request["PutRequest"]["Item"]
+                table.items[item[table.key_name]] = copy.deepcopy(item)
+            if len(processed) < len(requests):
+                unprocessed[name] = requests[len(processed):]
+        return {"UnprocessedItems": unprocessed}
+
+    def batch_get_item(self, RequestItems):
+        responses = {}
+        for name, request in RequestItems.items():
+            table = self.Table(name)
+            table._count("batch_get_item")
+            if len(request["Keys"]) > 100:
+                raise ValueError("Too many items requested for the BatchGetItem call")
+            responses[name] = [copy.deepcopy(table.items[key[table.key_name]])
+                               for key in request["Keys"] if key[table.key_name] in table.items]
+        return {"Responses": responses, "UnprocessedKeys": {}}
+
+    def Table(self, name):
+        if name not in self.tables:
+            self.tables[name] = InMemoryTable(name, latency=self.latency)
+        return self.tables[name]
+
+
+def seed_user(user_id, user_name, words, word_report, test_attempts):
+    """Store a user with one profile through the skill's persistence adapter.
+
+    persistence.configure must have been called with the resource to seed.
+    """
+    import persistence
+    attributes = persistence.ShardedAttributes(persistence.persistence_adapter, user_id)
+    profile_id = persistence.profile_id_for(user_name)
+    attributes["profiles"] = {profile_id: {"userName": user_name}}
+    attributes["activeProfile"] = profile_id
+    attributes.select_profile(profile_id)
+    attributes["words"] = list(words)
+    attributes["listVersion"] = 1
+    attributes["wordReport"] = dict(word_report)
+    attributes["testAttempts"] = test_attempts
+    persistence.persistence_adapter.save_attributes(None, attributes)
+
+
+class InMemoryS3Client(object):
+    """Minimal stand-in for ``boto3.client('s3')`` that keeps objects in a dict."""
+    def __init__(self):
+        #(bucket, key) -> {"Body": bytes, "ContentType": str, "Metadata": dict}
+        self.objects = {}
+        self.calls = {}
+
+    def _count(self, operation):
+        self.calls[operation] = self.calls.get(operation, 0) + 1
+
+    def put_object(self, Bucket, Key, Body, ContentType=None, Metadata=None):
+        self._count("put_object")
+        self.objects[(Bucket, Key)] = {"Body": bytes(Body), "ContentType": ContentType, "Metadata": dict(Metadata or {})}
+        return {}
+
+    def head_object(self, Bucket, Key):
+        self._count("head_object")
+        if (Bucket, Key) not in self.objects:
+            from botocore.exceptions import ClientError
+            raise ClientError({"Error": {"Code": "404", "Message": "Not Found"}}, "HeadObject")
+        stored = self.objects[(Bucket, Key)]
+        return {"ContentLength": len(stored["Body"]), "ContentType": stored["ContentType"], "Metadata": stored["Metadata"]}
+
+    def generate_presigned_url(self, ClientMethod, Params, ExpiresIn=3600):
+        self._count("generate_presigned_url")
+        return "https://s3.local/{}/{}?X-Amz-Expires={}&X-Amz-Signature={}".format(
+            Params["Bucket"], Params["Key"], ExpiresIn, self.calls["generate_presigned_url"])
+
+
+class InMemoryPollyClient(object):
+    """Stand-in for ``boto3.client('polly')`` that returns the text it was asked to say as the audio."""
+    def __init__(self):
+        self.calls = {}
+
+    def synthesize_speech(self, Text, OutputFormat, VoiceId, TextType="text", SampleRate=None):
+        import io
+        self.calls["synthesize_speech"] = self.calls.get("synthesize_speech", 0) + 1
+        return {"AudioStream": io.BytesIO("{}:{}:{}".format(VoiceId, SampleRate, Text).encode("utf-8")),
+                "ContentType": "audio/mpeg"}
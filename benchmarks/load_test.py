@@ -0,0 +1,266 @@
+"""Offline load test and replay harness for the skill.
+
+Drives ``lambda_function.lambda_handler`` directly with realistic request
+envelopes against an in-memory DynamoDB stand-in and reports, per handler,
+p50/p95/p99 latency, peak memory allocated while handling the request, the
+size of the request envelope and the DynamoDB calls made.
+
+Scripted lessons (launch, add words, quiz, mark, report) are run for each
+word list size so that scaling regressions show up before a release. Every
+intent in en-Gb.json is checked to have a route before anything is run.
+Recorded envelopes (one JSON request per line, see --record) can be replayed
+with --replay.
+
+The skill's per-turn metric lines can be written to a file with --metrics
+and summarised with tools/metrics_report.py. --latency-ms adds a delay to every
+DynamoDB call, e.g. to see how much of a turn is spent waiting for the table.
+
+Usage: python benchmarks/load_test.py [--sizes 5 50 500 5000] [--iterations N]
+                                      [--words-per-pass N] [--record FILE]
+                                      [--replay FILE] [--metrics FILE]
+                                      [--latency-ms MS] [--packed]
+"""
+import argparse
+import itertools
+import json
+import math
+import os
+import time
+import tracemalloc
+
+from envelopes import DEFAULT_USER_ID, INTERACTION_MODEL_PATH, add_lambda_to_path, build_request, intent_slot_values
+
+add_lambda_to_path()
+os.environ.setdefault("DYNAMODB_PERSISTENCE_TABLE_NAME", "benchmark-table")
+os.environ.setdefault("AWS_DEFAULT_REGION", "eu-west-1")
+#the generated practice words are not real words, so they are not checked against the dictionary
+os.environ.setdefault("DICTIONARY_PATH", "")
+
+import lambda_function
+import metrics
+import persistence
+from fakes import InMemoryDynamoDbResource, seed_user
+
+#Session state a handler needs before it will take a request
+STATE_FOR_INTENT = {
+    "GetUsernameIntent": "ADDUSER",
+    "TellWordIntent": "TEST",
+    "TellAnswerIntent": "MARKING",
+    "ConfirmWordIntent": "MARKING",
+}
+
+SYLLABLES = ["ba", "ce", "di", "fo", "gu", "ha", "je", "ki", "lo", "mu", "na", "pe", "ri", "so", "tu", "wa"]
+
+
+def make_words(count):
+    #int -> str list
+    """Return count distinct, pronounceable practice words."""
+    words = []
+    for length in itertools.count(2):
+        for syllables in itertools.product(SYLLABLES, repeat=length):
+            words.append("".join(syllables))
+            if len(words) == count:
+                return words
+
+
+def percentile(samples, percent):
+    #float list, int -> float
+    ordered = sorted(samples)
+    return ordered[max(0, int(math.ceil(percent / 100.0 * len(ordered))) - 1)]
+
+
+class SkillClient(object):
+    """Plays the part of the Alexa service for one user, carrying the session
+    attributes from each response into the next request.
+    """
+    def __init__(self, table, user_id=DEFAULT_USER_ID, trace_allocations=False, recorder=None):
+        self.table = table
+        self.user_id = user_id
+        self.trace_allocations = trace_allocations
+        self.recorder = recorder
+        self.session_attributes = {}
+        self.records = []
+
+    def send(self, request_type, intent_name=None, slots=None, state=None, new_session=False):
+        #str, str, dict, str, bool -> dict
+        """Send one request to the skill and return its response envelope."""
+        if new_session:
+            self.session_attributes = {}
+        if state is not None:
+            self.session_attributes["state"] = state
+        event = build_request(request_type, intent_name, slots, self.session_attributes,
+                              user_id=self.user_id, new_session=new_session)
+        return self.replay(event)
+
+    def replay(self, event):
+        #dict -> dict
+        """Send a prepared request envelope to the skill and record how it went."""
+        if self.recorder is not None:
+            self.recorder.write(json.dumps(event) + "\n")
+        calls_before = dict(self.table.calls)
+        if self.trace_allocations:
+            tracemalloc.reset_peak()
+            allocated_before = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        output = lambda_function.lambda_handler(event, None)
+        elapsed = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1] - allocated_before if self.trace_allocations else None
+        request = event["request"]
+        self.records.append({
+            "handler": request["intent"]["name"] if request["type"] == "IntentRequest" else request["type"],
+            "latency_ms": elapsed * 1000,
+            "peak_alloc_kb": peak / 1024.0 if peak is not None else None,
+            "request_bytes": len(json.dumps(event)),
+            "response_bytes": len(json.dumps(output)),
+            "ddb_calls": {
+                operation: count - calls_before.get(operation, 0)
+                for operation, count in self.table.calls.items() if count != calls_before.get(operation, 0)
+            },
+        })
+        self.session_attributes = output.get("sessionAttributes") or {}
+        return output
+
+
+def new_table(words, latency=0):
+    #str list, float -> InMemoryTable
+    """Return a fresh table stand-in holding one user with the given word list."""
+    resource = InMemoryDynamoDbResource(latency=latency)
+    persistence.configure(resource)
+    table = resource.Table(os.environ["DYNAMODB_PERSISTENCE_TABLE_NAME"])
+    seed_user(DEFAULT_USER_ID, "Sam", words, {word: i % 3 for i, word in enumerate(words)}, 0)
+    table.calls.clear()
+    return table
+
+
+def run_intent_sweep(client):
+    """Send one request for every intent in the interaction model."""
+    client.send("LaunchRequest", new_session=True)
+    for intent_name, slots in intent_slot_values().items():
+        if intent_name in ("AMAZON.StopIntent", "AMAZON.CancelIntent", "ClearSpellingListIntent"):
+            continue
+        if intent_name == "ConfirmWordIntent":
+            client.send("IntentRequest", "BeginMarkingIntent")
+        client.send("IntentRequest", intent_name, slots, state=STATE_FOR_INTENT.get(intent_name))
+    client.send("IntentRequest", "AMAZON.StopIntent")
+    client.send("SessionEndedRequest")
+
+
+def run_lesson(client, words_per_pass):
+    """Launch, add a word, take a test, mark it and ask for the report."""
+    client.send("LaunchRequest", new_session=True)
+    client.send("IntentRequest", "AddSpellingIntent", {"words": "benchmark"})
+    client.send("IntentRequest", "BeginQuizIntent")
+    for _ in range(words_per_pass - 1):
+        client.send("IntentRequest", "TellWordIntent")
+    client.send("IntentRequest", "BeginMarkingIntent")
+    for i in range(words_per_pass):
+        client.send("IntentRequest", "ConfirmWordIntent", {"yesNo": "no" if i % 4 == 0 else "yes"})
+        if i < words_per_pass - 1:
+            client.send("IntentRequest", "TellAnswerIntent")
+    client.send("IntentRequest", "ChildPractiseReportIntent")
+    client.send("IntentRequest", "AMAZON.MoreIntent")
+    client.send("IntentRequest", "MostIncorrectWordIntent")
+    client.send("IntentRequest", "AMAZON.StopIntent")
+    client.send("SessionEndedRequest")
+
+
+def summarise(records):
+    #dict list -> dict
+    """Group records by handler and work out latency percentiles and averages."""
+    by_handler = {}
+    for record in records:
+        by_handler.setdefault(record["handler"], []).append(record)
+    summary = {}
+    for handler, handler_records in by_handler.items():
+        latencies = [r["latency_ms"] for r in handler_records]
+        allocations = [r["peak_alloc_kb"] for r in handler_records if r["peak_alloc_kb"] is not None]
+        ddb_calls = {}
+        for r in handler_records:
+            for operation, count in r["ddb_calls"].items():
+                ddb_calls[operation] = ddb_calls.get(operation, 0) + count
+        summary[handler] = {
+            "count": len(handler_records),
+            "p50_ms": percentile(latencies, 50),
+            "p95_ms": percentile(latencies, 95),
+            "p99_ms": percentile(latencies, 99),
+            "peak_alloc_kb": sum(allocations) / len(allocations) if allocations else None,
+            "request_bytes": sum(r["request_bytes"] for r in handler_records) // len(handler_records),
+            "ddb_calls": {operation: count / float(len(handler_records)) for operation, count in sorted(ddb_calls.items())},
+        }
+    return summary
+
+
+def print_summary(title, summary):
+    print("\n" + title)
+    print("{:<28} {:>6} {:>8} {:>8} {:>8} {:>10} {:>10}  {}".format(
+        "handler", "count", "p50 ms", "p95 ms", "p99 ms", "alloc KB", "req bytes", "DynamoDB calls/turn"))
+    for handler in sorted(summary):
+        row = summary[handler]
+        print("{:<28} {:>6} {:>8.2f} {:>8.2f} {:>8.2f} {:>10} {:>10}  {}".format(
+            handler, row["count"], row["p50_ms"], row["p95_ms"], row["p99_ms"],
+            "-" if row["peak_alloc_kb"] is None else "{:.1f}".format(row["peak_alloc_kb"]),
+            row["request_bytes"],
+            ", ".join("{} {:.2f}".format(op, count) for op, count in row["ddb_calls"].items()) or "-"))
+
+
+def run_benchmark(sizes, iterations, words_per_pass, recorder=None, latency=0):
+    for size in sizes:
+        words = make_words(size)
+        lessons = []
+        for trace_allocations in (False, True):
+            if trace_allocations:
+                tracemalloc.start()
+            for iteration in range(iterations):
+                client = SkillClient(new_table(words, latency), trace_allocations=trace_allocations,
+                                     recorder=recorder if not trace_allocations and iteration == 0 else None)
+                run_intent_sweep(client)
+                run_lesson(client, min(words_per_pass, size))
+                if trace_allocations:
+                    #latencies come from the untraced lessons, allocations from the traced ones
+                    for record, traced in zip(lessons[iteration], client.records):
+                        record["peak_alloc_kb"] = traced["peak_alloc_kb"]
+                else:
+                    lessons.append(client.records)
+            if trace_allocations:
+                tracemalloc.stop()
+        records = [record for lesson in lessons for record in lesson]
+        print_summary("{} words, {} lessons".format(size, iterations), summarise(records))
+
+
+def run_replay(path, latency=0):
+    table = new_table(make_words(20), latency)
+    client = SkillClient(table)
+    with open(path) as replay_file:
+        for line in replay_file:
+            if line.strip():
+                client.replay(json.loads(line))
+    print_summary("Replay of " + path, summarise(client.records))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[5, 50, 500, 5000], help="word list sizes to test")
+    parser.add_argument("--iterations", type=int, default=5, help="lessons to run for each list size")
+    parser.add_argument("--words-per-pass", type=int, default=20, help="words quizzed and marked in each lesson")
+    parser.add_argument("--record", help="write every generated request envelope to this JSON lines file")
+    parser.add_argument("--replay", help="replay the request envelopes in this JSON lines file")
+    parser.add_argument("--metrics", help="write the skill's metric lines to this file instead of discarding them")
+    parser.add_argument("--latency-ms", type=float, default=0, help="delay added to every DynamoDB call")
+    parser.add_argument("--packed", action="store_true", help="store items packed, as with PERSISTENCE_PACKED=true")
+    args = parser.parse_args()
+    #an intent without a route would fall through to the IntentReflectorHandler instead of failing
+    lambda_function.intent_router.check_interaction_model(INTERACTION_MODEL_PATH)
+    persistence.persistence_adapter.pack_items = args.packed
+    metrics_file = open(args.metrics, "w") if args.metrics else None
+    metrics.configure(metrics_file)
+    if args.replay:
+        run_replay(args.replay, args.latency_ms / 1000.0)
+    else:
+        recorder = open(args.record, "w") if args.record else None
+        try:
+            run_benchmark(args.sizes, args.iterations, args.words_per_pass, recorder, args.latency_ms / 1000.0)
+        finally:
+            if recorder is not None:
+                recorder.close()
+    if metrics_file is not None:
+        metrics_file.close()
@@ -0,0 +1,121 @@
+"""Benchmark of storing items packed (PERSISTENCE_PACKED=true) against storing them as maps.
+
+For word lists of 10 to 5,000 words, runs the scripted lessons of load_test.py
+with items stored each way and reports the size of the child's words and stats
+items and the read and write capacity units DynamoDB bills per turn. Reads are
+strongly consistent, so a read costs a unit per 4 KB of the item, and a write
+costs a unit per 1 KB of the larger of the item before and after, even if it
+only updates one counter. The item cache is turned off, as in the web service,
+so every turn reads the items it uses. Also reports the time taken to pack and
+unpack the stats item.
+
+Usage: python benchmarks/packed_items.py [--sizes 10 100 1000 5000] [--lessons N]
+"""
+import argparse
+import math
+import os
+import timeit
+
+#load_test puts lambda/ on the path and sets up the environment the skill is imported with
+import load_test
+
+import codec
+import metrics
+import persistence
+from envelopes import DEFAULT_USER_ID
+from fakes import InMemoryDynamoDbResource, InMemoryTable, seed_user
+
+
+class BilledTable(InMemoryTable):
+    """InMemoryTable that adds up the capacity units DynamoDB would bill for each call."""
+    def __init__(self, name, key_name="id", latency=0):
+        super(BilledTable, self).__init__(name, key_name, latency)
+        self.read_units = 0
+        self.write_units = 0
+
+    def _item_size(self, key):
+        item = self.items.get(key)
+        return persistence._size(item) if item is not None else 0
+
+    def get_item(self, Key, ConsistentRead=False):
+        self.read_units += max(1, math.ceil(self._item_size(Key[self.key_name]) / 4096.0))
+        return super(BilledTable, self).get_item(Key, ConsistentRead)
+
+    def put_item(self, Item, **kwargs):
+        before = self._item_size(Item[self.key_name])
+        try:
+            return super(BilledTable, self).put_item(Item, **kwargs)
+        finally:
+            self.write_units += max(1, math.ceil(max(before, self._item_size(Item[self.key_name])) / 1024.0))
+
+    def update_item(self, Key, UpdateExpression, **kwargs):
+        before = self._item_size(Key[self.key_name])
+        try:
+            return super(BilledTable, self).update_item(Key, UpdateExpression, **kwargs)
+        finally:
+            self.write_units += max(1, math.ceil(max(before, self._item_size(Key[self.key_name])) / 1024.0))
+
+
+class BilledResource(InMemoryDynamoDbResource):
+    def Table(self, name):
+        if name not in self.tables:
+            self.tables[name] = BilledTable(name, latency=self.latency)
+        return self.tables[name]
+
+
+def run_lessons(words, packed, lessons, words_per_pass):
+    #str list, bool, int, int -> dict
+    persistence.persistence_adapter.pack_items = packed
+    resource = BilledResource()
+    persistence.configure(resource)
+    table = resource.Table(os.environ["DYNAMODB_PERSISTENCE_TABLE_NAME"])
+    seed_user(DEFAULT_USER_ID, "Sam", words, dict((word, i % 3) for i, word in enumerate(words)), 0)
+    table.read_units = table.write_units = 0
+    client = load_test.SkillClient(table)
+    for _ in range(lessons):
+        load_test.run_lesson(client, min(words_per_pass, len(words)))
+    key = "{}#sam#".format(DEFAULT_USER_ID)
+    return {
+        "words_kb": table._item_size(key + "words") / 1024.0,
+        "stats_kb": table._item_size(key + "stats") / 1024.0,
+        "rcu": table.read_units / float(len(client.records)),
+        "wcu": table.write_units / float(len(client.records)),
+    }
+
+
+def time_codec(words):
+    #str list -> (float, float)
+    """Return the milliseconds taken to pack and to unpack a stats item for words."""
+    stats = {"wordReport": dict((word, i % 3) for i, word in enumerate(words)), "testAttempts": 12,
+             "topMissed": [[word, 2] for word in words[2:30:3]],
+             "wordSchedule": dict((word, [i % 40, 2 ** (i % 5)]) for i, word in enumerate(words))}
+    packed = codec.encode(stats)
+    number = max(1, 2000 // len(words))
+    return (min(timeit.repeat(lambda: codec.encode(stats), number=number, repeat=3)) / number * 1000,
+            min(timeit.repeat(lambda: codec.decode(packed), number=number, repeat=3)) / number * 1000)
+
+
+def run_benchmark(sizes, lessons, words_per_pass):
+    cache = persistence.persistence_adapter.cache
+    persistence.persistence_adapter.cache = persistence.ItemCache(size=0)
+    print("{:<7} {:<7} {:>9} {:>9} {:>9} {:>9} {:>8} {:>8}".format(
+        "words", "format", "words KB", "stats KB", "RCU/turn", "WCU/turn", "pack ms", "unpack ms"))
+    for size in sizes:
+        words = load_test.make_words(size)
+        for packed in (False, True):
+            row = run_lessons(words, packed, lessons, words_per_pass)
+            timings = "{:>8.2f} {:>8.2f}".format(*time_codec(words)) if packed else ""
+            print("{:<7} {:<7} {:>9.1f} {:>9.1f} {:>9.2f} {:>9.2f} {}".format(
+                size, "packed" if packed else "map", row["words_kb"], row["stats_kb"], row["rcu"], row["wcu"], timings))
+    persistence.persistence_adapter.pack_items = False
+    persistence.persistence_adapter.cache = cache
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000, 5000], help="word list sizes to test")
+    parser.add_argument("--lessons", type=int, default=3, help="lessons to run for each list size and format")
+    parser.add_argument("--words-per-pass", type=int, default=20, help="words quizzed and marked in each lesson")
+    args = parser.parse_args()
+    metrics.configure(None)
+    run_benchmark(args.sizes, args.lessons, args.words_per_pass)
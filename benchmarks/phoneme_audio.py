@@ -0,0 +1,58 @@
+"""Benchmark for phonetic spellings played from recorded phoneme clips.
+
+Runs tools/generate_phoneme_audio.py against in-memory S3 and Polly stand-ins
+(twice, to check the second run skips every clip), then renders phonetic
+spellings with the clips and reports how long a spelling takes to render, how
+many URLs were signed and whether every clip played is in the bucket.
+
+Usage: python benchmarks/phoneme_audio.py [--words N] [--renders N]
+"""
+import argparse
+import os
+import re
+import sys
+import time
+
+from envelopes import ROOT, add_lambda_to_path
+
+add_lambda_to_path()
+sys.path.insert(0, os.path.join(ROOT, "tools"))
+os.environ.setdefault("S3_PERSISTENCE_BUCKET", "benchmark-bucket")
+
+import utils
+from fakes import InMemoryPollyClient, InMemoryS3Client
+from generate_phoneme_audio import DEFAULT_PREFIX, generate_phoneme_audio
+from load_test import make_words
+
+AUDIO_SRC = re.compile(r'<audio src="https://s3\.local/([^/]+)/([^?"]+)\?')
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--words", type=int, default=200, help="different words to spell")
+    parser.add_argument("--renders", type=int, default=10000, help="spellings to render")
+    args = parser.parse_args()
+    bucket = os.environ["S3_PERSISTENCE_BUCKET"]
+    s3 = InMemoryS3Client()
+    polly = InMemoryPollyClient()
+    for run in (1, 2):
+        uploaded, skipped = generate_phoneme_audio(polly, s3, bucket, DEFAULT_PREFIX)
+        print("Generation run {}: uploaded {}, skipped {}".format(run, uploaded, skipped))
+
+    utils.configure_s3(s3)
+    utils.PHONEME_AUDIO_PREFIX = DEFAULT_PREFIX
+    #short words are played from clips, longer ones use the text sounds
+    words = [word[:utils.MAX_AUDIO_CLIPS] if i % 2 else word for i, word in enumerate(make_words(args.words))]
+    missing = set()
+    started = time.perf_counter()
+    for i in range(args.renders):
+        spelling = utils.render_spelling(words[i % len(words)], "phonetic")
+        for clip_bucket, key in AUDIO_SRC.findall(spelling):
+            if (clip_bucket, key) not in s3.objects:
+                missing.add(key)
+    elapsed = time.perf_counter() - started
+    print("Rendered {} phonetic spellings in {:.3f}s ({:.1f} us each)".format(
+        args.renders, elapsed, elapsed / args.renders * 1e6))
+    print("Signed {} URLs for {} clips".format(s3.calls.get("generate_presigned_url", 0), len(utils.letterPhonemeDict) + len(utils.graphemePhonemeDict)))
+    print("Clips played that are not in the bucket: {}".format(", ".join(sorted(missing)) or "none"))
+    print("Example: " + utils.render_spelling("ship", "phonetic"))
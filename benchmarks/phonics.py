@@ -0,0 +1,40 @@
+"""Benchmark for splitting words into graphemes for phonetic spellings.
+
+Segments a word list with utils.segment_word, first with an empty cache and
+then again once every word is cached, and renders the phonetic spellings.
+
+Usage: python benchmarks/phonics.py [--words N]
+"""
+import argparse
+import time
+
+from envelopes import add_lambda_to_path
+
+add_lambda_to_path()
+
+import utils
+from load_test import make_words
+
+EXAMPLES = ["ship", "thing", "night", "chair", "though", "bridge", "queen", "Phone", "don't"]
+
+
+def timed(function, words):
+    #function, str list -> float
+    started = time.perf_counter()
+    for word in words:
+        function(word)
+    return (time.perf_counter() - started) * 1000
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--words", type=int, default=5000, help="words in the list")
+    args = parser.parse_args()
+    words = make_words(args.words)
+    utils.segment_word.cache_clear()
+    print("Segmented {} words in {:.2f} ms, {:.2f} ms once cached".format(
+        args.words, timed(utils.segment_word, words), timed(utils.segment_word, words)))
+    print("Rendered {} phonetic spellings in {:.2f} ms".format(
+        args.words, timed(utils.get_phonetic_spelling, words)))
+    for word in EXAMPLES:
+        print("{:<8} {}".format(word, " - ".join(utils.segment_word(word))))
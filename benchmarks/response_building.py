@@ -0,0 +1,107 @@
+"""Benchmark of building the skill's spoken responses.
+
+Times rendering each response template and putting it into a response with
+responses.respond, against building the same speech by concatenation and passing
+it to the response builder's speak() and ask(), as the handlers used to. Also
+times the first and a later page of the report of a child who got 10, 1,000 and
+10,000 words wrong.
+
+Usage: python benchmarks/response_building.py [--number N]
+"""
+import argparse
+import timeit
+
+from envelopes import add_lambda_to_path
+from fakes import InMemoryDynamoDbResource, seed_user
+
+add_lambda_to_path()
+
+from ask_sdk_core.response_helper import ResponseFactory
+
+import persistence
+import responses
+import utils
+
+SPELLING = utils.get_spelling_for_word("because")
+
+
+class _AttributesManager(object):
+    def __init__(self, persistent_attributes):
+        self.persistent_attributes = persistent_attributes
+        self.session_attributes = {}
+
+
+class _HandlerInput(object):
+    def __init__(self, persistent_attributes=None):
+        self.response_builder = ResponseFactory()
+        self.attributes_manager = _AttributesManager(persistent_attributes or {})
+
+
+def concatenated_answer():
+    speech = ("Your {} word was {}".format("3rd", "because") + ". It is spelt as: " + SPELLING +
+              ".<break time='0.5s'></break> Did you get that right?")
+    return ResponseFactory().speak(speech).ask(speech).response
+
+
+def rendered_answer():
+    speech = responses.render("marking.answer", ordinal="3rd", word="because", spelling=SPELLING)
+    return responses.respond(_HandlerInput(), speech, reprompt=True)
+
+
+def concatenated_help():
+    speech = "You can say hello to me! How can I help?"
+    return ResponseFactory().speak(speech).ask(speech).response
+
+
+def rendered_help():
+    return responses.respond(_HandlerInput(), responses.render("help"), reprompt=True)
+
+
+def per_call(function, number):
+    #function, int -> float
+    """Return the fewest microseconds function took per call over 5 runs of number calls."""
+    return min(timeit.repeat(function, number=number, repeat=5)) / number * 1e6
+
+
+def report_attributes(count):
+    #int -> ShardedAttributes
+    """Return the saved persistent attributes of a child with a report of count missed words, and its topMissed index built."""
+    persistence.configure(InMemoryDynamoDbResource())
+    seed_user("report-user", "Sam", [], dict(("word{}".format(i), 1 + i % 7) for i in range(count)), 1)
+    attributes = persistence.ShardedAttributes(persistence.persistence_adapter, "report-user")
+    utils.get_top_missed(_HandlerInput(attributes))
+    persistence.persistence_adapter.save_attributes(None, attributes)
+    return attributes
+
+
+def report_page(attributes, cursor):
+    #built as ChildPractiseReportIntentHandler and MoreIntentHandler build a page
+    handler_input = _HandlerInput(attributes)
+    page, next_cursor = utils.get_report_page(handler_input, cursor)
+    speech = [responses.render("report.missed_word", word=word, count=misses) for word, misses in page]
+    speech.append(responses.render("report.more"))
+    return responses.respond(handler_input, " ".join(speech), reprompt=speech[-1]), next_cursor
+
+
+def run_benchmark(number):
+    print("{:<28} {:>14} {:>10}".format("response", "concatenated", "template"))
+    print("{:<28} {:>11.2f} us {:>7.2f} us".format(
+        "marking answer (reprompt)", per_call(concatenated_answer, number), per_call(rendered_answer, number)))
+    print("{:<28} {:>11.2f} us {:>7.2f} us".format(
+        "help (reprompt)", per_call(concatenated_help, number), per_call(rendered_help, number)))
+    print()
+    print("{:<20} {:>12} {:>12}".format("report of", "first page", "third page"))
+    for count in (10, 1000, 10000):
+        attributes = report_attributes(count)
+        _, cursor = report_page(attributes, None)
+        _, cursor = report_page(attributes, cursor)
+        later = "{:>9.2f} us".format(per_call(lambda: report_page(attributes, cursor), max(1, number // 1000))) if cursor else "-"
+        print("{:<20} {:>9.2f} us {:>12}".format(
+            "{:,} missed words".format(count), per_call(lambda: report_page(attributes, None), number // 10), later))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--number", type=int, default=20000, help="responses built per timing")
+    args = parser.parse_args()
+    run_benchmark(args.number)
@@ -0,0 +1,161 @@
+"""Throughput benchmark of the skill run as a web service.
+
+Starts lambda/webservice.py with 1, 2, ... worker processes on a local port, keeping data in a
+SQLite file (PERSISTENCE_BACKEND=local), and drives it with client processes. Each client plays
+lessons (launch, add a word, quiz, mark, report) for its own child over HTTP for a fixed time.
+Reports requests per second, requests per second per core used by the workers, and p50/p99
+latency for each number of workers.
+
+The requests are not signed by Alexa, so signature verification is turned off; timestamps are
+still checked. The client processes run on the same host and share its cores with the workers.
+
+Usage: python benchmarks/webservice_throughput.py [--workers 1 2 4] [--clients N] [--seconds S]
+"""
+import argparse
+import http.client
+import json
+import math
+import multiprocessing
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+from envelopes import LAMBDA_DIR, add_lambda_to_path, build_request
+
+WORDS = ["ship", "train", "because", "friend", "laugh", "school", "night", "light", "thought", "could"]
+
+
+def lesson():
+    #-> iterator of (request type, intent name, slots)
+    """The requests of one lesson, as run_lesson in load_test.py sends them."""
+    yield "LaunchRequest", None, None
+    yield "IntentRequest", "AddSpellingIntent", {"words": "benchmark"}
+    yield "IntentRequest", "BeginQuizIntent", None
+    for _ in range(len(WORDS)):
+        yield "IntentRequest", "TellWordIntent", None
+    yield "IntentRequest", "BeginMarkingIntent", None
+    for i in range(len(WORDS)):
+        yield "IntentRequest", "ConfirmWordIntent", {"yesNo": "no" if i % 4 == 0 else "yes"}
+        yield "IntentRequest", "TellAnswerIntent", None
+    yield "IntentRequest", "ChildPractiseReportIntent", None
+
+
+def run_client(port, user_id, seconds, results):
+    """Play lessons against the server for seconds and put the latency of every request on results."""
+    latencies = []
+    session_attributes = {}
+    deadline = time.perf_counter() + seconds
+    try:
+        while time.perf_counter() < deadline:
+            for request_type, intent_name, slots in lesson():
+                new_session = request_type == "LaunchRequest"
+                if new_session:
+                    session_attributes = {}
+                body = json.dumps(build_request(request_type, intent_name, slots, session_attributes,
+                                                user_id=user_id, new_session=new_session))
+                start = time.perf_counter()
+                connection = http.client.HTTPConnection("127.0.0.1", port)
+                connection.request("POST", "/", body, {"Content-Type": "application/json"})
+                response = connection.getresponse()
+                output = response.read()
+                connection.close()
+                latencies.append(time.perf_counter() - start)
+                if response.status != 200:
+                    raise RuntimeError("{} failed with {}".format(intent_name or request_type, response.status))
+                session_attributes = json.loads(output).get("sessionAttributes") or {}
+                if time.perf_counter() >= deadline:
+                    break
+    finally:
+        #the benchmark waits for every client, so a client that fails must still report
+        results.put(latencies)
+
+
+def seed_users(path, count):
+    """Store a child with a word list for each client in the SQLite file at path."""
+    os.environ["PERSISTENCE_BACKEND"] = "local"
+    os.environ["PERSISTENCE_LOCAL_PATH"] = path
+    add_lambda_to_path()
+    import local_persistence
+    import persistence
+    adapter = local_persistence.LocalPersistenceAdapter(path=path)
+    for user in range(count):
+        attributes = persistence.ShardedAttributes(adapter, "amzn1.ask.account.client{}".format(user))
+        attributes["profiles"] = {"sam": {"userName": "Sam"}}
+        attributes["activeProfile"] = "sam"
+        attributes.select_profile("sam")
+        attributes["words"] = list(WORDS)
+        attributes["listVersion"] = 1
+        attributes["wordReport"] = dict((word, 0) for word in WORDS)
+        attributes["testAttempts"] = 0
+        adapter.save_attributes(None, attributes)
+
+
+def free_port():
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+
+def wait_for_port(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError("The web service did not start listening on port {}".format(port))
+
+
+def run_benchmark(workers, clients, seconds, path):
+    #int, int, float, str -> dict
+    port = free_port()
+    env = dict(os.environ, PERSISTENCE_BACKEND="local", PERSISTENCE_LOCAL_PATH=path,
+               SKILL_VERIFY_SIGNATURE="false", SKILL_VERIFY_TIMESTAMP="true")
+    server = subprocess.Popen([sys.executable, os.path.join(LAMBDA_DIR, "webservice.py"), "--host", "127.0.0.1",
+                               "--port", str(port), "--workers", str(workers)],
+                              env=env, stdout=subprocess.DEVNULL)
+    try:
+        wait_for_port(port)
+        results = multiprocessing.Queue()
+        processes = [multiprocessing.Process(target=run_client,
+                                             args=(port, "amzn1.ask.account.client{}".format(client), seconds, results))
+                     for client in range(clients)]
+        started = time.perf_counter()
+        for process in processes:
+            process.start()
+        latencies = sorted(latency for _ in processes for latency in results.get())
+        elapsed = time.perf_counter() - started
+        for process in processes:
+            process.join()
+    finally:
+        server.terminate()
+        server.wait()
+    cores = min(workers, os.cpu_count() or 1)
+    return {
+        "requests": len(latencies),
+        "per_second": len(latencies) / elapsed,
+        "per_core": len(latencies) / elapsed / cores,
+        "p50_ms": latencies[len(latencies) // 2] * 1000,
+        "p99_ms": latencies[max(0, int(math.ceil(0.99 * len(latencies))) - 1)] * 1000,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4], help="numbers of worker processes to test")
+    parser.add_argument("--clients", type=int, default=8, help="client processes sending requests")
+    parser.add_argument("--seconds", type=float, default=10, help="how long each test runs")
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, "skill.db")
+        seed_users(path, args.clients)
+        print("{} cores, {} clients".format(os.cpu_count(), args.clients))
+        print("{:<8} {:>9} {:>9} {:>11} {:>8} {:>8}".format("workers", "requests", "req/s", "req/s/core", "p50 ms", "p99 ms"))
+        for workers in args.workers:
+            row = run_benchmark(workers, args.clients, args.seconds, path)
+            print("{:<8} {:>9} {:>9.0f} {:>11.0f} {:>8.2f} {:>8.2f}".format(
+                workers, row["requests"], row["per_second"], row["per_core"], row["p50_ms"], row["p99_ms"]))
@@ -0,0 +1,63 @@
+"""Benchmark of adding a word to and taking a word off word lists of different sizes.
+
+For word lists of 10 to 5,000 words with a full report, sends an AddSpellingIntent with one
+new word and a RemoveSpellingIntent with one word on the list, and reports the DynamoDB writes
+and bytes written by each, and the handler latency. Only the words added or taken out are
+written, so the bytes do not grow with the list. For comparison, the full rewrite column is the
+size of the word list and report the skill used to write on every addition, when it wrote the
+whole list again and set every counter in the report back to zero.
+
+Usage: python benchmarks/word_list_updates.py [--sizes 10 100 1000 2000 5000] [--iterations N]
+"""
+import argparse
+import json
+import time
+
+#load_test puts lambda/ on the path and sets up the environment the skill is imported with
+import load_test
+
+import metrics
+import persistence
+
+
+def full_rewrite_size(words):
+    #str list -> int
+    return len(json.dumps({"words": words, "wordReport": dict((word, 0) for word in words),
+                           "topMissed": [], "wordSchedule": {}, "testAttempts": 0}))
+
+
+def time_turn(client, intent_name, words):
+    #SkillClient, str, str -> (float, int, int)
+    """Return the milliseconds, writes and bytes written of one turn of intent_name with words in its slot."""
+    usage = persistence.persistence_adapter.usage
+    usage.reset()
+    start = time.perf_counter()
+    client.send("IntentRequest", intent_name, {"words": words})
+    return (time.perf_counter() - start) * 1000, usage.writes, usage.bytes_written
+
+
+def run_benchmark(sizes, iterations):
+    print("{:<7} {:<7} {:>9} {:>7} {:>9} {:>14}".format("words", "intent", "ms", "writes", "bytes", "full rewrite"))
+    for size in sizes:
+        words = load_test.make_words(size + iterations)
+        table = load_test.new_table(words[:size])
+        client = load_test.SkillClient(table)
+        client.send("LaunchRequest", new_session=True)
+        rows = {"add": [], "remove": []}
+        for i in range(iterations):
+            rows["add"].append(time_turn(client, "AddSpellingIntent", words[size + i]))
+            rows["remove"].append(time_turn(client, "RemoveSpellingIntent", words[i]))
+        for name, turns in sorted(rows.items()):
+            milliseconds = sorted(turn[0] for turn in turns)[len(turns) // 2]
+            print("{:<7} {:<7} {:>9.2f} {:>7.1f} {:>9.0f} {:>14}".format(
+                size, name, milliseconds, sum(turn[1] for turn in turns) / float(len(turns)),
+                sum(turn[2] for turn in turns) / float(len(turns)), full_rewrite_size(words[:size]) if name == "add" else ""))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000, 2000, 5000], help="word list sizes to test")
+    parser.add_argument("--iterations", type=int, default=20, help="words added and taken off for each list size")
+    args = parser.parse_args()
+    metrics.configure(None)
+    run_benchmark(args.sizes, args.iterations)
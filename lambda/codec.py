@@ -0,0 +1,190 @@
+"""Compressed binary encoding of an item's persistent attributes, see DynamoDbPersistenceAdapter.
+
+A packed item keeps all of its attributes in one binary attribute instead of a map, so
+DynamoDB bills it for the size of the compressed bytes. Each word is stored once in a
+table of words, and the word list, the report counters, the schedule and the topMissed
+index refer to words by their number in it. Everything else (e.g. listVersion, profiles)
+is stored as JSON. The payload is compressed with zlib.
+
+Layout, all integers little-endian uint32:
+
+    magic b"SPK", format version (1 byte), then compressed:
+    header: flags, bytes of the word table, entries in words, wordReport, wordSchedule,
+            topMissed, bytes of the JSON
+    the word table, words separated by newlines
+    words: word number
+    wordReport: word number, misses
+    wordSchedule: word number, test due, gap
+    topMissed: word number, misses
+    the JSON of the other attributes
+
+flags has a bit set for each of the four attributes that is stored in its packed form.
+An attribute that does not have the expected shape (e.g. a negative counter) is stored
+in the JSON instead.
+"""
+import itertools
+import json
+import operator
+import sys
+import zlib
+from array import array
+from decimal import Decimal
+
+from ask_sdk_core.exceptions import PersistenceException
+
+MAGIC = b"SPK"
+FORMAT_VERSION = 1
+#zlib level, 6 is zlib's default trade between time and size
+COMPRESSION_LEVEL = 6
+
+_HEADER_FIELDS = 7
+_UINT32_MAX = 2 ** 32 - 1
+#array type code of a 4 byte unsigned integer
+_UINT32 = "I" if array("I").itemsize == 4 else "L"
+#attribute, values per entry after the word number
+_PACKED = (("words", 0), ("wordReport", 1), ("wordSchedule", 2), ("topMissed", 1))
+
+
+def _columns(name, value, word_numbers):
+    #str, object, dict -> list, None if value cannot be packed
+    """Return the columns of numbers value is packed into, numbering the words it holds in word_numbers."""
+    try:
+        if name == "words":
+            words, columns = value, []
+        elif name == "wordReport":
+            words, columns = value.keys(), [value.values()]
+        elif name == "wordSchedule":
+            entries = list(value.values())
+            if set(map(len, entries)) - {2} or not all(map(isinstance, entries, itertools.repeat(list))):
+                return None
+            words, columns = value.keys(), [[entry[0] for entry in entries], [entry[1] for entry in entries]]
+        else:
+            if set(map(len, value)) - {2} or not all(map(isinstance, value, itertools.repeat(list))):
+                return None
+            words, columns = [entry[0] for entry in value], [[entry[1] for entry in value]]
+        if not isinstance(value, (list, dict)) or "\n" in "".join(words):
+            return None
+    except (AttributeError, TypeError):
+        return None
+    for i, column in enumerate(columns):
+        try:
+            columns[i] = array(_UINT32, column)
+        except (TypeError, OverflowError):
+            #e.g. Decimal numbers read from a map, or a negative counter
+            column = [_number(number) for number in column]
+            if None in column:
+                return None
+            columns[i] = array(_UINT32, column)
+    numbers = [word_numbers.setdefault(word, len(word_numbers)) for word in words]
+    #words are mostly numbered in the order they are stored, so the differences are mostly 1
+    return [_zigzag(map(operator.sub, numbers, [-1] + numbers[:-1]))] + columns
+
+
+def _zigzag(differences):
+    #iterable of int -> list of int
+    return [difference * 2 if difference >= 0 else -difference * 2 - 1 for difference in differences]
+
+
+def _unzigzag(numbers):
+    #iterable of int -> list of int
+    return list(itertools.accumulate(((number >> 1) ^ -(number & 1) for number in numbers), initial=-1))[1:]
+
+
+def _column_bytes(column):
+    #list of int -> (bytes, bytes)
+    """Return the type code and bytes of the smallest array that holds column."""
+    largest = max(column, default=0)
+    code = "B" if largest < 2 ** 8 else "H" if largest < 2 ** 16 else _UINT32
+    packed = array(code, column)
+    if sys.byteorder == "big":
+        packed.byteswap()
+    return code.encode("ascii"), packed.tobytes()
+
+
+def _number(value):
+    #object -> int, None if value is not a whole number that fits in 32 bits
+    #the DynamoDB resource reads numbers as Decimal
+    if isinstance(value, Decimal) and value == value.to_integral_value():
+        value = int(value)
+    if type(value) is not int or not 0 <= value <= _UINT32_MAX:
+        return None
+    return value
+
+
+def _json_default(value):
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    raise TypeError("Cannot pack {} values".format(type(value).__name__))
+
+
+def encode(attributes):
+    #dict -> bytes
+    """Return attributes packed into compressed bytes."""
+    other = dict(attributes)
+    flags = 0
+    word_numbers = {}
+    counts = []
+    codes = []
+    columns = []
+    for bit, (name, _) in enumerate(_PACKED):
+        packed = _columns(name, other[name], word_numbers) if name in other else None
+        if packed is None:
+            counts.append(0)
+            continue
+        flags |= 1 << bit
+        counts.append(len(other.pop(name)))
+        for column in packed:
+            code, data = _column_bytes(column)
+            codes.append(code)
+            columns.append(data)
+    table = "\n".join(word_numbers).encode("utf-8")
+    other_json = json.dumps(other, separators=(",", ":"), default=_json_default).encode("utf-8") if other else b""
+    header = array(_UINT32, [flags, len(table)] + counts + [len(other_json)])
+    if sys.byteorder == "big":
+        header.byteswap()
+    payload = b"".join([header.tobytes()] + codes + [table] + columns + [other_json])
+    return MAGIC + bytes([FORMAT_VERSION]) + zlib.compress(payload, COMPRESSION_LEVEL)
+
+
+def decode(data):
+    #bytes -> dict
+    """Return the attributes packed into data by encode."""
+    data = bytes(data)
+    if data[:len(MAGIC)] != MAGIC:
+        raise PersistenceException("Packed attributes do not start with {!r}".format(MAGIC))
+    version = data[len(MAGIC)]
+    if version != FORMAT_VERSION:
+        raise PersistenceException("Packed attributes are in format {}, only {} can be read".format(version, FORMAT_VERSION))
+    payload = zlib.decompress(data[len(MAGIC) + 1:])
+    header = array(_UINT32)
+    header.frombytes(payload[:4 * _HEADER_FIELDS])
+    if sys.byteorder == "big":
+        header.byteswap()
+    flags, table_size, counts, other_size = header[0], header[1], header[2:6], header[6]
+    sections = [(name, width, count) for bit, ((name, width), count) in enumerate(zip(_PACKED, counts)) if flags & 1 << bit]
+    position = 4 * _HEADER_FIELDS
+    codes = payload[position:position + sum(1 + width for _, width, _ in sections)].decode("ascii")
+    position += len(codes)
+    table = payload[position:position + table_size].decode("utf-8").split("\n") if table_size else []
+    position += table_size
+    columns = []
+    for code, (_, _, count) in zip(codes, [section for section in sections for _ in range(1 + section[1])]):
+        column = array(code)
+        column.frombytes(payload[position:position + count * column.itemsize])
+        if sys.byteorder == "big":
+            column.byteswap()
+        position += count * column.itemsize
+        columns.append(column)
+    attributes = json.loads(payload[position:position + other_size].decode("utf-8")) if other_size else {}
+    columns = iter(columns)
+    for name, width, _ in sections:
+        words = [table[number] for number in _unzigzag(next(columns))]
+        if name == "words":
+            attributes[name] = words
+        elif name == "wordReport":
+            attributes[name] = dict(zip(words, next(columns)))
+        elif name == "wordSchedule":
+            attributes[name] = dict(zip(words, map(list, zip(next(columns), next(columns)))))
+        else:
+            attributes[name] = list(map(list, zip(words, next(columns))))
+    return attributes
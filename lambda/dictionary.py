@@ -0,0 +1,181 @@
+import mmap
+import os
+import struct
+import zlib
+from bisect import bisect_left
+
+#Index of the words children can add, made by tools/build_dictionary.py. Words are not checked if it is missing.
+DICTIONARY_PATH = os.environ.get('DICTIONARY_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), "dictionary.idx"))
+#Most near matches suggested for a word that is not in the dictionary
+MAX_SUGGESTIONS = 3
+
+MAGIC = b"SPELLIDX"
+FORMAT_VERSION = 1
+# magic, format version, number of words, number of hash table slots, size of the word bytes
+HEADER = struct.Struct("<8sIIII")
+ALPHABET = "abcdefghijklmnopqrstuvwxyz"
+
+# The index opened by get_word_index, False once it is known not to exist.
+_word_index = None
+
+
+class WordIndex(object):
+    """A read-only set of words memory-mapped from an index file.
+
+    The file holds, after its header, four little-endian arrays:
+        offsets: uint32[count + 1], where each word starts in the word bytes, in sorted order
+        ranks: uint32[count], the position of each word in the list the index was built from
+        slots: uint32[slot count], an open-addressing hash table of where each word starts + 1, 0 for empty
+        words: the words, sorted, each followed by a newline
+
+    Nothing is copied out of the file when it is opened, the arrays are read through
+    memoryviews of the mapping, so only the pages a lookup touches are read from disk.
+    A lookup hashes the word, reads a slot and compares one word in most cases. The newline
+    after each word lets a word be compared without reading where it ends.
+    """
+    def __init__(self, path):
+        with open(path, "rb") as index_file:
+            self._mmap = mmap.mmap(index_file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, count, slot_count, _ = HEADER.unpack_from(self._mmap)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            self._mmap.close()
+            raise ValueError("{} is not a version {} word index".format(path, FORMAT_VERSION))
+        view = memoryview(self._mmap)
+        start = HEADER.size
+        self._offsets = view[start:start + 4 * (count + 1)].cast("I")
+        start += 4 * (count + 1)
+        self._ranks = view[start:start + 4 * count].cast("I")
+        start += 4 * count
+        self._slots = view[start:start + 4 * slot_count].cast("I")
+        self._words_start = start + 4 * slot_count
+        self._mask = slot_count - 1
+        self._count = count
+
+    def __len__(self):
+        return self._count
+
+    def __contains__(self, word):
+        #String -> Bool
+        key = word.encode() + b"\n"
+        slots, mask = self._slots, self._mask
+        slot = zlib.crc32(key) & mask
+        start = slots[slot]
+        while start:
+            start += self._words_start - 1
+            if self._mmap[start:start + len(key)] == key:
+                return True
+            slot = (slot + 1) & mask
+            start = slots[slot]
+        return False
+
+    def word(self, number):
+        #Int -> String
+        """Return the word at position number in sorted order."""
+        return self._mmap[self._words_start + self._offsets[number]:self._words_start + self._offsets[number + 1] - 1].decode("utf-8")
+
+    def rank(self, word):
+        #String -> Int
+        """Return the position of word in the list the index was built from, e.g. how common it is."""
+        return self._ranks[bisect_left(_SortedWords(self), word)]
+
+    def starting_with(self, prefix, limit):
+        #String, Int -> String list
+        """Return up to limit words starting with prefix, in sorted order."""
+        words = []
+        number = bisect_left(_SortedWords(self), prefix)
+        while number < self._count and len(words) < limit:
+            word = self.word(number)
+            if not word.startswith(prefix):
+                break
+            words.append(word)
+            number += 1
+        return words
+
+    def suggest(self, word, limit=MAX_SUGGESTIONS):
+        #String, Int -> String list
+        """Return the words most like word: those one letter away from it, most common first, or else words it starts.
+
+        A word the slot cut short, e.g. "elephan", is completed from the words that start with it.
+        """
+        candidates = set()
+        for index in range(len(word) + 1):
+            start, end = word[:index], word[index:]
+            if end:
+                candidates.add(start + end[1:])
+            if len(end) > 1:
+                candidates.add(start + end[1] + end[0] + end[2:])
+            for letter in ALPHABET:
+                if end:
+                    candidates.add(start + letter + end[1:])
+                candidates.add(start + letter + end)
+        candidates.discard(word)
+        matches = sorted((candidate for candidate in candidates if candidate in self), key=self.rank)
+        if not matches:
+            matches = sorted(self.starting_with(word, limit * 10), key=self.rank)
+        return matches[:limit]
+
+    def close(self):
+        self._offsets.release()
+        self._ranks.release()
+        self._slots.release()
+        self._mmap.close()
+
+
+class _SortedWords(object):
+    """The words of an index as a sequence, for bisect."""
+    def __init__(self, index):
+        self.index = index
+
+    def __len__(self):
+        return len(self.index)
+
+    def __getitem__(self, number):
+        return self.index.word(number)
+
+
+def build_index(words):
+    #String iterable -> bytes
+    """Return the contents of an index file holding words. Repeated words keep their first rank."""
+    ranks = {}
+    for word in words:
+        ranks.setdefault(word, len(ranks))
+    ordered = sorted(ranks)
+    encoded = [word.encode("utf-8") + b"\n" for word in ordered]
+    slot_count = 1
+    while slot_count < 4 * len(ordered):
+        slot_count *= 2
+    offsets = [0]
+    for key in encoded:
+        offsets.append(offsets[-1] + len(key))
+    slots = [0] * slot_count
+    for number, key in enumerate(encoded):
+        slot = zlib.crc32(key) & (slot_count - 1)
+        while slots[slot]:
+            slot = (slot + 1) & (slot_count - 1)
+        slots[slot] = offsets[number] + 1
+    return b"".join([
+        HEADER.pack(MAGIC, FORMAT_VERSION, len(ordered), slot_count, offsets[-1]),
+        struct.pack("<{}I".format(len(offsets)), *offsets),
+        struct.pack("<{}I".format(len(ordered)), *(ranks[word] for word in ordered)),
+        struct.pack("<{}I".format(slot_count), *slots),
+    ] + encoded)
+
+
+def configure(path=None):
+    #String -> None
+    """Use the index at path instead of DICTIONARY_PATH, e.g. in benchmarks. It is opened on first use."""
+    global DICTIONARY_PATH, _word_index
+    if _word_index:
+        _word_index.close()
+    _word_index = None
+    if path is not None:
+        DICTIONARY_PATH = path
+
+
+def get_word_index():
+    # -> WordIndex
+    """Return the dictionary's word index, opening it on first call, or None if there is no index."""
+    global _word_index
+    if _word_index is None:
+        _word_index = WordIndex(DICTIONARY_PATH) if os.path.exists(DICTIONARY_PATH) else False
+    return _word_index or None
@@ -2,25 +2,14 @@ import logging
 import ask_sdk_core.utils as ask_utils
 
 import utils
+import persistence
+import router
+import metrics
+import responses
 
-from ask_sdk_core.skill_builder import SkillBuilder
 from ask_sdk_core.dispatch_components import AbstractRequestHandler
 from ask_sdk_core.dispatch_components import AbstractExceptionHandler
-from ask_sdk_core.handler_input import HandlerInput
-
-from ask_sdk_model import Response
-
-import os
-import boto3
-
-from ask_sdk_core.skill_builder import CustomSkillBuilder
-from ask_sdk_dynamodb.adapter import DynamoDbAdapter
-
-ddb_region = os.environ.get('DYNAMODB_PERSISTENCE_REGION')
-ddb_table_name = os.environ.get('DYNAMODB_PERSISTENCE_TABLE_NAME')
-
-ddb_resource = boto3.resource('dynamodb', region_name=ddb_region)
-dynamodb_adapter = DynamoDbAdapter(table_name=ddb_table_name, create_table=False, dynamodb_resource=ddb_resource)
+from ask_sdk_core.dispatch_components import AbstractResponseInterceptor
 
 
 logger = logging.getLogger(__name__)
@@ -36,31 +25,59 @@ class LaunchRequestHandler(AbstractRequestHandler):
     
     session_attr contains all the attribute for a given session
     
+    The session only holds a small cursor into the word list, so the size of the requests and
+    responses does not grow with the list. The list itself is read from the persistent attributes
+    with utils.get_words(handler_input) when a handler needs it.
+    
     Session attributes
     ------------------
-    words: str array 
-        List of words added by the parent for practise. Empty if nothing has been added yet.
+    profile: str
+        Id of the profile of the child who is practising
+    listVersion: int
+        Version of the word list the cursor refers to
+    testPlan: str array
+        The words in the current test, in the order they are asked
     nextWordIndex : int 
-        Index used to return a word while iterating from the list of words
+        Index used to return a word while iterating through the testPlan
     state: str 
         A string that keeps track of the state of program, e.g. 'ADDUSER', 'TEST'
     numOfWords:
         Tracks the number of words in the users current word List
     correctAnswers:
         Tracks the number of correct answers a user gives in a quiz
-    wordReport:
-        Stores all words and how many times the user has gotten the wrong
-    testAttempts:
-        Tracks the number of times a user has begun a test
+    markingResults:
+        Bitmaps of the words the user marked and got wrong in the current marking pass that are not saved to the database yet
+    savingMarkingResults:
+        The markingResults being saved by the current request, put back if the save fails
+    wordMarked: bool
+        Whether the word last given has been marked, so it is only counted once
     
-    persistent_attr contains all the attributes that is to be saved to the database
+    persistent_attr contains all the attributes that is to be saved to the database. Each child
+    has their own profile, and the profile's word list and stats are stored separately from the
+    account, so launching the skill only reads the small account item.
     
     Persistent attributes
     ---------------------
+    profiles: dict
+        Profile id of each child and their userName. Used to personalise the experience while using the skill.
+    activeProfile: str
+        Id of the profile that was used last
     words: str array 
         List of words that is already in the database. Empty if no words have been added.
-    userName: str
-        Name of the user who is using the skill. Used to personalise the experience while using the skill.
+    listVersion: int
+        Increased every time the word list changes
+    wordReport:
+        Stores all words and how many times the user has gotten the wrong
+    testAttempts:
+        Tracks the number of times a user has begun a test
+    topMissed:
+        The words the user has gotten wrong the most and how many times, most first
+    wordSchedule:
+        The test each word is next due to be asked in, and the gap before the one after if it is right
+    resultDays:
+        The results of the last 30 days added up per day, for reports, as counters keyed by day and
+        name, e.g. 2024-03-01/marked. Each result is also kept as a record of its own until it
+        expires (see utils.record_test_result)
 
     """
     def can_handle(self, handler_input):
@@ -69,71 +86,39 @@ class LaunchRequestHandler(AbstractRequestHandler):
 
     def handle(self, handler_input):
         # type: (HandlerInput) -> Response
-        speak_output = "Welcome to spelling practice, you can update your list or begin a test"
-        
         #initialising session attributes and persistent attributes.
         session_attr = handler_input.attributes_manager.session_attributes
         persistent_attr = handler_input.attributes_manager.persistent_attributes
         
         session_attr["nextWordIndex"] = 0
-        session_attr["words"] = []
-        session_attr["numOfWords"] = 0
         session_attr["correctAnswers"] = 0
-        session_attr["wordReport"] = {}
-        session_attr["testAttempts"] = 0
         session_attr["pronounciation"] = "phonetic"
-        
-        #No words in the database
-        if persistent_attr.get("words") is None: 
-            #assign an empty list for the words to be saved
-            persistent_attr["words"] = []
-        else:
-            #Get the words from the database for the session
-            session_attr["words"] = persistent_attr["words"]
-            session_attr["numOfWords"] = len(session_attr.get("words"))
-        
-        #check for test attempt number
-        if persistent_attr.get("testAttempts") is None:
-            persistent_attr["testAttempts"] = session_attr["testAttempts"]
-        else:
-            session_attr["testAttempts"] = persistent_attr["testAttempts"]
-            
-        
-        #Checks for existing Word Report
-        if persistent_attr.get("wordReport") is None:
-            persistent_attr["wordReport"] = {}
-        else:
-            session_attr["wordReport"] = persistent_attr["wordReport"]
+        session_attr["markingResults"] = {}
+        #the session cursor is pointed at the word list the first time the list is read
+        session_attr["listVersion"] = None
+        session_attr["numOfWords"] = 0
+        profiles = persistent_attr.get("profiles", {})
             
         #No users found in the database
-        if persistent_attr.get("userName") is None:
+        if not profiles:
             #Change the state of the program to add user
             session_attr["state"] = "ADDUSER"
-            speak_output = "Have we met before? Please tell me your name to continue."
-            return(
-                handler_input.response_builder
-                .speak(speak_output)
-                .ask(speak_output)
-                .response
-        )
+            return responses.respond(handler_input, responses.render("launch.new_user"), reprompt=True)
         #User present in the database
         else:
-            speak_output = "Welcome to Spelling Practice " +persistent_attr["userName"] + ". You can update your list or begin a test"
-        return (
-            handler_input.response_builder
-                .speak(speak_output)
-                .ask(speak_output)
-                .response
-        )
+            session_attr["profile"] = persistent_attr.profile_id
+            speak_output = responses.render("launch.welcome_profiles" if len(profiles) > 1 else "launch.welcome",
+                                            name=utils.get_user_name(handler_input))
+        return responses.respond(handler_input, speak_output, reprompt=True)
 
 class GetUsernameIntentHandler(AbstractRequestHandler):
-    """Handler to add the username to the database.
+    """Handler to add the username to the database, or to switch to the profile of a child who already has one.
     
     @Requires session to be in ADDUSER state and a name is uttered by the user.
     userName: str
         Name of the user. Obtained from the slot named "userName" in the request body.
-    persistent_attr["userName"]: str
-        Assigned the previously obtained userName to save to the database.
+    utils.select_profile(handler_input, userName) -> bool:
+        Selects the profile for userName, creating it (and returning True) if it is new.
         
     """
     def can_handle(self, handler_input):
@@ -147,28 +132,60 @@ class GetUsernameIntentHandler(AbstractRequestHandler):
 
     def handle(self, handler_input):
         
-        persistent_attr = handler_input.attributes_manager.persistent_attributes
         userName = ask_utils.request_util.get_slot_value(handler_input,"userName")
-        persistent_attr["userName"] = userName
-        speak_output = "Hello " + userName + ". Welcome to Alexa Spelling Test Helper. You can say update my list or begin  test."
-        handler_input.attributes_manager.save_persistent_attributes()
+        if utils.select_profile(handler_input, userName):
+            speak_output = responses.render("username.new", name=userName)
+        else:
+            speak_output = responses.render("username.known", name=utils.get_user_name(handler_input))
 
-        return (
-            handler_input.response_builder
-                .speak(speak_output)
-                # .ask("add a reprompt if you want to keep the session open for the user to respond")
-                .response
-        )
+        return responses.respond(handler_input, speak_output)
+
+class SwitchProfileIntentHandler(AbstractRequestHandler):
+    """Handler to change which child is practising, or to add another child.
+    
+    session_attr["state"] set to ADDUSER so the next name uttered selects or creates a profile.
+    """
+    def can_handle(self, handler_input):
+        # type: (HandlerInput) -> bool
+        return ask_utils.is_intent_name("SwitchProfileIntent")(handler_input)
+
+    def handle(self, handler_input):
+        # type: (HandlerInput) -> Response
+        session_attr = handler_input.attributes_manager.session_attributes
+        persistent_attr = handler_input.attributes_manager.persistent_attributes
+        session_attr["state"] = "ADDUSER"
+        names = [profile["userName"] for profile in persistent_attr.get("profiles", {}).values()]
+        speak_output = responses.render("profile.ask")
+        if names:
+            speak_output = responses.render("profile.choose", names=utils.join_words(names, "or"))
+        return responses.respond(handler_input, speak_output, reprompt=True)
+
+class ProfileRequiredHandler(AbstractRequestHandler):
+    """Handler for requests that need a child's profile when no profile has been selected yet,
+    e.g. a new household asking to add words before saying who is practising.
+    
+    session_attr["state"] set to ADDUSER so the next name uttered creates or selects a profile.
+    """
+    def can_handle(self, handler_input):
+        # type: (HandlerInput) -> bool
+        return not utils.has_profile(handler_input)
+
+    def handle(self, handler_input):
+        # type: (HandlerInput) -> Response
+        handler_input.attributes_manager.session_attributes["state"] = "ADDUSER"
+        return responses.respond(handler_input, responses.render("profile.required"), reprompt=True)
 
 class BeginQuizIntentHandler(AbstractRequestHandler):
     """Handler to launch the quiz/test for the child.
     @Requires user asks to begin test
     
+    plan_test(handler_input) -> list:
+        Helper function that chooses the words for the test, those the child most needs to practise first
     get_word_to_practise(handler_input) -> str:
-        Helper function that returns a string containing a word to practise
+        Helper function that returns a string containing the next word in the test
         
     session_attr["state"] set to TEST to run a test during the session
-    session_attr["testAttempts"] to keep track of number of times the child runs the test
+    persistent_attr["testAttempts"] to keep track of number of times the child runs the test
     """
     def can_handle(self, handler_input):
         # type: (HandlerInput) -> bool
@@ -178,22 +195,14 @@ class BeginQuizIntentHandler(AbstractRequestHandler):
         # type: (HandlerInput) -> Response
         session_attr = handler_input.attributes_manager.session_attributes
         persistent_attr = handler_input.attributes_manager.persistent_attributes
-        session_attr["nextWordIndex"] = 0
-        session_attr["testAttempts"] += 1
-        persistent_attr["testAttempts"] = session_attr["testAttempts"]
-        handler_input.attributes_manager.save_persistent_attributes()
-        if len(session_attr["words"])  == 0:
-            speak_output = "Please add words to your spelling list to begin a test"
+        persistence.increment(persistent_attr, ("testAttempts",))
+        if len(utils.plan_test(handler_input))  == 0:
+            speak_output = responses.render("quiz.no_words")
         else:
             session_attr["state"] = "TEST"
             word_to_practise = utils.get_word_to_practise(handler_input)
-            speak_output = "Your test will now begin. " + "Your first word is:<break time='0.3s'></break> " + word_to_practise
-        return (
-            handler_input.response_builder
-                .speak(speak_output)
-                .ask(speak_output)
-                .response
-        )
+            speak_output = responses.render("quiz.begin", word=word_to_practise)
+        return responses.respond(handler_input, speak_output, reprompt=True)
 
 class TellWordIntentHandler(AbstractRequestHandler):
     """
@@ -202,7 +211,7 @@ class TellWordIntentHandler(AbstractRequestHandler):
     @Requires session to be in TEST state and user asks for next words.
     
     get_word_to_practise(handler_input) -> str:
-        Helper function that returns a string containing a word to practise
+        Helper function that returns a string containing the next word in the test, None once the test is finished
         
     """
     def can_handle(self, handler_input):
@@ -216,63 +225,46 @@ class TellWordIntentHandler(AbstractRequestHandler):
         session_attr = handler_input.attributes_manager.session_attributes
         counter = session_attr["nextWordIndex"]
         currentWord = utils.get_word_to_practise(handler_input)
-        if currentWord == "0":
-            speak_output = "You haven't added any words yet. Say update my spelling list to add words to your spelling list."
-        elif currentWord == "1":
-            speak_output = "You have completed your spelling test! You can say 'begin checking' to check your spellings."
-        elif currentWord != "0" or currentWord != "1":
-            speak_output = "Your {} word is: {}".format(utils.get_ordinal_indicator(handler_input,counter), currentWord)
+        if currentWord is not None:
+            speak_output = responses.render("quiz.word", ordinal=utils.get_ordinal_indicator(handler_input,counter), word=currentWord)
+        elif len(utils.get_words(handler_input)) == 0:
+            speak_output = responses.render("quiz.empty_list")
+        else:
+            speak_output = responses.render("quiz.complete")
         
-        return(
-            handler_input.response_builder
-            .speak(speak_output)
-            .ask(speak_output)
-            .response
-            )
+        return responses.respond(handler_input, speak_output, reprompt=True)
 
 class BeginMarkingIntentHandler(AbstractRequestHandler):
     """ Hanlder for the child's intent to check the spelling of the words they just practised.
     
     session_attr["state"] set to MARKING to check answers/spellings during the session
-    session_attr["wordReport"] to keep track of number of words the child got incorrect
+    persistent_attr["wordReport"] to keep track of number of words the child got incorrect
     session_attr["pronounciation"] set by default to 'phonetics' to get the phonetic spelling. 
     
-    utils.get_spelling_for_word(word_to_practise) -> str:
-        Helper function that returns the spelling of the given word as individual letters.
-    
-      utils.get_phonetic_spelling(word_to_practise) -> str:
-        Helper function that returns the phonetic spelling of the given word.
+    utils.render_spelling(word_to_practise, pronounciation) -> str:
+        Helper function that returns the cached spelling of the given word, as individual
+        letters if pronounciation is 'letters' and as its phonetic spelling otherwise.
     """
     def can_handle(self, handler_input):
-        session_attr = handler_input.attributes_manager.session_attributes
-        return (ask_utils.is_intent_name("BeginMarkingIntent")(handler_input)
-           # and 
-           # (session_attr.get("state") == "MARKING")
-        )
+        return ask_utils.is_intent_name("BeginMarkingIntent")(handler_input)
     
     def handle(self, handler_input):
         session_attr = handler_input.attributes_manager.session_attributes
-        persistent_attr = handler_input.attributes_manager.persistent_attributes
-        report = session_attr["wordReport"]
-        #checks if report is empty and initialises it
-        if not bool(report):
-            report = utils.create_word_report(handler_input)
+        #save any results left over from an unfinished marking pass before starting again
+        utils.save_marking_results(handler_input)
         session_attr["nextWordIndex"] = 0
-        if len(session_attr["words"])  == 0:
-            speak_output = "Please add words to your spelling list to begin spell-checking"
+        #mark the words in the test that was just taken, or choose them if no test was taken this session
+        if utils.get_test_length(handler_input) == 0:
+            utils.plan_test(handler_input)
+        if utils.get_test_length(handler_input) == 0:
+            speak_output = responses.render("marking.no_words")
         else:
             session_attr["state"] = "MARKING"
             word_to_practise = utils.get_word_to_practise(handler_input)
-            if session_attr["pronounciation"] == "letters":
-                speak_output = "Spell-Checker will now begin. " + "Your first word was " + word_to_practise + ". The spelling is: " + utils.get_spelling_for_word(word_to_practise) + ".<break time='0.5s'></break> Did you get that right?"
-            else:
-                speak_output = "Spell-Checker will now begin. " + "Your first word was " + word_to_practise + ". The spelling is: " + utils.get_phonetic_spelling(word_to_practise) + ".<break time='0.5s'></break> Did you get that right?"
-        return(
-            handler_input.response_builder
-            .speak(speak_output)
-            .ask(speak_output)
-            .response
-            )
+            pronounciation = "letters" if session_attr["pronounciation"] == "letters" else "phonetic"
+            speak_output = responses.render("marking.begin", word=word_to_practise,
+                                            spelling=utils.render_spelling(word_to_practise, pronounciation))
+        return responses.respond(handler_input, speak_output, reprompt=True)
 
 
 class TellAnswerIntentHandler(AbstractRequestHandler):
@@ -282,7 +274,7 @@ class TellAnswerIntentHandler(AbstractRequestHandler):
     @Requires session to be in MARKING state and user asks for next answer/spelling.
     
     get_word_to_practise(handler_input) -> str:
-        Helper function that returns a string containing a word to practise
+        Helper function that returns a string containing the next word in the test, None once the test is finished
         
     """
     def can_handle(self, handler_input):
@@ -294,45 +286,23 @@ class TellAnswerIntentHandler(AbstractRequestHandler):
     #This handle function is the previous function where it returned a spelling of the word with the pause between each letters.
     def handle(self, handler_input):
         session_attr = handler_input.attributes_manager.session_attributes
-        pronounciation = session_attr.get("pronounciation")
-        speak_output = pronounciation
-        #if user wants the words spelled out as letter
-        if pronounciation == "letters":
-            session_attr = handler_input.attributes_manager.session_attributes
-            counter = session_attr["nextWordIndex"]
-            currentWord = utils.get_word_to_practise(handler_input)
-            if currentWord == "0":
-                speak_output = "I'm sorry but it seems that there are no words for you to practise this week."
-            elif currentWord == "1":
-                speak_output = "Spell-Checker Completed. You can close this program now."    
-            elif currentWord != "0" or currentWord != "1":
-                #the prosody tag will let us set the speed in which Alexa spells out each letter 
-                #use it similarly for phonemes in the future
-                speak_output = "Your {} word was {}".format(utils.get_ordinal_indicator(handler_input,counter), currentWord) + ". It is spelt as: " + utils.get_spelling_for_word(currentWord) + ".<break time='0.5s'></break> Did you get that right?"
-        #default phonetic spelling
-        if pronounciation == "phonetic":
-            session_attr = handler_input.attributes_manager.session_attributes
-            counter = session_attr["nextWordIndex"]
-            currentWord = utils.get_word_to_practise(handler_input)
-            if currentWord == "0":
-                speak_output = "I'm sorry but it seems that there are no words for you to practise this week."
-            elif currentWord == "1":
-                speak_output = "That's all the words you needed to practise today. You can close this program now."    
-            elif currentWord != "0" or currentWord != "1":
-                speak_output = "Your {} word was {}".format(utils.get_ordinal_indicator(handler_input,counter), currentWord) + ". It is spelt as: " + utils.get_phonetic_spelling(currentWord) + ".<break time='0.5s'></break> Did you get that right?"
-                #speak_output = "Your {} word was {}".format(utils.get_ordinal_indicator(handler_input,counter), currentWord) + ". It is spelt as: " + utils.get_spelling_for_word(currentWord) + ".<break time='0.5s'></break> Did you get that right?"
-        return(handler_input.response_builder
-        .speak(speak_output)
-        .ask(speak_output)
-        .response
-        )
+        #words are spelt as letters if the user asked for them, and phonetically by default
+        pronounciation = "letters" if session_attr.get("pronounciation") == "letters" else "phonetic"
+        counter = session_attr["nextWordIndex"]
+        currentWord = utils.get_word_to_practise(handler_input)
+        if currentWord is None and len(utils.get_words(handler_input)) == 0:
+            speak_output = responses.render("marking.empty_list")
+        elif currentWord is None:
+            speak_output = responses.render("marking.complete_" + pronounciation)
+        else:
+            speak_output = responses.render("marking.answer", ordinal=utils.get_ordinal_indicator(handler_input,counter),
+                                            word=currentWord, spelling=utils.render_spelling(currentWord, pronounciation))
+        return responses.respond(handler_input, speak_output, reprompt=True)
 
 class ClearSpellingListIntentHandler(AbstractRequestHandler):
     """Handler to clear the user's current word list
     
     persistent_attr["words"] are the current words set for the child to practise
-    session_attr["words"] contains words from the database as well as any words the user might have added in the current session that is not\
-        saved to the database yet.
     
     """
     def can_handle(self, handler_input):
@@ -340,22 +310,18 @@ class ClearSpellingListIntentHandler(AbstractRequestHandler):
         return ask_utils.is_intent_name("ClearSpellingListIntent")(handler_input)
 
     def handle(self, handler_input):
-        session_attr = handler_input.attributes_manager.session_attributes
-        persistent_attr = handler_input.attributes_manager.persistent_attributes
-        session_attr["words"] = []
-        persistent_attr["words"] = session_attr["words"]
-        #save empty word list to the database
-        handler_input.attributes_manager.save_persistent_attributes()
-        speak_output = "Ok. I have cleared all the words from your spelling list. You can make a new list by saying 'create a new spelling list'."
-        return (
-            handler_input.response_builder.speak(speak_output)
-                .response
-        )
+        #empty word list and report are saved to the database by SavePersistentAttributesResponseInterceptor
+        utils.clear_words(handler_input)
+        return responses.respond(handler_input, responses.render("list.cleared"))
 
 class ConfirmWordIntentHandler(AbstractRequestHandler):
     """Handler to confirm if the child got a particular word right/wrong.
     
     @Requires child to confirm if they got the word right/wrong by saying yes or no
+    
+    Results are kept in session_attr["markingResults"] and only saved to the database
+    once the last word has been confirmed, so a marking pass costs a single write and
+    confirming a word does not need to read the database.
     """
     def can_handle(self, handler_input):
         # type: (HandlerInput) -> bool
@@ -363,43 +329,49 @@ class ConfirmWordIntentHandler(AbstractRequestHandler):
 
     def handle(self, handler_input):
         session_attr = handler_input.attributes_manager.session_attributes
-        persistent_attr = handler_input.attributes_manager.persistent_attributes
         answer = ask_utils.request_util.get_slot_value(handler_input,"yesNo")
-        report = session_attr["wordReport"]
-        currentWord = session_attr["words"][session_attr["nextWordIndex"]-1]
+        testLength = utils.get_test_length(handler_input)
+        #if they got it wrong, the word is marked so its count is increased when the pass is saved.
+        #a word that was already marked, e.g. the last one once the pass is saved, is not counted again
+        recorded = utils.record_marking_result(handler_input, answer == "yes")
         if answer == "yes":
-            session_attr["correctAnswers"] += 1
-            if session_attr["nextWordIndex"] == len(session_attr["words"]):
-                speak_output = "Well done! Spell-Checking Complete"
+            if recorded:
+                session_attr["correctAnswers"] += 1
+            if session_attr["nextWordIndex"] == testLength:
+                speak_output = responses.render("confirm.right_complete")
             else:
-                speak_output = "Well done! You can say 'next one' to hear the spelling of your next word."   
+                speak_output = responses.render("confirm.right")
         else:
-            #if they got it wrong, increase the count for the word to denote they got it wrong.
-            report[currentWord] += 1
-            if session_attr["nextWordIndex"] == len(session_attr["words"]):
-                speak_output = "Unlucky! Spell-Checking Complete"
+            if session_attr["nextWordIndex"] == testLength:
+                speak_output = responses.render("confirm.wrong_complete")
             else:
-                speak_output = "Unlucky! You can say 'next one' to hear the spelling of your next word."
-        session_attr["wordReport"] = report
-        persistent_attr["wordReport"] = session_attr["wordReport"]
-        handler_input.attributes_manager.save_persistent_attributes()
+                speak_output = responses.render("confirm.wrong")
+        #save the whole marking pass to the database once the last word is confirmed,
+        #or again if saving it failed and the results were put back in the session
+        if session_attr["nextWordIndex"] == testLength:
+            utils.save_marking_results(handler_input)
         
-        return (
-            handler_input.response_builder
-                .speak(speak_output)
-                .ask(speak_output)
-                .response
-        )
+        return responses.respond(handler_input, speak_output, reprompt=True)
 
 class ChildPractiseReportIntentHandler(AbstractRequestHandler):
     """Handler to show parents how well their child practised the set words.
     
     @Requires parent to ask alexa to show the child's report
     
-     session_attr["wordReport"] is a dictionary containing the the word and the corresponding number denotes the number of times the child got it wrong.
-     session_attr["testAttempts"] is the number of times the child attemepted the test.
-    utils.sortReport(report) -> dict:
-        It takes wordReport python dictionary and returns a sorted python dictionary
+     persistent_attr["wordReport"] is a dictionary containing the the word and the corresponding number denotes the number of times the child got it wrong.
+     persistent_attr["testAttempts"] is the number of times the child attemepted the test.
+    utils.get_recent_results(handler_input, days) -> dict:
+        Returns how many words the child marked and missed in the last 7 or 30 days, from the rolling
+        aggregates in persistent_attr["resultDays"], so past results are never read one by one.
+    utils.get_improving_words(handler_input) -> list:
+        Returns the words the child got wrong earlier in the last 30 days but not in the last 7.
+    utils.get_report_page(handler_input, cursor) -> (list, list):
+        Returns the next page of words the child got wrong and how many times, with the most incorrect first,
+        and the cursor of the page after it.
+    
+    The report is spoken a page of utils.REPORT_PAGE_SIZE words at a time. If there are more words,
+    session_attr["reportCursor"] is set to the last word spoken and the parent can say more to hear
+    the next page (see MoreIntentHandler).
     """
     def can_handle(self, handler_input):
         # type: (HandlerInput) -> bool
@@ -407,26 +379,79 @@ class ChildPractiseReportIntentHandler(AbstractRequestHandler):
 
     def handle(self, handler_input):
         # type: (HandlerInput) -> Response
-        session_attr = handler_input.attributes_manager.session_attributes
         persistent_attr = handler_input.attributes_manager.persistent_attributes
-        name = persistent_attr["userName"]
-        report = session_attr["wordReport"]
-        #sorts dictionary of report with most incorrect words first
-        #sortedReport = sorted(report.items(), key=lambda x: x[1], reverse=True)
-        sortedReport = utils.sortReport(report)
-        #speak_output = name + " has currently attempted the test " + str(session_attr["testAttempts"]) + " times, and their most incorrect words are, " + str(sortedReport)
-        speak_output =  name + " has currently attempted the test " + str(session_attr["testAttempts"]) + " times."
-        for key, value in sortedReport:
-            if value != 0:
-                speak_output += " They got the word " + key + " wrong " + str(value) + " times. "
-
-        # print resulting string
-        return (
-            handler_input.response_builder
-                .speak(speak_output)
-                # .ask("add a reprompt if you want to keep the session open for the user to respond")
-                .response
-        )
+        name = utils.get_user_name(handler_input)
+        #include the results of a marking pass that is still in progress
+        utils.save_marking_results(handler_input)
+        speech = [responses.render("report.attempts", name=name, attempts=persistent_attr.get("testAttempts", 0))]
+        marked = 0
+        for days in (7, utils.RESULT_HISTORY_DAYS):
+            recent = utils.get_recent_results(handler_input, days)
+            #the longer window is only spoken if it has results the shorter one does not
+            if recent["marked"] > marked:
+                speech.append(responses.render("report.recent", days=days, right=recent["marked"] - recent["missed"],
+                                               marked=recent["marked"]))
+                marked = recent["marked"]
+        improving = utils.get_improving_words(handler_input)
+        if improving:
+            speech.append(responses.render("report.improving", words=utils.join_words(improving)))
+        return respond_with_report_page(handler_input, speech, None)
+
+class MoreIntentHandler(AbstractRequestHandler):
+    """Handler for the parent asking for the next page of the report.
+    
+    session_attr["reportCursor"] is the last word spoken by the page before, and is removed
+    once the last page has been spoken.
+    """
+    def can_handle(self, handler_input):
+        # type: (HandlerInput) -> bool
+        return ask_utils.is_intent_name("AMAZON.MoreIntent")(handler_input)
+
+    def handle(self, handler_input):
+        # type: (HandlerInput) -> Response
+        session_attr = handler_input.attributes_manager.session_attributes
+        cursor = session_attr.get("reportCursor")
+        if cursor is None:
+            return responses.respond(handler_input, responses.render("report.no_more"))
+        return respond_with_report_page(handler_input, [], cursor)
+
+def respond_with_report_page(handler_input, speech, cursor):
+    #HandlerInput, str list, list -> Response
+    """Return a response speaking speech and then the page of the report after cursor, asking for more if there is another page."""
+    session_attr = handler_input.attributes_manager.session_attributes
+    page, next_cursor = utils.get_report_page(handler_input, cursor)
+    speech.extend(responses.render("report.missed_word", word=word, count=misses) for word, misses in page)
+    if next_cursor is None:
+        session_attr.pop("reportCursor", None)
+        return responses.respond(handler_input, " ".join(speech))
+    session_attr["reportCursor"] = next_cursor
+    more = responses.render("report.more")
+    speech.append(more)
+    return responses.respond(handler_input, " ".join(speech), reprompt=more)
+    
+class MostIncorrectWordIntentHandler(AbstractRequestHandler):
+    """Handler to tell parents which word their child got wrong the most.
+    
+    @Requires parent to ask alexa for the child's most incorrect word
+    
+    utils.get_top_missed(handler_input) -> list:
+        Returns the words the child got wrong the most and how many times, with the most incorrect first.
+    """
+    def can_handle(self, handler_input):
+        # type: (HandlerInput) -> bool
+        return ask_utils.is_intent_name("MostIncorrectWordIntent")(handler_input)
+
+    def handle(self, handler_input):
+        # type: (HandlerInput) -> Response
+        name = utils.get_user_name(handler_input)
+        utils.save_marking_results(handler_input)
+        topMissed = utils.get_top_missed(handler_input)
+        if len(topMissed) == 0 or topMissed[0][1] == 0:
+            speak_output = responses.render("report.no_misses", name=name)
+        else:
+            word, value = topMissed[0]
+            speak_output = responses.render("report.most_missed", name=name, word=word, count=value)
+        return responses.respond(handler_input, speak_output)
     
 class AddSpellingIntentHandler(AbstractRequestHandler):
     """Handler to update the list of words containing the spellings to be practised.
@@ -436,7 +461,13 @@ class AddSpellingIntentHandler(AbstractRequestHandler):
         Contains a string of words added by the user. The value is obtained from the slot named 'words' in 
         the AddSpellingIntent of the interaction model. Can contain a single word or multiple words separated
         by a space.Deployment
+
+    Words are added in lower case, once each. Words already on the list are skipped, and words that are
+    not in the dictionary index are not added; near matches are suggested instead (see utils.check_new_words).
     
+    utils.add_words(handler_input, words) -> None:
+        Adds the new words to the end of the list. Only the new words are written, and the report,
+        schedule and test attempts of the words already on the list are kept.
     """
     def can_handle(self, handler_input):
         # type: (HandlerInput) -> bool
@@ -444,32 +475,65 @@ class AddSpellingIntentHandler(AbstractRequestHandler):
 
     def handle(self, handler_input):
         # type: (HandlerInput) -> Response
-        session_attr = handler_input.attributes_manager.session_attributes
-        persistent_attr = handler_input.attributes_manager.persistent_attributes
+        #split all the words in the string and make a list
+        slot_words = (ask_utils.request_util.get_slot_value(handler_input,"words") or "").split()
+        new_words, known_words, unknown_words = utils.check_new_words(handler_input, slot_words)
         
-        #split all the words in the string and make a list 
-        slot_words = ask_utils.request_util.get_slot_value(handler_input,"words").split()
-        
-        session_attr["words"] += slot_words
-        persistent_attr["words"] = session_attr["words"]
-        #reset the number of test attempts after new words are added to the list
-        session_attr["testAttempts"] = 0
-        persistent_attr["testAttempts"] = session_attr["testAttempts"]
-        #save the words to the database
-        handler_input.attributes_manager.save_persistent_attributes()
-        #creates new report to reset incorrect answers for words
-        report = utils.create_word_report(handler_input)
-        session_attr["wordReport"] = report
-        persistent_attr["wordReport"] = session_attr["wordReport"]
-        #new report is saved persistently
-        handler_input.attributes_manager.save_persistent_attributes()
-        speak_output = "Ok. I have added the word."   
-        return (
-            handler_input.response_builder
-                .speak(speak_output)
-                # .ask("add a reprompt if you want to keep the session open for the user to respond")
-                .response
-        )
+        speech = []
+        if new_words:
+            #the new words are saved by SavePersistentAttributesResponseInterceptor
+            utils.add_words(handler_input, new_words)
+            #render the spellings of the new words now so marking turns only look them up
+            utils.prerender_spellings(new_words)
+            speech.append(responses.render("add.added_one") if len(new_words) == 1 else responses.render("add.added", count=len(new_words)))
+        if known_words:
+            speech.append(responses.render("add.known_one" if len(known_words) == 1 else "add.known",
+                                           words=utils.join_words(known_words)))
+        for slot_word, suggestions in unknown_words.items():
+            speech.append(responses.render("add.unknown", word=slot_word))
+            if suggestions:
+                speech.append(responses.render("add.suggest", suggestions=utils.join_words(suggestions, "or"),
+                                               suggestion=suggestions[0]))
+        if not slot_words:
+            speech = [responses.render("add.ask")]
+        return responses.respond(handler_input, " ".join(speech))
+
+class RemoveSpellingIntentHandler(AbstractRequestHandler):
+    """Handler to take words off the list of words to be practised.
+    
+    @Requires user to ask alexa to remove one or more words from their list.
+    words: str 
+        The words to remove, from the slot named 'words' in the RemoveSpellingIntent of the interaction model.
+    
+    utils.remove_words(handler_input, words) -> (list, list):
+        Takes the words off the list and out of the report, returning those that were removed and
+        those that were not on the list. Only the removal of the words is written.
+    """
+    def can_handle(self, handler_input):
+        # type: (HandlerInput) -> bool
+        return ask_utils.is_intent_name("RemoveSpellingIntent")(handler_input)
+
+    def handle(self, handler_input):
+        # type: (HandlerInput) -> Response
+        slot_words = (ask_utils.request_util.get_slot_value(handler_input,"words") or "").split()
+        words = []
+        for slot_word in slot_words:
+            word = utils.normalize_word(slot_word.strip(",.!?;:\"()"))
+            if word is not None and word not in words:
+                words.append(word)
+        if not words:
+            return responses.respond(handler_input, responses.render("remove.ask"), reprompt=True)
+        #results marked so far hold the indexes of the words, which the removal moves
+        utils.save_marking_results(handler_input)
+        removed, missing = utils.remove_words(handler_input, words)
+        speech = []
+        if removed:
+            speech.append(responses.render("remove.removed_one") if len(removed) == 1
+                          else responses.render("remove.removed", count=len(removed)))
+        if missing:
+            speech.append(responses.render("remove.missing_one" if len(missing) == 1 else "remove.missing",
+                                           words=utils.join_words(missing)))
+        return responses.respond(handler_input, " ".join(speech))
 
 class ChangeToPhoneticsIntentHandler(AbstractRequestHandler):
     """Handler for changing answers to phonetics."""
@@ -481,14 +545,7 @@ class ChangeToPhoneticsIntentHandler(AbstractRequestHandler):
         # type: (HandlerInput) -> Response
         session_attr = handler_input.attributes_manager.session_attributes
         session_attr["pronounciation"] = "phonetics"
-        speak_output = "Answers will be told in phonetics"
-
-        return (
-            handler_input.response_builder
-                .speak(speak_output)
-                .ask(speak_output)
-                .response
-        )
+        return responses.respond(handler_input, responses.render("settings.phonetics"), reprompt=True)
 
 class ChangeToLettersIntentHandler(AbstractRequestHandler):
     """Handler for changing answers to Letters."""
@@ -500,31 +557,18 @@ class ChangeToLettersIntentHandler(AbstractRequestHandler):
         # type: (HandlerInput) -> Response
         session_attr = handler_input.attributes_manager.session_attributes
         session_attr["pronounciation"] = "letters"
-        speak_output = "Answers will be told in letters"
-
-        return (
-            handler_input.response_builder
-                .speak(speak_output)
-                .ask(speak_output)
-                .response
-        )
+        return responses.respond(handler_input, responses.render("settings.letters"), reprompt=True)
 
 class HelpIntentHandler(AbstractRequestHandler):
-    """Handler for Help Intent."""
+    """Handler for Help and Navigate Home Intent."""
     def can_handle(self, handler_input):
         # type: (HandlerInput) -> bool
-        return ask_utils.is_intent_name("AMAZON.HelpIntent")(handler_input)
+        return (ask_utils.is_intent_name("AMAZON.HelpIntent")(handler_input) or
+                ask_utils.is_intent_name("AMAZON.NavigateHomeIntent")(handler_input))
 
     def handle(self, handler_input):
         # type: (HandlerInput) -> Response
-        speak_output = "You can say hello to me! How can I help?"
-
-        return (
-            handler_input.response_builder
-                .speak(speak_output)
-                .ask(speak_output)
-                .response
-        )
+        return responses.respond(handler_input, responses.render("help"), reprompt=True)
 
 
 class CancelOrStopIntentHandler(AbstractRequestHandler):
@@ -536,13 +580,9 @@ class CancelOrStopIntentHandler(AbstractRequestHandler):
 
     def handle(self, handler_input):
         # type: (HandlerInput) -> Response
-        speak_output = "Goodbye!"
-
-        return (
-            handler_input.response_builder
-                .speak(speak_output)
-                .response
-        )
+        #save the results of a marking pass that was stopped part way through
+        utils.save_marking_results(handler_input)
+        return responses.respond(handler_input, responses.render("goodbye"))
 
 
 class SessionEndedRequestHandler(AbstractRequestHandler):
@@ -554,6 +594,9 @@ class SessionEndedRequestHandler(AbstractRequestHandler):
     def handle(self, handler_input):
         # type: (HandlerInput) -> Response
         # Any cleanup logic goes here.
+        #the session attributes are still sent with this request, so the results of a
+        #marking pass that was dropped part way through are recovered here
+        utils.save_marking_results(handler_input)
         return handler_input.response_builder.response
 
 
@@ -570,14 +613,7 @@ class IntentReflectorHandler(AbstractRequestHandler):
     def handle(self, handler_input):
         # type: (HandlerInput) -> Response
         intent_name = ask_utils.get_intent_name(handler_input)
-        speak_output = "You just triggered " + intent_name + "."
-
-        return (
-            handler_input.response_builder
-                .speak(speak_output)
-                # .ask("add a reprompt if you want to keep the session open for the user to respond")
-                .response
-        )
+        return responses.respond(handler_input, responses.render("reflector", intent=intent_name))
 
 
 class CatchAllExceptionHandler(AbstractExceptionHandler):
@@ -592,40 +628,67 @@ class CatchAllExceptionHandler(AbstractExceptionHandler):
     def handle(self, handler_input, exception):
         # type: (HandlerInput, Exception) -> Response
         logger.error(exception, exc_info=True)
+        #the attributes may not have been saved, so marking results taken out of the session are kept in it
+        utils.restore_marking_results(handler_input)
 
-        speak_output = "Sorry, I had trouble doing what you asked. Please try again."
+        response = responses.respond(handler_input, responses.render("error"), reprompt=True)
+        #response interceptors are skipped when a handler raises, so record the turn here
+        metrics.emit_turn_metrics(handler_input, response, persistence.persistence_adapter, error=True)
+        return response
 
-        return (
-            handler_input.response_builder
-                .speak(speak_output)
-                .ask(speak_output)
-                .response
-        )
+class SavePersistentAttributesResponseInterceptor(AbstractResponseInterceptor):
+    """Saves the persistent attributes once, after the handler has built its response.
+    
+    Handlers only change handler_input.attributes_manager.persistent_attributes and
+    never save them directly, so a request makes at most one write to the database.
+    Nothing is written if the persistent attributes were never loaded, and the
+    persistence adapter skips the write if none of them changed.
+    """
+    def process(self, handler_input, response):
+        # type: (HandlerInput, Response) -> None
+        handler_input.attributes_manager.save_persistent_attributes()
+        utils.marking_results_saved(handler_input)
 
 # The SkillBuilder object acts as the entry point for your skill, routing all request and response
 # payloads to the handlers above. Make sure any new handlers or interceptors you've
-# defined are included below. The order matters - they're processed top to bottom.
-
-
-sb = CustomSkillBuilder(persistence_adapter = dynamodb_adapter)
-
-sb.add_request_handler(LaunchRequestHandler())
-sb.add_request_handler(BeginQuizIntentHandler())
-sb.add_request_handler(GetUsernameIntentHandler())
-sb.add_request_handler(AddSpellingIntentHandler())
-sb.add_request_handler(ChildPractiseReportIntentHandler())
-sb.add_request_handler(BeginMarkingIntentHandler())
-sb.add_request_handler(ConfirmWordIntentHandler())
-sb.add_request_handler(ChangeToLettersIntentHandler())
-sb.add_request_handler(ChangeToPhoneticsIntentHandler())
-sb.add_request_handler(ClearSpellingListIntentHandler())
-sb.add_request_handler(TellWordIntentHandler())
-sb.add_request_handler(TellAnswerIntentHandler())
-sb.add_request_handler(HelpIntentHandler())
-sb.add_request_handler(CancelOrStopIntentHandler())
-sb.add_request_handler(SessionEndedRequestHandler())
-sb.add_request_handler(IntentReflectorHandler()) # make sure IntentReflectorHandler is last so it doesn't override your custom intent handlers
+# defined are included below. Requests are routed by request type, intent name and
+# session state, so the order of the routes does not matter.
+
+intent_router = router.IntentRouter()
+
+intent_router.add_route(LaunchRequestHandler(), "LaunchRequest")
+intent_router.add_route(BeginQuizIntentHandler(), "IntentRequest", ["BeginQuizIntent"])
+intent_router.add_route(GetUsernameIntentHandler(), "IntentRequest", ["GetUsernameIntent"], states=["ADDUSER"])
+intent_router.add_route(SwitchProfileIntentHandler(), "IntentRequest", ["SwitchProfileIntent"])
+intent_router.add_route(AddSpellingIntentHandler(), "IntentRequest", ["AddSpellingIntent"])
+intent_router.add_route(RemoveSpellingIntentHandler(), "IntentRequest", ["RemoveSpellingIntent"])
+intent_router.add_route(ChildPractiseReportIntentHandler(), "IntentRequest", ["ChildPractiseReportIntent"])
+intent_router.add_route(MoreIntentHandler(), "IntentRequest", ["AMAZON.MoreIntent"])
+intent_router.add_route(MostIncorrectWordIntentHandler(), "IntentRequest", ["MostIncorrectWordIntent"])
+intent_router.add_route(BeginMarkingIntentHandler(), "IntentRequest", ["BeginMarkingIntent"])
+intent_router.add_route(ConfirmWordIntentHandler(), "IntentRequest", ["ConfirmWordIntent"])
+intent_router.add_route(ChangeToLettersIntentHandler(), "IntentRequest", ["ChangeToLettersIntent"])
+intent_router.add_route(ChangeToPhoneticsIntentHandler(), "IntentRequest", ["ChangeToPhoneticsIntent"])
+intent_router.add_route(ClearSpellingListIntentHandler(), "IntentRequest", ["ClearSpellingListIntent"])
+intent_router.add_route(TellWordIntentHandler(), "IntentRequest", ["TellWordIntent"], states=["TEST"])
+intent_router.add_route(TellAnswerIntentHandler(), "IntentRequest", ["TellAnswerIntent"], states=["MARKING"])
+intent_router.add_route(HelpIntentHandler(), "IntentRequest", ["AMAZON.HelpIntent", "AMAZON.NavigateHomeIntent"])
+intent_router.add_route(CancelOrStopIntentHandler(), "IntentRequest", ["AMAZON.CancelIntent", "AMAZON.StopIntent"])
+intent_router.add_route(SessionEndedRequestHandler(), "SessionEndedRequest")
+intent_router.add_route(IntentReflectorHandler(), "IntentRequest") # catches any intent request without a matching route
+#the other intents read the words and stats of the child who is practising, so ask who that is first
+intent_router.add_guard(ProfileRequiredHandler(), utils.has_profile, [
+    "GetUsernameIntent", "SwitchProfileIntent", "ChangeToLettersIntent", "ChangeToPhoneticsIntent",
+    "AMAZON.HelpIntent", "AMAZON.NavigateHomeIntent", "AMAZON.CancelIntent", "AMAZON.StopIntent"])
+
+sb = router.RoutedSkillBuilder(intent_router, persistence_adapter = persistence.persistence_adapter)
 
 sb.add_exception_handler(CatchAllExceptionHandler())
 
+sb.add_global_request_interceptor(metrics.MetricsRequestInterceptor(intent_router, persistence.persistence_adapter))
+
+sb.add_global_response_interceptor(SavePersistentAttributesResponseInterceptor())
+#after the save has finished, so its writes are counted
+sb.add_global_response_interceptor(metrics.MetricsResponseInterceptor(persistence.persistence_adapter))
+
 lambda_handler = sb.lambda_handler()
@@ -0,0 +1,215 @@
+"""Persistence in a local SQLite file, for running the skill on our own hosts without DynamoDB.
+
+Selected with PERSISTENCE_BACKEND=local when the skill runs as a web service (see webservice.py).
+Items are stored exactly as DynamoDbPersistenceAdapter stores them (same keys, shards and
+versions), one row per item with its attributes as JSON, and writes are checked against the
+item's version in a transaction. The file can be shared by every worker process on a host.
+Appended records (e.g. test results) have the time they expire in their row, and expired
+records are deleted each time another is appended, as SQLite has no time to live.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+from ask_sdk_core.exceptions import PersistenceException
+
+import persistence
+
+#SQLite file the skill's items are stored in
+LOCAL_PATH = os.environ.get('PERSISTENCE_LOCAL_PATH', 'skill.db')
+#Seconds a write waits for another process to finish writing
+BUSY_TIMEOUT = 10
+
+
+class LocalPersistenceAdapter(persistence.DynamoDbPersistenceAdapter):
+    """DynamoDbPersistenceAdapter that keeps its items in a SQLite file instead of a DynamoDB table.
+
+    Caching, sharding and version checks work as they do with DynamoDB, but rows
+    are always JSON, as SQLite does not bill by size, so pack_items must not be set. Each
+    thread of each process opens its own connection, as SQLite connections cannot be shared
+    between threads or carried across a fork.
+    """
+    def __init__(self, path=None, **kwargs):
+        super(LocalPersistenceAdapter, self).__init__(**kwargs)
+        self.path = path or LOCAL_PATH
+        self._connections = threading.local()
+
+    def _connection(self):
+        # -> sqlite3.Connection
+        connection = getattr(self._connections, "connection", None)
+        if connection is None or self._connections.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute("CREATE TABLE IF NOT EXISTS items (key TEXT PRIMARY KEY, attributes TEXT NOT NULL, version INTEGER NOT NULL, "
+                               "expires_at INTEGER)")
+            #files made before records were appended
+            if "expires_at" not in [column[1] for column in connection.execute("PRAGMA table_info(items)")]:
+                connection.execute("ALTER TABLE items ADD COLUMN expires_at INTEGER")
+            connection.execute("CREATE INDEX IF NOT EXISTS items_expires_at ON items (expires_at) WHERE expires_at IS NOT NULL")
+            self._connections.connection = connection
+            self._connections.pid = os.getpid()
+        return connection
+
+    def _row_to_item(self, key, attributes, version):
+        return {self.partition_key_name: key, self.attribute_name: json.loads(attributes), self.version_attribute_name: version}
+
+    def _get_stored_item(self, key):
+        #str -> dict
+        try:
+            row = self._connection().execute("SELECT attributes, version FROM items WHERE key = ?", (key,)).fetchone()
+        except sqlite3.Error as e:
+            raise PersistenceException(
+                "Failed to retrieve attributes from {}. Exception of type {} occurred: {}".format(
+                    self.path, type(e).__name__, str(e)))
+        return self._row_to_item(key, *row) if row is not None else None
+
+    def _get_stored_items(self, keys, max_attempts):
+        #str list, int -> dict
+        try:
+            rows = self._connection().execute(
+                "SELECT key, attributes, version FROM items WHERE key IN ({})".format(", ".join("?" * len(keys))),
+                list(keys)).fetchall()
+        except sqlite3.Error as e:
+            raise PersistenceException(
+                "Failed to retrieve attributes from {}. Exception of type {} occurred: {}".format(
+                    self.path, type(e).__name__, str(e)))
+        return dict((row[0], self._row_to_item(*row)) for row in rows)
+
+    def _delete_stored_item(self, key):
+        #str -> None
+        try:
+            self._connection().execute("DELETE FROM items WHERE key = ?", (key,))
+        except sqlite3.Error as e:
+            raise PersistenceException(
+                "Failed to delete attributes in {}. Exception of type {} occurred: {}".format(
+                    self.path, type(e).__name__, str(e)))
+
+    def put_items(self, items, max_attempts=5):
+        #list -> None
+        """Write whole items in one transaction, replacing whatever is stored under their keys."""
+        version = time.time_ns() // 1000
+        rows = [(key, json.dumps(dict(attributes)), version) for key, attributes in items]
+        for key, _ in items:
+            self.cache.evict(key)
+        self.usage.write(rows)
+        connection = self._connection()
+        try:
+            with _transaction(connection):
+                connection.executemany("INSERT OR REPLACE INTO items (key, attributes, version) VALUES (?, ?, ?)", rows)
+        except sqlite3.Error as e:
+            raise PersistenceException(
+                "Failed to save attributes to {}. Exception of type {} occurred: {}".format(
+                    self.path, type(e).__name__, str(e)))
+
+    def scan_items(self, segment=0, total_segments=1, page_size=None):
+        #int, int, int -> iterator of (str, dict)
+        """Yield the key and attributes of every item whose key hashes to segment, reading a page at a time."""
+        last_key = ""
+        while True:
+            try:
+                rows = self._connection().execute(
+                    "SELECT key, attributes FROM items WHERE key > ? ORDER BY key LIMIT ?",
+                    (last_key, page_size or 1000)).fetchall()
+            except sqlite3.Error as e:
+                raise PersistenceException(
+                    "Failed to scan {}. Exception of type {} occurred: {}".format(self.path, type(e).__name__, str(e)))
+            if not rows:
+                return
+            rows = [row for row in rows if zlib.crc32(row[0].encode("utf-8")) % total_segments == segment] + [rows[-1]]
+            for key, attributes in rows[:-1]:
+                self.usage.read(attributes)
+                yield key, json.loads(attributes)
+            last_key = rows[-1][0]
+
+    def append_item(self, key, attributes, expires_at):
+        #str, dict, int -> None
+        """Write a new row that is never changed, and delete the rows that have expired."""
+        row = (key, json.dumps(dict(attributes)), 0, expires_at)
+        self.usage.write(row)
+        connection = self._connection()
+        try:
+            with _transaction(connection):
+                connection.execute("INSERT OR IGNORE INTO items (key, attributes, version, expires_at) VALUES (?, ?, ?, ?)", row)
+                connection.execute("DELETE FROM items WHERE expires_at < ?", (int(time.time()),))
+        except sqlite3.Error as e:
+            raise PersistenceException(
+                "Failed to save attributes to {}. Exception of type {} occurred: {}".format(
+                    self.path, type(e).__name__, str(e)))
+
+    def _put_item(self, key, attributes):
+        version = attributes.version + 1 if isinstance(attributes, persistence.TrackedAttributes) else 0
+        row = (key, json.dumps(dict(attributes)), version)
+        self.usage.write(row)
+        connection = self._connection()
+        try:
+            if isinstance(attributes, persistence.TrackedAttributes):
+                #only create the item if no other session has created it since it was found missing
+                with _transaction(connection):
+                    if connection.execute("SELECT 1 FROM items WHERE key = ?", (key,)).fetchone():
+                        raise persistence._VersionConflict()
+                    connection.execute("INSERT INTO items (key, attributes, version) VALUES (?, ?, ?)", row)
+            else:
+                connection.execute("INSERT OR REPLACE INTO items (key, attributes, version) VALUES (?, ?, ?)", row)
+        except sqlite3.Error as e:
+            raise PersistenceException(
+                "Failed to save attributes to {}. Exception of type {} occurred: {}".format(
+                    self.path, type(e).__name__, str(e)))
+
+    def _update_item(self, key, attributes, changed, removed, increments, appended=None, discarded=None, entries=None):
+        self.usage.write([[attributes[name] for name in changed], appended, discarded, list((entries or {}).values())])
+        connection = self._connection()
+        try:
+            with _transaction(connection):
+                row = connection.execute("SELECT attributes, version FROM items WHERE key = ?", (key,)).fetchone()
+                #an item saved before items had versions is version 0, as is one that does not exist
+                if (row[1] if row is not None else 0) != attributes.version:
+                    raise persistence._VersionConflict()
+                stored = json.loads(row[0]) if row is not None else {}
+                for name in changed:
+                    stored[name] = attributes[name]
+                for name in removed:
+                    stored.pop(name, None)
+                for name, members in (appended or {}).items():
+                    stored.setdefault(name, []).extend(members)
+                for name, members in (discarded or {}).items():
+                    value = stored.get(name)
+                    if isinstance(value, dict):
+                        for member in members:
+                            value.pop(member, None)
+                    elif isinstance(value, list):
+                        #list indices refer to the list as it was stored, so the last is taken out first
+                        for index in sorted(members, reverse=True):
+                            if index < len(value):
+                                del value[index]
+                for path, value in (entries or {}).items():
+                    parent = stored
+                    for name in path[:-1]:
+                        parent = parent.setdefault(name, {})
+                    parent[path[-1]] = value
+                for path, amount in increments.items():
+                    counters = stored
+                    for name in path[:-1]:
+                        counters = counters.setdefault(name, {})
+                    counters[path[-1]] = counters.get(path[-1], 0) + amount
+                connection.execute("INSERT OR REPLACE INTO items (key, attributes, version) VALUES (?, ?, ?)",
+                                   (key, json.dumps(stored), attributes.version + 1))
+        except sqlite3.Error as e:
+            raise PersistenceException(
+                "Failed to update attributes in {}. Exception of type {} occurred: {}".format(
+                    self.path, type(e).__name__, str(e)))
+
+
+class _transaction(object):
+    """Runs a block as one write transaction, taking the write lock at the start so reads in it are not stale."""
+    def __init__(self, connection):
+        self.connection = connection
+
+    def __enter__(self):
+        self.connection.execute("BEGIN IMMEDIATE")
+
+    def __exit__(self, exception_type, exception, traceback):
+        self.connection.execute("COMMIT" if exception_type is None else "ROLLBACK")
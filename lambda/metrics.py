@@ -0,0 +1,105 @@
+import json
+import os
+import sys
+import time
+
+from ask_sdk_core.dispatch_components import AbstractRequestInterceptor
+from ask_sdk_core.dispatch_components import AbstractResponseInterceptor
+
+#CloudWatch namespace the metrics are published under
+NAMESPACE = os.environ.get('METRICS_NAMESPACE', 'SpellingSkill')
+
+#Name and unit of each metric recorded for a turn
+METRICS = [
+    ("HandlerTime", "Milliseconds"),
+    ("PersistenceReads", "Count"),
+    ("PersistenceWrites", "Count"),
+    ("PersistenceCacheHits", "Count"),
+    ("BytesRead", "Bytes"),
+    ("BytesWritten", "Bytes"),
+    ("SsmlBytes", "Bytes"),
+]
+
+# Where metric lines are written. Lambda sends stdout to CloudWatch Logs, which turns
+# lines in the embedded metric format into metrics. None turns metrics off.
+_output = sys.stdout
+#True until the first request handled by this container
+_cold_start = True
+
+
+def configure(output=sys.stdout):
+    #file -> None
+    """Write metric lines to output instead of stdout, e.g. a file for benchmarks, or nowhere if None."""
+    global _output
+    _output = output
+
+
+class MetricsRequestInterceptor(AbstractRequestInterceptor):
+    """Starts recording the metrics of a turn before its handler runs.
+
+    The handler is looked up with the router the skill dispatches with, and the
+    persistence adapter's usage counts are reset so they only count this turn.
+    """
+    def __init__(self, router, persistence_adapter):
+        self.router = router
+        self.persistence_adapter = persistence_adapter
+
+    def process(self, handler_input):
+        # type: (HandlerInput) -> None
+        global _cold_start
+        chain = self.router.get_request_handler_chain(handler_input)
+        session = handler_input.request_envelope.session
+        handler_input.attributes_manager.request_attributes["metrics"] = {
+            "Handler": type(chain.request_handler).__name__ if chain is not None else "None",
+            "State": (session.attributes or {}).get("state") if session is not None else None,
+            "ColdStart": _cold_start,
+            "started": time.perf_counter(),
+        }
+        _cold_start = False
+        self.persistence_adapter.usage.reset()
+
+
+class MetricsResponseInterceptor(AbstractResponseInterceptor):
+    """Writes the metrics of a turn once its response is built and saved.
+
+    Add it after SavePersistentAttributesResponseInterceptor so the writes are counted.
+    """
+    def __init__(self, persistence_adapter):
+        self.persistence_adapter = persistence_adapter
+
+    def process(self, handler_input, response):
+        # type: (HandlerInput, Response) -> None
+        emit_turn_metrics(handler_input, response, self.persistence_adapter)
+
+
+def emit_turn_metrics(handler_input, response, persistence_adapter, error=False):
+    #HandlerInput, Response, DynamoDbPersistenceAdapter, bool -> None
+    """Write one line in the CloudWatch embedded metric format for the turn being handled."""
+    record = handler_input.attributes_manager.request_attributes.get("metrics")
+    if _output is None or record is None:
+        return
+    usage = persistence_adapter.usage
+    speech = getattr(response, "output_speech", None) if response is not None else None
+    ssml = getattr(speech, "ssml", None) or getattr(speech, "text", None) or ""
+    line = {
+        "_aws": {
+            "Timestamp": int(time.time() * 1000),
+            "CloudWatchMetrics": [{
+                "Namespace": NAMESPACE,
+                "Dimensions": [["Handler"]],
+                "Metrics": [{"Name": name, "Unit": unit} for name, unit in METRICS],
+            }],
+        },
+        "Handler": record["Handler"],
+        "State": record["State"],
+        "ColdStart": record["ColdStart"],
+        "Error": error,
+        "HandlerTime": round((time.perf_counter() - record["started"]) * 1000, 3),
+        "PersistenceReads": usage.reads,
+        "PersistenceWrites": usage.writes,
+        "PersistenceCacheHits": usage.cache_hits,
+        "BytesRead": usage.bytes_read,
+        "BytesWritten": usage.bytes_written,
+        "SsmlBytes": len(ssml.encode("utf-8")),
+    }
+    _output.write(json.dumps(line) + "\n")
@@ -0,0 +1,1091 @@
+import copy
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import MutableMapping
+
+from ask_sdk_core.attributes_manager import AbstractPersistenceAdapter
+from ask_sdk_core.exceptions import PersistenceException
+from ask_sdk_dynamodb.partition_keygen import user_id_partition_keygen
+
+import codec
+
+ddb_region = os.environ.get('DYNAMODB_PERSISTENCE_REGION')
+ddb_table_name = os.environ.get('DYNAMODB_PERSISTENCE_TABLE_NAME')
+#How long a warm container trusts an item it read or wrote, and how many items it keeps
+cache_ttl = float(os.environ.get('PERSISTENCE_CACHE_TTL', 60))
+cache_size = int(os.environ.get('PERSISTENCE_CACHE_SIZE', 256))
+#Times a write is retried on top of a newer copy of the item when its version check fails
+max_write_attempts = 3
+#DynamoDB takes at most 25 items in one BatchWriteItem request
+BATCH_WRITE_SIZE = 25
+#and at most 100 keys in one BatchGetItem request
+BATCH_GET_SIZE = 100
+#Write items in the compressed binary format of codec instead of as a map, see DynamoDbPersistenceAdapter
+pack_items = os.environ.get('PERSISTENCE_PACKED', 'false').lower() == 'true'
+#Days an appended record (e.g. a test result) is kept before DynamoDB's time to live deletes it
+record_ttl_days = int(os.environ.get('PERSISTENCE_RECORD_TTL_DAYS', 90))
+
+# Shared persistence objects for the whole skill. They are built on first use
+# so requests that never touch the table (e.g. SessionEndedRequest) do not pay
+# for importing boto3 and building a DynamoDB resource on a cold start.
+_dynamodb_resource = None
+_endpoint_url = None
+#boto3 resources must not be shared between threads, so tools that use several get one each
+_thread_resources = threading.local()
+
+#Attribute -> function building it again from the other attributes of its item. When a save is
+#redone on a newer copy of the item (see TrackedAttributes.rebase), attributes listed here are
+#built again rather than treated as a conflict, e.g. an index kept over a map of counters.
+derived_attributes = {}
+#Stands in for an entry a map does not have when maps are merged
+_MISSING = object()
+
+
+def configure(dynamodb_resource=None, endpoint_url=None):
+    #ServiceResource, str -> None
+    """Replace the DynamoDB resource used by the skill, e.g. with a local stand-in for benchmarks,
+    or the endpoint resources are built for, e.g. DynamoDB Local.
+    """
+    global _dynamodb_resource, _endpoint_url, _thread_resources
+    _dynamodb_resource = dynamodb_resource
+    _endpoint_url = endpoint_url
+    _thread_resources = threading.local()
+    persistence_adapter.cache.clear()
+
+
+def get_dynamodb_resource():
+    # -> ServiceResource
+    """Return the DynamoDB resource for the calling thread, creating it on first call."""
+    if _dynamodb_resource is not None:
+        return _dynamodb_resource
+    resource = getattr(_thread_resources, "resource", None)
+    if resource is None:
+        import boto3
+        resource = boto3.resource('dynamodb', region_name=ddb_region, endpoint_url=_endpoint_url)
+        _thread_resources.resource = resource
+    return resource
+
+
+class TrackedAttributes(dict):
+    """Persistent attributes that remember what they looked like when loaded.
+
+    Handlers read and change them like a normal dict (including changing nested
+    lists and maps in place). When they are saved, only the top level
+    attributes that differ from the loaded copy are written. Counters changed
+    with increment are written as atomic ADD updates instead, entries of maps changed
+    with set_entry as a SET of just the entry, and lists and maps changed with extend
+    and discard only have the values added or taken out written.
+
+    exists: bool
+        False if there was no item in the table for the user when loaded.
+    version: int
+        Version of the item when loaded, 0 for items written before items had versions.
+    packed: bool
+        True if the item is stored in the compressed binary format of codec.
+    """
+    def __init__(self, attributes, exists, version=0, packed=False):
+        super(TrackedAttributes, self).__init__(attributes)
+        self.exists = exists
+        self.version = version
+        self.packed = packed
+        self._original = copy.deepcopy(attributes)
+        self.increments = {}
+        #path -> value of the map entries set with set_entry since loading
+        self.entries = {}
+        #key -> values added to the end of the list since loading
+        self.appended = {}
+        #key -> members of the list or map taken out of it since loading
+        self.discarded = {}
+
+    def changed_keys(self):
+        # -> list
+        """Attributes that were added or changed since they were loaded, other than by extend and discard."""
+        return [key for key, value in self.items()
+                if key not in self._original or (self._original[key] != value and self._with_deltas(key) != value)]
+
+    def _with_deltas(self, key):
+        #str -> object
+        """Return the loaded value of key with the values extended and discarded since then applied."""
+        value = self._original[key]
+        if key not in self.appended and key not in self.discarded:
+            return value
+        discarded = set(self.discarded.get(key, ()))
+        if isinstance(value, dict):
+            return dict((member, entry) for member, entry in value.items() if member not in discarded)
+        return [member for member in value if member not in discarded] + self.appended.get(key, [])
+
+    def removed_keys(self):
+        # -> list
+        """Attributes that were deleted since they were loaded."""
+        return [key for key in self._original if key not in self]
+
+    def increment(self, path, amount=1):
+        #tuple, int -> None
+        """Add amount to the counter at path, e.g. ("testAttempts",) or ("wordReport", word).
+
+        The counter is sent to the table as an atomic ADD, so increments made at the
+        same time by another session (e.g. a second Echo in the household) are not lost.
+        If the map holding the counter did not exist when the attributes were loaded,
+        the whole map is written instead.
+        """
+        parent = self
+        original_parent = self._original if self.exists else None
+        for key in path[:-1]:
+            parent = parent.setdefault(key, {})
+            original_parent = original_parent.get(key) if isinstance(original_parent, dict) else None
+        parent[path[-1]] = parent.get(path[-1], 0) + amount
+        if original_parent is not None:
+            original_parent[path[-1]] = original_parent.get(path[-1], 0) + amount
+            self.increments[path] = self.increments.get(path, 0) + amount
+
+    def set_entry(self, path, value):
+        #tuple, object -> None
+        """Set the map entry at path, e.g. ("wordSchedule", word), to value.
+
+        Only the entry is sent to the table, as a SET of its path, so entries set at the same
+        time by another session (e.g. the schedule of other words) are not overwritten and do
+        not conflict. If the map holding the entry did not exist when the attributes were
+        loaded, the whole map is written instead.
+        """
+        parent = self
+        original_parent = self._original if self.exists else None
+        for key in path[:-1]:
+            parent = parent.setdefault(key, {})
+            original_parent = original_parent.get(key) if isinstance(original_parent, dict) else None
+        parent[path[-1]] = value
+        if original_parent is not None:
+            original_parent[path[-1]] = copy.deepcopy(value)
+            self.entries[path] = copy.deepcopy(value)
+
+    def extend(self, key, values):
+        #str, list -> None
+        """Add values to the end of the list at key.
+
+        If the list existed when the attributes were loaded, only the values are sent to the
+        table, as a list_append. When the change is redone on a newer copy (see rebase), values
+        the newer list already holds are not added again, so a list only changed with extend
+        and discard is kept as a set.
+        """
+        self.setdefault(key, []).extend(values)
+        if self.exists and isinstance(self._original.get(key), list):
+            self.appended.setdefault(key, []).extend(values)
+
+    def discard(self, key, members):
+        #str, list -> None
+        """Take members out of the list or map at key, sending only their removal to the table."""
+        value = self.get(key)
+        members = set(members)
+        if isinstance(value, dict):
+            for member in members:
+                value.pop(member, None)
+                #the counter or entry set goes with the entry
+                self.increments.pop((key, member), None)
+                self.entries.pop((key, member), None)
+        elif isinstance(value, list):
+            value[:] = [member for member in value if member not in members]
+            if key in self.appended:
+                #values added since loading are not in the stored list, so they are simply not added
+                appended = [member for member in self.appended[key] if member not in members]
+                members.difference_update(self.appended[key])
+                self.appended[key] = appended
+        else:
+            return
+        original = self._original.get(key) if self.exists else None
+        if isinstance(original, (dict, list)):
+            stored = original if isinstance(original, dict) else set(original)
+            self.discarded.setdefault(key, []).extend(member for member in members if member in stored)
+
+    def list_changes(self, changed, removed):
+        #list, list -> (dict, dict)
+        """Return the values to append to each list, and the list indices or map keys to remove from each
+        attribute, for the changes made with extend and discard to attributes not in changed or removed.
+
+        DynamoDB cannot add to a list and remove from it in one update, so a list changed both
+        ways is added to changed, to be written whole.
+        """
+        appended = dict((key, values) for key, values in self.appended.items()
+                        if values and key not in changed and key not in removed)
+        discarded = {}
+        for key, members in self.discarded.items():
+            if not members or key in changed or key in removed:
+                continue
+            original = self._original[key]
+            if isinstance(original, dict):
+                discarded[key] = list(members)
+            elif key in appended:
+                changed.append(key)
+                del appended[key]
+            else:
+                members = set(members)
+                discarded[key] = [index for index, member in enumerate(original) if member in members]
+        return appended, discarded
+
+    def mark_saved(self):
+        """Use the current values as the new loaded copy after a successful write."""
+        self.exists = True
+        self.version += 1
+        self._original = copy.deepcopy(dict(self))
+        self.increments = {}
+        self.entries = {}
+        self.appended = {}
+        self.discarded = {}
+
+    def rebase(self, newer):
+        #TrackedAttributes -> list
+        """Redo the changes made since loading on top of newer, a later copy of the same item.
+
+        Maps changed both here and in newer are merged entry by entry, and attributes in
+        derived_attributes are built again from the merged item. Returns the attributes where
+        the same value was changed both here and in newer. Nothing is changed if there are
+        any, as one of the two changes would be lost.
+        """
+        changed = self.changed_keys()
+        removed = self.removed_keys()
+        values = {}
+        #keys whose values were merged, so the changes made with increment and set_entry are redone on them
+        merged_keys = set()
+        conflicts = []
+        for key in changed + removed:
+            if key in derived_attributes or newer.get(key) in (self._original.get(key), self.get(key)):
+                if key in changed:
+                    values[key] = self[key]
+                continue
+            merged = _merge_maps(self._original.get(key), self.get(key), newer.get(key))
+            if merged is None:
+                conflicts.append(key)
+            else:
+                values[key] = merged
+                merged_keys.add(key)
+        if conflicts:
+            return conflicts
+        removed = [key for key in removed if key not in values]
+        increments, entries, appended, discarded = self.increments, self.entries, self.appended, self.discarded
+        self.clear()
+        self.update(copy.deepcopy(dict(newer)))
+        for key in removed:
+            self.pop(key, None)
+        self.update(values)
+        self.exists = newer.exists
+        self.version = newer.version
+        self.packed = newer.packed
+        self._original = copy.deepcopy(dict(newer))
+        self.increments = {}
+        self.entries = {}
+        self.appended = {}
+        self.discarded = {}
+        for path, amount in increments.items():
+            if (path[0] not in values or path[0] in merged_keys) and path[0] not in removed:
+                self.increment(path, amount)
+        for path, value in entries.items():
+            if (path[0] not in values or path[0] in merged_keys) and path[0] not in removed:
+                self.set_entry(path, value)
+        for key, members in appended.items():
+            if key not in values and key not in removed:
+                present = set(self.get(key, []))
+                self.extend(key, [member for member in members if member not in present])
+        for key, members in discarded.items():
+            if key not in values and key not in removed:
+                self.discard(key, members)
+        for key, build in derived_attributes.items():
+            if key in self:
+                self[key] = build(self)
+        return []
+
+
+def _merge_maps(original, ours, newer):
+    #dict, dict, dict -> dict
+    """Return newer with the entries changed between original and ours changed the same way,
+    merging maps inside them the same way. None if they are not all maps, or an entry was
+    changed differently in ours and newer. A map added in both ours and newer is merged as if
+    it had been empty in original.
+    """
+    if original is None or original is _MISSING:
+        original = {}
+    if not all(isinstance(value, dict) for value in (original, ours, newer)):
+        return None
+    merged = copy.deepcopy(newer)
+    for entry in set(original) | set(ours):
+        base, mine, theirs = original.get(entry, _MISSING), ours.get(entry, _MISSING), newer.get(entry, _MISSING)
+        if mine == base or mine == theirs:
+            continue
+        if theirs == base:
+            value = mine
+        else:
+            value = _merge_maps(base, mine, theirs)
+            if value is None:
+                return None
+        if value is _MISSING:
+            merged.pop(entry, None)
+        else:
+            merged[entry] = copy.deepcopy(value)
+    return merged
+
+
+class ItemCache(object):
+    """Items read from or written to the table by this container, keyed by table key.
+
+    Lambda reuses a warm container for later requests, often from the same user a few
+    seconds later, so items are kept for ttl seconds and the least recently used are
+    dropped once there are more than size. A cached copy can be out of date if another
+    container wrote the item since, but writes are checked against the item's version,
+    so an out of date copy is never written back over newer data.
+    """
+    def __init__(self, ttl=cache_ttl, size=cache_size):
+        self.ttl = ttl
+        self.size = size
+        #key -> (time cached, attributes, exists, version, packed)
+        self._items = OrderedDict()
+        #the web service and the tools read and write items from several threads
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        #str -> TrackedAttributes
+        """Return a copy of the cached item for key, None if it is not cached or has expired."""
+        with self._lock:
+            entry = self._items.get(key)
+            if entry is None:
+                return None
+            if time.monotonic() - entry[0] > self.ttl:
+                del self._items[key]
+                return None
+            self._items.move_to_end(key)
+        return TrackedAttributes(copy.deepcopy(entry[1]), entry[2], entry[3], entry[4])
+
+    def put(self, key, attributes):
+        #str, TrackedAttributes -> None
+        if self.size <= 0:
+            return
+        entry = (time.monotonic(), copy.deepcopy(dict(attributes)), attributes.exists, attributes.version, attributes.packed)
+        with self._lock:
+            self._items[key] = entry
+            self._items.move_to_end(key)
+            while len(self._items) > self.size:
+                self._items.popitem(last=False)
+
+    def evict(self, key):
+        #str -> None
+        with self._lock:
+            self._items.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+#Which item (shard) each persistent attribute is stored in. Attributes not listed here are stored
+#with the profile's stats.
+SHARD_FOR_ATTRIBUTE = {
+    "profiles": "account",
+    "activeProfile": "account",
+    "words": "words",
+    "listVersion": "words",
+    "wordReport": "stats",
+    "testAttempts": "stats",
+    "topMissed": "stats",
+    "wordSchedule": "stats",
+    "resultDays": "history",
+}
+#Shards each profile has, as well as the records appended to it
+PROFILE_SHARDS = ("words", "stats", "history")
+
+#Attributes of the single item per user used before profiles were added
+LEGACY_ATTRIBUTES = ("userName", "words", "listVersion", "wordReport", "testAttempts")
+
+
+def profile_id_for(name):
+    #str -> str
+    """Return the id used in the table keys for the profile of the child called name."""
+    return name.strip().lower()
+
+
+class ShardedAttributes(MutableMapping):
+    """Persistent attributes of one account, split across several small items.
+
+    The account item (key: the user id) holds the directory of child profiles and the active
+    profile. Each profile has its own word list item and stats item, so a request only reads
+    the items holding the attributes it actually uses. Items are read the first time one of
+    their attributes is used.
+
+    Accounts saved before profiles were added keep everything in the account item; they are
+    moved into a profile named after their userName the first time the account is read, or
+    into the first profile made for the account if they have no userName.
+
+    Records such as test results are not kept in a shard, so the shards do not grow with each
+    one. Each is appended as an item of its own (see append), written once the shards have been
+    saved and deleted by the table's time to live after record_ttl_days.
+
+    profile_id: str
+        Profile whose words and stats are read and written, None if the account has no profiles yet.
+    """
+    def __init__(self, adapter, account_key, profile_id=None):
+        self._adapter = adapter
+        self._account_key = account_key
+        self._profile_id = profile_id
+        #(shard, profile id) -> TrackedAttributes, profile id is None for the account item
+        self._shards = {}
+        #(table key, attributes) of the records appended since the attributes were last saved
+        self._appended = []
+        #True while a legacy account item has been split into profile items that are not saved yet
+        self.migrating = False
+
+    @property
+    def profile_id(self):
+        if self._profile_id is None:
+            self._profile_id = self.shard("account").get("activeProfile")
+        return self._profile_id
+
+    def select_profile(self, profile_id):
+        #str -> None
+        """Read and write the words and stats of profile_id from now on.
+
+        If the account is a legacy item saved without a userName, its words and stats are moved
+        into profile_id, the first profile made for it.
+        """
+        self._profile_id = profile_id
+        account = self.shard("account")
+        if set(account.get("profiles", {})) <= {profile_id}:
+            self._migrate_legacy_item(account, profile_id)
+
+    def shard(self, name):
+        #str -> TrackedAttributes
+        """Return the attributes stored in the named shard ('account', 'words', 'stats' or 'history')."""
+        profile_id = None if name == "account" else self.profile_id
+        if name != "account" and profile_id is None:
+            raise PersistenceException("Cannot read {} before a profile has been selected".format(name))
+        if (name, profile_id) not in self._shards:
+            attributes = self._adapter.get_item(self.shard_key(name, profile_id))
+            self._shards[(name, profile_id)] = attributes
+            if name == "account":
+                self._migrate_legacy_item(attributes)
+        return self._shards[(name, profile_id)]
+
+    def shard_key(self, name, profile_id):
+        #str, str -> str
+        if name == "account":
+            return self._account_key
+        return "{}#{}#{}".format(self._account_key, profile_id, name)
+
+    def loaded_shards(self):
+        #-> list
+        """(table key, TrackedAttributes) for every shard read or written so far, the account last."""
+        return sorted(((self.shard_key(name, profile_id), attributes)
+                       for (name, profile_id), attributes in self._shards.items()),
+                      key=lambda item: item[0] == self._account_key)
+
+    def append(self, name, record):
+        #str, dict -> None
+        """Add a record to the profile's records of the kind name (e.g. 'result'), keyed by the time it was made."""
+        if self.profile_id is None:
+            raise PersistenceException("Cannot append a {} before a profile has been selected".format(name))
+        #microseconds, so records made by the same profile in one request still have keys of their own
+        key = "{}#{}#{}".format(self.shard_key(name, self.profile_id), time.time_ns() // 1000, len(self._appended))
+        self._appended.append((key, record))
+
+    def take_appended(self):
+        #-> list
+        """(table key, attributes) of the records appended since this was last called."""
+        appended, self._appended = self._appended, []
+        return appended
+
+    def _migrate_legacy_item(self, account, profile_id=None):
+        #TrackedAttributes, str -> None
+        """Move the attributes of a legacy account item into the shards of profile_id, by default
+        a profile named after its userName.
+        """
+        if not any(key in account for key in LEGACY_ATTRIBUTES):
+            return
+        if profile_id is None:
+            if "profiles" in account or account.get("userName") is None:
+                #without a name they wait for the first profile to be made, see select_profile
+                return
+            profile_id = profile_id_for(account["userName"])
+            account["profiles"] = {profile_id: {"userName": account["userName"]}}
+            account["activeProfile"] = profile_id
+        #the legacy attributes must only be taken out of the account once they are in the profile items
+        self.migrating = True
+        for name in PROFILE_SHARDS:
+            #new items, written in full when the attributes are saved
+            self._shards[(name, profile_id)] = TrackedAttributes({}, exists=False)
+        for key in LEGACY_ATTRIBUTES:
+            if key in account:
+                value = account.pop(key)
+                if key in SHARD_FOR_ATTRIBUTE:
+                    self._shards[(SHARD_FOR_ATTRIBUTE[key], profile_id)][key] = value
+
+    def _shard_for(self, key):
+        return self.shard(SHARD_FOR_ATTRIBUTE.get(key, "stats"))
+
+    def __getitem__(self, key):
+        return self._shard_for(key)[key]
+
+    def __setitem__(self, key, value):
+        self._shard_for(key)[key] = value
+
+    def __delitem__(self, key):
+        del self._shard_for(key)[key]
+
+    def __iter__(self):
+        for name in ("account",) + PROFILE_SHARDS:
+            for key in list(self.shard(name)):
+                yield key
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def increment(self, path, amount=1):
+        #tuple, int -> None
+        """Add amount to the counter at path with an atomic ADD, see TrackedAttributes.increment."""
+        self._shard_for(path[0]).increment(path, amount)
+
+    def set_entry(self, path, value):
+        #tuple, object -> None
+        """Set the map entry at path to value, see TrackedAttributes.set_entry."""
+        self._shard_for(path[0]).set_entry(path, value)
+
+    def extend(self, key, values):
+        #str, list -> None
+        """Add values to the end of the list at key, see TrackedAttributes.extend."""
+        self._shard_for(key).extend(key, values)
+
+    def discard(self, key, members):
+        #str, list -> None
+        """Take members out of the list or map at key, see TrackedAttributes.discard."""
+        self._shard_for(key).discard(key, members)
+
+
+class PersistenceUsage(object):
+    """Counts of the reads and writes an adapter has made, e.g. while handling one request.
+
+    Bytes are the size of the attributes as JSON, which is close to the size DynamoDB charges for,
+    with packed attributes counted as their size in bytes.
+    """
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.reads = 0
+        self.writes = 0
+        self.cache_hits = 0
+        self.bytes_read = 0
+        self.bytes_written = 0
+
+    def read(self, value):
+        self.reads += 1
+        self.bytes_read += _size(value)
+
+    def write(self, value):
+        self.writes += 1
+        self.bytes_written += _size(value)
+
+
+def _size(value):
+    #object -> int
+    return len(json.dumps(value, default=_size_placeholder))
+
+
+def _size_placeholder(value):
+    #object -> str
+    #the DynamoDB resource reads binary values as Binary, which holds the bytes in value
+    data = getattr(value, "value", value)
+    if isinstance(data, (bytes, bytearray)):
+        #a string as long as the bytes once JSON has quoted it
+        return " " * max(len(data) - 2, 0)
+    return str(value)
+
+
+class DynamoDbPersistenceAdapter(AbstractPersistenceAdapter):
+    """Persistence adapter for the skill's DynamoDB table.
+
+    Each account is stored as several items (see ShardedAttributes), all in the
+    'attributes' map of an item keyed by 'id' like ask_sdk_dynamodb's DynamoDbAdapter.
+    Nothing is read until a handler uses an attribute, and items this container read or
+    wrote recently are served from an ItemCache. Saving only sends the attributes that
+    changed as an UpdateItem, one per item that changed, and sends nothing at all if no
+    attribute changed. Counters, and lists and maps changed with extend and discard, only
+    send what was added or taken out.
+
+    Every item has a 'version' attribute that is moved on by each write, and writes only
+    succeed if the item still has the version it was read with. If it has moved on, the
+    changes are redone on top of the newer copy as long as it did not change the same
+    attributes, otherwise a PersistenceConflictException is raised.
+
+    Appended records (see ShardedAttributes.append) are written as new items after the shards,
+    with ttl_attribute_name set to when they expire. The table's time to live must be turned on
+    for that attribute, or they are never deleted.
+
+    With pack_items, items are written with all their attributes in one binary attribute
+    (packed_attribute_name) in the compressed format of codec, which DynamoDB bills at a
+    fraction of the size of the map. A packed item is written whole, with the same version
+    check. Items are read in either format whatever pack_items is, and an item is moved to
+    the format pack_items asks for the next time it changes.
+    """
+    def __init__(self, table_name=None, partition_key_name="id", attribute_name="attributes",
+                 partition_keygen=user_id_partition_keygen, version_attribute_name="version", cache=None,
+                 packed_attribute_name="packed", pack_items=False, ttl_attribute_name="expiresAt"):
+        self.table_name = table_name
+        self.partition_key_name = partition_key_name
+        self.attribute_name = attribute_name
+        self.packed_attribute_name = packed_attribute_name
+        self.pack_items = pack_items
+        self.partition_keygen = partition_keygen
+        self.version_attribute_name = version_attribute_name
+        self.ttl_attribute_name = ttl_attribute_name
+        self.cache = cache if cache is not None else ItemCache()
+        self.usage = PersistenceUsage()
+
+    def _table(self):
+        return get_dynamodb_resource().Table(self.table_name or ddb_table_name)
+
+    def get_attributes(self, request_envelope):
+        #RequestEnvelope -> ShardedAttributes
+        session = request_envelope.session
+        profile_id = session.attributes.get("profile") if session is not None and session.attributes else None
+        return ShardedAttributes(self, self.partition_keygen(request_envelope), profile_id)
+
+    def save_attributes(self, request_envelope, attributes):
+        #RequestEnvelope, dict -> None
+        appended = []
+        if isinstance(attributes, ShardedAttributes):
+            items = list(attributes.loaded_shards())
+            appended = attributes.take_appended()
+        else:
+            items = [(self.partition_keygen(request_envelope), attributes)]
+        expires_at = int(time.time()) + record_ttl_days * 86400
+        #loaded_shards puts the account last, so a legacy item is only stripped once the profile items are saved
+        for key, item in items:
+            self.save_item(key, item)
+        if isinstance(attributes, ShardedAttributes):
+            attributes.migrating = False
+        #records are only written once the totals they were added to are saved, so a failed save leaves none behind
+        for key, record in appended:
+            self.append_item(key, record, expires_at)
+
+    def delete_attributes(self, request_envelope):
+        #RequestEnvelope -> None
+        """Delete the account and its profiles' shards. Appended records are left to expire."""
+        attributes = self.get_attributes(request_envelope)
+        for profile_id in attributes.get("profiles", {}):
+            for name in PROFILE_SHARDS:
+                self.delete_item(attributes.shard_key(name, profile_id))
+        self.delete_item(self.partition_keygen(request_envelope))
+
+    def get_item(self, key, use_cache=True):
+        #str, bool -> TrackedAttributes
+        attributes = self.cache.get(key) if use_cache else None
+        if attributes is not None:
+            self.usage.cache_hits += 1
+            return attributes
+        item = self._get_stored_item(key)
+        self.usage.read(item)
+        attributes = self._tracked_attributes(item)
+        self.cache.put(key, attributes)
+        return attributes
+
+    def get_items(self, keys, max_attempts=5):
+        #str list -> dict
+        """Read items with one BatchGetItem request, e.g. for bulk imports, bypassing the cache.
+
+        keys is a list of at most BATCH_GET_SIZE keys. Returns key -> TrackedAttributes for every
+        key, with exists False for the keys that have no item.
+        """
+        items = self._get_stored_items(keys, max_attempts)
+        self.usage.read(list(items.values()))
+        return dict((key, self._tracked_attributes(items.get(key))) for key in keys)
+
+    def _get_stored_items(self, keys, max_attempts):
+        #str list, int -> dict
+        """Return key -> stored item for the keys that have one. Keys that DynamoDB leaves
+        unprocessed are asked for again with exponential backoff.
+        """
+        table_name = self.table_name or ddb_table_name
+        request = {"Keys": [{self.partition_key_name: key} for key in keys], "ConsistentRead": True}
+        items = {}
+        for attempt in range(max_attempts):
+            if attempt:
+                time.sleep(min(0.05 * 2 ** (attempt - 1), 2))
+            try:
+                response = get_dynamodb_resource().batch_get_item(RequestItems={table_name: request})
+            except Exception as e:
+                raise PersistenceException(
+                    "Failed to retrieve attributes from DynamoDb table. Exception of type {} occurred: {}".format(
+                        type(e).__name__, str(e)))
+            for item in response.get("Responses", {}).get(table_name, []):
+                items[item[self.partition_key_name]] = item
+            request = response.get("UnprocessedKeys", {}).get(table_name)
+            if not request or not request.get("Keys"):
+                return items
+        raise PersistenceException(
+            "Failed to retrieve attributes from DynamoDb table. {} keys were still unprocessed after {} attempts".format(
+                len(request["Keys"]), max_attempts))
+
+    def _tracked_attributes(self, item):
+        #dict -> TrackedAttributes
+        """Return the attributes of a stored item, or of a new item if item is None."""
+        if item is None:
+            return TrackedAttributes({}, exists=False)
+        return TrackedAttributes(self._item_attributes(item), exists=True,
+                                 version=int(item.get(self.version_attribute_name, 0)),
+                                 packed=self.packed_attribute_name in item)
+
+    def _item_attributes(self, item):
+        #dict -> dict
+        """Return the attributes of a stored item, unpacking them if it is packed."""
+        if self.packed_attribute_name in item:
+            return codec.decode(item[self.packed_attribute_name])
+        return item.get(self.attribute_name, {})
+
+    def _stored_item(self, key, attributes):
+        #str, dict -> dict
+        """Return the item to store attributes under key as, packed if pack_items is set."""
+        if self.pack_items:
+            return {self.partition_key_name: key, self.packed_attribute_name: codec.encode(attributes)}
+        return {self.partition_key_name: key, self.attribute_name: dict(attributes)}
+
+    def _get_stored_item(self, key):
+        #str -> dict
+        """Return the item stored under key, None if there is none."""
+        try:
+            response = self._table().get_item(Key={self.partition_key_name: key}, ConsistentRead=True)
+        except Exception as e:
+            raise PersistenceException(
+                "Failed to retrieve attributes from DynamoDb table. Exception of type {} occurred: {}".format(
+                    type(e).__name__, str(e)))
+        return response.get("Item")
+
+    def save_item(self, key, attributes):
+        #str, dict -> None
+        if not isinstance(attributes, TrackedAttributes):
+            self._put_item(key, attributes)
+            self.cache.evict(key)
+            return
+        for attempt in range(max_write_attempts):
+            try:
+                saved = self._write_changes(key, attributes)
+                break
+            except _VersionConflict:
+                newer = self.get_item(key, use_cache=False)
+                conflicts = attributes.rebase(newer)
+                if conflicts or attempt == max_write_attempts - 1:
+                    raise PersistenceConflictException(
+                        "Failed to save attributes to DynamoDb table. {} changed by another session: {}".format(
+                            key, ", ".join(conflicts) or "too many times"))
+        if saved:
+            attributes.mark_saved()
+            self.cache.put(key, attributes)
+
+    def _write_changes(self, key, attributes):
+        #str, TrackedAttributes -> bool
+        """Write what changed in attributes, returning False if nothing needed writing."""
+        if attributes.exists:
+            changed = attributes.changed_keys()
+            removed = attributes.removed_keys()
+            #a counter inside an attribute that is written as a whole is already included in its value
+            increments = dict(
+                (path, amount) for path, amount in attributes.increments.items()
+                if path[0] not in changed and path[0] not in removed)
+            entries = dict(
+                (path, value) for path, value in attributes.entries.items()
+                if path[0] not in changed and path[0] not in removed)
+            appended, discarded = attributes.list_changes(changed, removed)
+            if not changed and not removed and not increments and not entries and not appended and not discarded:
+                return False
+            if attributes.packed or self.pack_items:
+                self._replace_item(key, attributes)
+            else:
+                self._update_item(key, attributes, changed, removed, increments, appended, discarded, entries)
+            return True
+        if attributes:
+            self._put_item(key, attributes)
+            return True
+        #an item that was never created and is still empty
+        return False
+
+    def put_items(self, items, max_attempts=5):
+        #list -> None
+        """Write whole items with one BatchWriteItem request, e.g. for bulk imports.
+
+        items is a list of (key, attributes) pairs, at most BATCH_WRITE_SIZE of them. The
+        items replace whatever is stored under their keys without a version check, so each
+        is given a version taken from the clock that no copy cached by a warm container can
+        have. Items that DynamoDB leaves unprocessed are sent again with exponential backoff.
+        """
+        version = time.time_ns() // 1000
+        table_name = self.table_name or ddb_table_name
+        requests = [{"PutRequest": {"Item": dict(self._stored_item(key, attributes), **{self.version_attribute_name: version})}}
+                    for key, attributes in items]
+        for key, _ in items:
+            self.cache.evict(key)
+        for attempt in range(max_attempts):
+            if attempt:
+                time.sleep(min(0.05 * 2 ** (attempt - 1), 2))
+            self.usage.write(requests)
+            try:
+                response = get_dynamodb_resource().batch_write_item(RequestItems={table_name: requests})
+            except Exception as e:
+                raise PersistenceException(
+                    "Failed to save attributes to DynamoDb table. Exception of type {} occurred: {}".format(
+                        type(e).__name__, str(e)))
+            requests = response.get("UnprocessedItems", {}).get(table_name, [])
+            if not requests:
+                return
+        raise PersistenceException(
+            "Failed to save attributes to DynamoDb table. {} items were still unprocessed after {} attempts".format(
+                len(requests), max_attempts))
+
+    def scan_items(self, segment=0, total_segments=1, page_size=None):
+        #int, int, int -> iterator of (str, dict)
+        """Yield the key and attributes of every item in one segment of the table.
+
+        The table is read a page at a time, so only one page is held in memory. Running
+        one scan for each segment at the same time reads the table in parallel.
+        """
+        kwargs = {"Segment": segment, "TotalSegments": total_segments}
+        if page_size:
+            kwargs["Limit"] = page_size
+        while True:
+            try:
+                response = self._table().scan(**kwargs)
+            except Exception as e:
+                raise PersistenceException(
+                    "Failed to scan DynamoDb table. Exception of type {} occurred: {}".format(
+                        type(e).__name__, str(e)))
+            self.usage.read(response.get("Items", []))
+            for item in response.get("Items", []):
+                yield item[self.partition_key_name], self._item_attributes(item)
+            if "LastEvaluatedKey" not in response:
+                return
+            kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+    def delete_item(self, key):
+        #str -> None
+        self.cache.evict(key)
+        self.usage.write(key)
+        self._delete_stored_item(key)
+
+    def _delete_stored_item(self, key):
+        #str -> None
+        try:
+            self._table().delete_item(Key={self.partition_key_name: key})
+        except Exception as e:
+            raise PersistenceException(
+                "Failed to delete attributes in DynamoDb table. Exception of type {} occurred: {}".format(
+                    type(e).__name__, str(e)))
+
+    def append_item(self, key, attributes, expires_at):
+        #str, dict, int -> None
+        """Write a new item that is never changed, e.g. a test result, to expire at expires_at (seconds since the epoch).
+
+        Nothing is written if the item already exists, so a write retried after it succeeded
+        does not fail or write it twice.
+        """
+        item = self._stored_item(key, attributes)
+        item[self.ttl_attribute_name] = expires_at
+        self.usage.write(item)
+        try:
+            self._table().put_item(Item=item, ConditionExpression="attribute_not_exists(#key)",
+                                   ExpressionAttributeNames={"#key": self.partition_key_name})
+        except Exception as e:
+            if _is_conditional_check_failure(e):
+                return
+            raise PersistenceException(
+                "Failed to save attributes to DynamoDb table. Exception of type {} occurred: {}".format(
+                    type(e).__name__, str(e)))
+
+    def _put_item(self, key, attributes):
+        item = self._stored_item(key, attributes)
+        kwargs = {}
+        if isinstance(attributes, TrackedAttributes):
+            #only create the item if no other session has created it since it was found missing
+            item[self.version_attribute_name] = attributes.version + 1
+            kwargs = {
+                "ConditionExpression": "attribute_not_exists(#key)",
+                "ExpressionAttributeNames": {"#key": self.partition_key_name},
+            }
+        self.usage.write(item)
+        try:
+            self._table().put_item(Item=item, **kwargs)
+        except Exception as e:
+            if _is_conditional_check_failure(e):
+                raise _VersionConflict()
+            raise PersistenceException(
+                "Failed to save attributes to DynamoDb table. Exception of type {} occurred: {}".format(
+                    type(e).__name__, str(e)))
+        if isinstance(attributes, TrackedAttributes):
+            attributes.packed = self.pack_items
+
+    def _replace_item(self, key, attributes):
+        #str, TrackedAttributes -> None
+        """Write the whole of an item that already exists, if it still has the version it was read with."""
+        item = self._stored_item(key, attributes)
+        item[self.version_attribute_name] = attributes.version + 1
+        kwargs = {"ExpressionAttributeNames": {"#version": self.version_attribute_name}}
+        if attributes.version:
+            kwargs["ConditionExpression"] = "#version = :read_version"
+            kwargs["ExpressionAttributeValues"] = {":read_version": attributes.version}
+        else:
+            kwargs["ConditionExpression"] = "attribute_not_exists(#version)"
+        self.usage.write(item)
+        try:
+            self._table().put_item(Item=item, **kwargs)
+        except Exception as e:
+            if _is_conditional_check_failure(e):
+                raise _VersionConflict()
+            raise PersistenceException(
+                "Failed to save attributes to DynamoDb table. Exception of type {} occurred: {}".format(
+                    type(e).__name__, str(e)))
+        attributes.packed = self.pack_items
+
+    def _update_item(self, key, attributes, changed, removed, increments, appended=None, discarded=None, entries=None):
+        names = {"#attr": self.attribute_name, "#version": self.version_attribute_name}
+        values = {":version": attributes.version + 1}
+        set_actions = ["#version = :version"]
+        remove_actions = []
+        add_actions = []
+        for i, name in enumerate(changed):
+            names["#s{}".format(i)] = name
+            values[":s{}".format(i)] = attributes[name]
+            set_actions.append("#attr.#s{0} = :s{0}".format(i))
+        for i, (path, value) in enumerate((entries or {}).items()):
+            for j, name in enumerate(path):
+                names["#e{}_{}".format(i, j)] = name
+            values[":e{}".format(i)] = value
+            set_actions.append("#attr.{} = :e{}".format(".".join("#e{}_{}".format(i, j) for j in range(len(path))), i))
+        for i, (name, members) in enumerate((appended or {}).items()):
+            names["#l{}".format(i)] = name
+            values[":l{}".format(i)] = members
+            set_actions.append("#attr.#l{0} = list_append(#attr.#l{0}, :l{0})".format(i))
+        for i, name in enumerate(removed):
+            names["#r{}".format(i)] = name
+            remove_actions.append("#attr.#r{}".format(i))
+        for i, (name, members) in enumerate((discarded or {}).items()):
+            names["#d{}".format(i)] = name
+            for j, member in enumerate(members):
+                #list indices are part of the path, and refer to the list as it is stored before the update
+                if isinstance(member, int):
+                    remove_actions.append("#attr.#d{}[{}]".format(i, member))
+                else:
+                    names["#d{}_{}".format(i, j)] = member
+                    remove_actions.append("#attr.#d{0}.#d{0}_{1}".format(i, j))
+        for i, (path, amount) in enumerate(increments.items()):
+            for j, name in enumerate(path):
+                names["#a{}_{}".format(i, j)] = name
+            values[":a{}".format(i)] = amount
+            add_actions.append("#attr.{} :a{}".format(".".join("#a{}_{}".format(i, j) for j in range(len(path))), i))
+        expression = ""
+        if set_actions:
+            expression += "SET " + ", ".join(set_actions)
+        if remove_actions:
+            expression += " REMOVE " + ", ".join(remove_actions)
+        if add_actions:
+            expression += " ADD " + ", ".join(add_actions)
+        if attributes.version:
+            values[":read_version"] = attributes.version
+            condition = "#version = :read_version"
+        else:
+            condition = "attribute_not_exists(#version)"
+        kwargs = {
+            "Key": {self.partition_key_name: key},
+            "UpdateExpression": expression.strip(),
+            "ConditionExpression": condition,
+            "ExpressionAttributeNames": names,
+            "ExpressionAttributeValues": values,
+        }
+        self.usage.write(values)
+        try:
+            self._table().update_item(**kwargs)
+        except Exception as e:
+            if _is_conditional_check_failure(e):
+                raise _VersionConflict()
+            raise PersistenceException(
+                "Failed to update attributes in DynamoDb table. Exception of type {} occurred: {}".format(
+                    type(e).__name__, str(e)))
+
+
+class PersistenceConflictException(PersistenceException):
+    """Raised when an item cannot be saved because another session changed the same attributes."""
+
+
+class _VersionConflict(Exception):
+    """The item was written by another session since it was read."""
+
+
+def _is_conditional_check_failure(exception):
+    #Exception -> bool
+    error = getattr(exception, "response", None) or {}
+    return error.get("Error", {}).get("Code") == "ConditionalCheckFailedException"
+
+
+def append(attributes, name, record):
+    #dict, str, dict -> None
+    """Append record to the records of the kind name, see ShardedAttributes.append.
+
+    Any other dict keeps them in a list under name.
+    """
+    if isinstance(attributes, ShardedAttributes):
+        attributes.append(name, record)
+        return
+    attributes.setdefault(name, []).append(record)
+
+
+def set_entry(attributes, path, value):
+    #dict, tuple, object -> None
+    """Set the map entry at path in the persistent attributes to value.
+
+    Only the entry is written when the attributes were loaded by DynamoDbPersistenceAdapter,
+    see TrackedAttributes.set_entry.
+    """
+    if isinstance(attributes, (TrackedAttributes, ShardedAttributes)):
+        attributes.set_entry(path, value)
+        return
+    for key in path[:-1]:
+        attributes = attributes.setdefault(key, {})
+    attributes[path[-1]] = value
+
+
+def extend(attributes, key, values):
+    #dict, str, list -> None
+    """Add values to the end of the list at key in the persistent attributes.
+
+    Only the values are written when the attributes were loaded by DynamoDbPersistenceAdapter,
+    see TrackedAttributes.extend.
+    """
+    if isinstance(attributes, (TrackedAttributes, ShardedAttributes)):
+        attributes.extend(key, values)
+        return
+    attributes.setdefault(key, []).extend(values)
+
+
+def discard(attributes, key, members):
+    #dict, str, list -> None
+    """Take members out of the list or map at key in the persistent attributes, see TrackedAttributes.discard."""
+    if isinstance(attributes, (TrackedAttributes, ShardedAttributes)):
+        attributes.discard(key, members)
+        return
+    value = attributes.get(key)
+    members = set(members)
+    if isinstance(value, dict):
+        for member in members:
+            value.pop(member, None)
+    elif isinstance(value, list):
+        value[:] = [member for member in value if member not in members]
+
+
+def increment(attributes, path, amount=1):
+    #dict, tuple, int -> None
+    """Add amount to the counter at path in the persistent attributes.
+
+    Uses an atomic ADD when the attributes were loaded by DynamoDbPersistenceAdapter,
+    and a plain read-modify-write for any other dict.
+    """
+    if isinstance(attributes, (TrackedAttributes, ShardedAttributes)):
+        attributes.increment(path, amount)
+        return
+    for key in path[:-1]:
+        attributes = attributes.setdefault(key, {})
+    attributes[path[-1]] = attributes.get(path[-1], 0) + amount
+
+
+persistence_adapter = DynamoDbPersistenceAdapter(pack_items=pack_items)
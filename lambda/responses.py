@@ -0,0 +1,178 @@
+"""The skill's spoken responses, as named templates compiled once when the module is imported.
+
+A template is SSML with named fields, each with a type that says how its value is put in:
+
+    text  words and names the user said, escaped for SSML
+    int   a number
+    ssml  SSML the skill built itself, e.g. a spelling from utils.render_spelling or a list
+          from utils.join_words, put in as it is
+
+e.g. "Your {ordinal:text} word is: {word:text}". render(template_name, **values) fills a template in, and
+respond(handler_input, speech) puts the speech into the response. Every speech is checked
+against MAX_SPEECH_LENGTH before it is sent, as Alexa rejects a response with longer speech.
+"""
+import os
+import string
+from xml.sax.saxutils import escape
+
+from ask_sdk_core.exceptions import AskSdkException
+from ask_sdk_model.ui import Reprompt, SsmlOutputSpeech
+
+#Longest speech, in bytes of SSML including the <speak> tags, that Alexa accepts
+MAX_SPEECH_LENGTH = int(os.environ.get('MAX_SPEECH_LENGTH', 8000))
+
+_SPEAK_TAGS = len("<speak></speak>")
+
+TEMPLATES = {
+    "launch.new_user": "Have we met before? Please tell me your name to continue.",
+    "launch.welcome": "Welcome to Spelling Practice {name:text}. You can update your list or begin a test",
+    "launch.welcome_profiles": "Welcome to Spelling Practice {name:text}. You can update your list or begin a test, "
+                               "or say switch child if someone else is practising",
+    "username.new": "Hello {name:text}. Welcome to Alexa Spelling Test Helper. You can say update my list or begin test.",
+    "username.known": "Welcome back {name:text}. You can say update my list or begin test.",
+    "profile.ask": "Who is practising? Please tell me your name.",
+    "profile.required": "Before we start, who is practising? Please tell me your name.",
+    "profile.choose": "Who is practising, {names:ssml}? If you are new, just tell me your name.",
+    "quiz.no_words": "Please add words to your spelling list to begin a test",
+    "quiz.begin": "Your test will now begin. Your first word is:<break time='0.3s'></break> {word:text}",
+    "quiz.word": "Your {ordinal:text} word is: {word:text}",
+    "quiz.empty_list": "You haven't added any words yet. Say update my spelling list to add words to your spelling list.",
+    "quiz.complete": "You have completed your spelling test! You can say 'begin checking' to check your spellings.",
+    "marking.no_words": "Please add words to your spelling list to begin spell-checking",
+    "marking.begin": "Spell-Checker will now begin. Your first word was {word:text}. The spelling is: "
+                     "{spelling:ssml}.<break time='0.5s'></break> Did you get that right?",
+    "marking.answer": "Your {ordinal:text} word was {word:text}. It is spelt as: "
+                      "{spelling:ssml}.<break time='0.5s'></break> Did you get that right?",
+    "marking.empty_list": "I'm sorry but it seems that there are no words for you to practise this week.",
+    "marking.complete_letters": "Spell-Checker Completed. You can close this program now.",
+    "marking.complete_phonetic": "That's all the words you needed to practise today. You can close this program now.",
+    "confirm.right_complete": "Well done! Spell-Checking Complete",
+    "confirm.right": "Well done! You can say 'next one' to hear the spelling of your next word.",
+    "confirm.wrong_complete": "Unlucky! Spell-Checking Complete",
+    "confirm.wrong": "Unlucky! You can say 'next one' to hear the spelling of your next word.",
+    "list.cleared": "Ok. I have cleared all the words from your spelling list. "
+                    "You can make a new list by saying 'create a new spelling list'.",
+    "report.attempts": "{name:text} has currently attempted the test {attempts:int} times.",
+    "report.recent": "In the last {days:int} days they got {right:int} of {marked:int} words right.",
+    "report.improving": "They have stopped getting {words:ssml} wrong.",
+    "report.missed_word": "They got the word {word:text} wrong {count:int} times.",
+    "report.more": "Say more to hear the next words.",
+    "report.no_more": "There is no more of the report. You can say show me the report to hear it again.",
+    "report.no_misses": "{name:text} hasn't got any words wrong yet.",
+    "report.most_missed": "{name:text}'s most incorrect word is {word:text}. They got it wrong {count:int} times.",
+    "add.added_one": "Ok. I have added the word.",
+    "add.added": "Ok. I have added {count:int} words.",
+    "add.known_one": "{words:ssml} is already on your list.",
+    "add.known": "{words:ssml} are already on your list.",
+    "add.unknown": "I didn't recognise {word:text}, so I haven't added it.",
+    "add.suggest": "To add {suggestions:ssml} instead, say add {suggestion:text}.",
+    "add.ask": "Which words would you like to add?",
+    "remove.removed_one": "Ok. I have taken the word off your list.",
+    "remove.removed": "Ok. I have taken {count:int} words off your list.",
+    "remove.missing_one": "{words:ssml} is not on your list.",
+    "remove.missing": "{words:ssml} are not on your list.",
+    "remove.ask": "Which words would you like to take off your list?",
+    "settings.phonetics": "Answers will be told in phonetics",
+    "settings.letters": "Answers will be told in letters",
+    "help": "You can say hello to me! How can I help?",
+    "goodbye": "Goodbye!",
+    "reflector": "You just triggered {intent:text}.",
+    "error": "Sorry, I had trouble doing what you asked. Please try again.",
+}
+
+
+class SpeechTooLongException(AskSdkException):
+    """Raised instead of sending speech that Alexa would reject for being longer than MAX_SPEECH_LENGTH."""
+
+
+def _text(value):
+    #most words and names have nothing to escape, and looking is quicker than escape's three replaces
+    if "&" in value or "<" in value or ">" in value:
+        return escape(value)
+    return value
+
+
+def _ssml(value):
+    return value
+
+
+def _int(value):
+    return str(int(value))
+
+
+_CONVERTERS = {"text": _text, "ssml": _ssml, "int": _int}
+
+
+class Template(object):
+    """A response template compiled to a format string with positional fields and the converter of each field."""
+    __slots__ = ("name", "fields", "_format", "_literal")
+
+    def __init__(self, name, source):
+        #str, str -> None
+        self.name = name
+        fields = []
+        pattern = []
+        for literal, field_name, spec, conversion in string.Formatter().parse(source):
+            pattern.append(literal.replace("{", "{{").replace("}", "}}"))
+            if field_name is None:
+                continue
+            if spec not in _CONVERTERS or conversion is not None or not field_name.isidentifier():
+                raise ValueError("Bad field {{{}:{}}} in response template {}".format(field_name, spec, name))
+            fields.append((field_name, _CONVERTERS[spec]))
+            pattern.append("{}")
+        self.fields = tuple(fields)
+        pattern = "".join(pattern)
+        #a template without fields is rendered to the same string every time
+        self._literal = pattern.replace("{{", "{").replace("}}", "}") if not fields else None
+        self._format = pattern.format
+
+    def render(self, values):
+        #dict -> str
+        if self._literal is not None:
+            return self._literal
+        return self._format(*[convert(values[field_name]) for field_name, convert in self.fields])
+
+
+def _compile(templates):
+    #dict -> dict
+    return dict((name, Template(name, source)) for name, source in templates.items())
+
+
+_templates = _compile(TEMPLATES)
+
+
+def render(template_name, **values):
+    #str, ... -> str
+    """Return the SSML of the template called template_name with its fields filled in from values."""
+    return _templates[template_name].render(values)
+
+
+def speech_length(speech):
+    #str -> int
+    """Return the length of speech in bytes of UTF-8, without encoding it if it is ASCII."""
+    return len(speech) if speech.isascii() else len(speech.encode("utf-8"))
+
+
+def _output_speech(speech):
+    #str -> SsmlOutputSpeech
+    if speech_length(speech) + _SPEAK_TAGS > MAX_SPEECH_LENGTH:
+        raise SpeechTooLongException(
+            "Speech of more than {} bytes: {}...".format(MAX_SPEECH_LENGTH, speech[:100]))
+    return SsmlOutputSpeech(ssml="<speak>" + speech + "</speak>")
+
+
+def respond(handler_input, speech, reprompt=False):
+    #HandlerInput, str, bool or str -> Response
+    """Return the response with speech as its output speech.
+
+    If reprompt is True, speech is the reprompt too, and its output speech is built once and
+    shared, instead of the response builder wrapping, trimming and copying the same text for
+    speak() and ask(). If reprompt is a speech, it is the reprompt.
+    """
+    response = handler_input.response_builder.response
+    output_speech = _output_speech(speech)
+    response.output_speech = output_speech
+    if reprompt:
+        response.reprompt = Reprompt(output_speech=output_speech if reprompt is True else _output_speech(reprompt))
+        response.should_end_session = False
+    return response
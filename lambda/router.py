@@ -0,0 +1,95 @@
+import json
+
+from ask_sdk_core.skill_builder import CustomSkillBuilder
+from ask_sdk_runtime.dispatch_components.request_components import AbstractRequestMapper
+from ask_sdk_runtime.dispatch_components.request_components import GenericRequestHandlerChain
+from ask_sdk_runtime.exceptions import DispatchException
+
+class IntentRouter(AbstractRequestMapper):
+    """Routes each request to its handler with a single table lookup.
+
+    Routes are keyed by request type and intent name. A route can be guarded by
+    the session state (e.g. 'ADDUSER', 'TEST', 'MARKING'), in which case it is only
+    used while the session is in one of those states. A route added without an
+    intent name catches every request of its type that no other route handles.
+
+    A guard (see add_guard) sends intent requests to another handler while a check fails,
+    e.g. to ask who is practising before a child's words are read.
+    """
+    def __init__(self):
+        #(request type, intent name) -> {state: handler chain}, None is used for no guard
+        self._routes = {}
+        #(handler chain, check, intent names the guard does not apply to), None if there is no guard
+        self._guard = None
+
+    def add_route(self, request_handler, request_type, intent_names=None, states=None):
+        #AbstractRequestHandler, str, str list, str list -> None
+        """Register request_handler for the given request type, intent names and states."""
+        chain = GenericRequestHandlerChain(request_handler=request_handler)
+        for intent_name in intent_names or [None]:
+            chains_by_state = self._routes.setdefault((request_type, intent_name), {})
+            for state in states or [None]:
+                if state in chains_by_state:
+                    raise DispatchException(
+                        "A handler is already registered for {} {} in state {}".format(request_type, intent_name, state))
+                chains_by_state[state] = chain
+
+    def add_guard(self, request_handler, check, exempt_intent_names):
+        #AbstractRequestHandler, function, str list -> None
+        """Send intent requests to request_handler instead of their own route while check(handler_input) is False.
+
+        Intents in exempt_intent_names always go to their own route, e.g. the intents that make
+        check pass or that do not need it to.
+        """
+        self._guard = (GenericRequestHandlerChain(request_handler=request_handler), check, frozenset(exempt_intent_names))
+
+    def get_request_handler_chain(self, handler_input):
+        # type: (HandlerInput) -> GenericRequestHandlerChain
+        request = handler_input.request_envelope.request
+        intent = getattr(request, "intent", None)
+        if self._guard is not None and intent is not None and intent.name not in self._guard[2]:
+            if not self._guard[1](handler_input):
+                return self._guard[0]
+        chains_by_state = self._routes.get((request.object_type, intent.name if intent is not None else None))
+        chain = self._chain_for_state(handler_input, chains_by_state)
+        if chain is None and intent is not None:
+            chain = self._chain_for_state(handler_input, self._routes.get((request.object_type, None)))
+        return chain
+
+    def _chain_for_state(self, handler_input, chains_by_state):
+        if not chains_by_state:
+            return None
+        if len(chains_by_state) == 1 and None in chains_by_state:
+            return chains_by_state[None]
+        session = handler_input.request_envelope.session
+        state = handler_input.attributes_manager.session_attributes.get("state") if session is not None else None
+        return chains_by_state.get(state, chains_by_state.get(None))
+
+    def check_interaction_model(self, path):
+        #str -> None
+        """Raise DispatchException if an intent in the interaction model at path has no route.
+
+        The interaction model is not deployed with the lambda folder, so the skill does not check
+        it itself. benchmarks/load_test.py checks en-Gb.json before it runs.
+        """
+        with open(path) as model_file:
+            model = json.load(model_file)
+        intents = model["interactionModel"]["languageModel"]["intents"]
+        missing = [intent["name"] for intent in intents if ("IntentRequest", intent["name"]) not in self._routes]
+        if missing:
+            raise DispatchException("No handler registered for intents: " + ", ".join(missing))
+
+
+class RoutedSkillBuilder(CustomSkillBuilder):
+    """CustomSkillBuilder that dispatches requests with an IntentRouter instead of
+    asking every request handler in turn if it can handle the request.
+    """
+    def __init__(self, router, persistence_adapter=None, api_client=None):
+        super(RoutedSkillBuilder, self).__init__(persistence_adapter=persistence_adapter, api_client=api_client)
+        self.router = router
+
+    @property
+    def skill_configuration(self):
+        skill_config = super(RoutedSkillBuilder, self).skill_configuration
+        skill_config.request_mappers = [self.router]
+        return skill_config
@@ -1,82 +1,646 @@
+import bisect
+import functools
+import heapq
 import logging
 import os
-import boto3
-from botocore.exceptions import ClientError
-from ask_sdk_core.handler_input import HandlerInput
+import threading
+import time
+from collections import OrderedDict
+from xml.sax.saxutils import escape
 
-from ask_sdk_dynamodb.adapter import DynamoDbAdapter
+import dictionary
+import persistence
 
-ddb_region = os.environ.get('DYNAMODB_PERSISTENCE_REGION')
-ddb_table_name = os.environ.get('DYNAMODB_PERSISTENCE_TABLE_NAME')
+#Seconds a presigned URL is valid for. URLs are reused until PRESIGNED_URL_MARGIN seconds before they expire.
+PRESIGNED_URL_EXPIRY = max(1, int(os.environ.get('S3_PRESIGNED_URL_EXPIRY', 3600)))
+#A minute, or a quarter of the expiry if that is shorter, so a URL generation is never empty (see get_url_generation)
+PRESIGNED_URL_MARGIN = min(60, PRESIGNED_URL_EXPIRY // 4)
+#Folder in the S3 bucket holding a clip for each grapheme in letterPhonemeDict and graphemePhonemeDict, made by
+#tools/generate_phoneme_audio.py. Phonetic spellings play the clips if it is set.
+PHONEME_AUDIO_PREFIX = os.environ.get('PHONEME_AUDIO_PREFIX')
+#Alexa plays at most five audio clips in one response
+MAX_AUDIO_CLIPS = 5
 
-ddb_resource = boto3.resource('dynamodb', region_name=ddb_region)
-dynamodb_adapter = DynamoDbAdapter(table_name=ddb_table_name, create_table=False, dynamodb_resource=ddb_resource)
+# Shared S3 client, built on first use like the DynamoDB resource in persistence.
+_s3_client = None
+#object name -> (presigned URL, URL generation it was signed in)
+_presigned_urls = {}
 
 
+def configure_s3(s3_client=None):
+    #S3.Client -> None
+    """Replace the S3 client used by the skill, e.g. with a local stand-in."""
+    global _s3_client
+    _s3_client = s3_client
+    _presigned_urls.clear()
+
+def get_s3_client():
+    # -> S3.Client
+    """Return the shared S3 client, creating it on first call."""
+    global _s3_client
+    if _s3_client is None:
+        #boto3 is imported here so that loading utils does not slow down cold starts
+        import boto3
+        _s3_client = boto3.client('s3',
+                                  region_name=os.environ.get('S3_PERSISTENCE_REGION'),
+                                  config=boto3.session.Config(signature_version='s3v4',s3={'addressing_style': 'path'}))
+    return _s3_client
+
+def get_url_generation():
+    # -> Int
+    """Return the number of the current URL generation.
+    
+    Presigned URLs are renewed together every PRESIGNED_URL_EXPIRY - PRESIGNED_URL_MARGIN seconds,
+    so anything holding a URL from the current generation can use it until the generation changes.
+    """
+    return int(time.time() // (PRESIGNED_URL_EXPIRY - PRESIGNED_URL_MARGIN))
 
 def create_presigned_url(object_name):
-    """Generate a presigned URL to share an S3 object with a capped expiration of 60 seconds
+    """Generate a presigned URL to share an S3 object, reusing the URL signed earlier in the same URL generation
 
     :param object_name: string
     :return: Presigned URL as string. If error, returns None.
     """
-    s3_client = boto3.client('s3',
-                             region_name=os.environ.get('S3_PERSISTENCE_REGION'),
-                             config=boto3.session.Config(signature_version='s3v4',s3={'addressing_style': 'path'}))
+    from botocore.exceptions import ClientError
+    generation = get_url_generation()
+    cached = _presigned_urls.get(object_name)
+    if cached is not None and cached[1] == generation:
+        return cached[0]
     try:
         bucket_name = os.environ.get('S3_PERSISTENCE_BUCKET')
-        response = s3_client.generate_presigned_url('get_object',
-                                                    Params={'Bucket': bucket_name,
-                                                            'Key': object_name},
-                                                    ExpiresIn=60*1)
+        response = get_s3_client().generate_presigned_url('get_object',
+                                                          Params={'Bucket': bucket_name,
+                                                                  'Key': object_name},
+                                                          ExpiresIn=PRESIGNED_URL_EXPIRY)
     except ClientError as e:
         logging.error(e)
         return None
 
     # The response contains the presigned URL
+    _presigned_urls[object_name] = (response, generation)
     return response
 
+def get_phoneme_audio_key(grapheme):
+    #String -> String
+    """Return the name of the S3 object holding the clip of the phonics sound of grapheme."""
+    return "{}{}.mp3".format(PHONEME_AUDIO_PREFIX or "", grapheme)
+
+def get_user_name(handler_input):
+    #handler_input -> String
+    """Return the name of the child whose profile is selected, None if there are no profiles yet."""
+    persistent_attr = handler_input.attributes_manager.persistent_attributes
+    profile = persistent_attr.get("profiles", {}).get(persistent_attr.profile_id)
+    if profile is None:
+        return None
+    return profile["userName"]
+
+def has_profile(handler_input):
+    #handler_input -> Bool
+    """Return True if a child's profile is selected, so its words and stats can be read."""
+    return handler_input.attributes_manager.persistent_attributes.profile_id is not None
+
+def select_profile(handler_input, userName):
+    #handler_input, String -> Bool
+    """Make the profile of the child called userName the one used by the session, creating it if needed.
+    
+    Returns True if a new profile was created. Results of an unfinished marking pass are saved to
+    the previous profile and the session cursor is reset for the new profile's word list.
+    """
+    session_attr = handler_input.attributes_manager.session_attributes
+    persistent_attr = handler_input.attributes_manager.persistent_attributes
+    save_marking_results(handler_input)
+    profile_id = persistence.profile_id_for(userName)
+    profiles = persistent_attr.setdefault("profiles", {})
+    is_new = profile_id not in profiles
+    if is_new:
+        profiles[profile_id] = {"userName": userName}
+    persistent_attr["activeProfile"] = profile_id
+    persistent_attr.select_profile(profile_id)
+    session_attr["profile"] = profile_id
+    session_attr["listVersion"] = None
+    session_attr["numOfWords"] = 0
+    session_attr["nextWordIndex"] = 0
+    session_attr["testPlan"] = []
+    session_attr.pop("reportCursor", None)
+    return is_new
+
+def get_words(handler_input):
+    #handler_input -> String list
+    """Return the user's word list from the persistent attributes.
+    
+    The list is not copied into the session, so it is read from the database when a handler
+    needs it. If words changed index (e.g. were removed from another device) since the session
+    saw the list, the session cursor (listVersion and numOfWords) is updated to match.
+    """
+    session_attr = handler_input.attributes_manager.session_attributes
+    persistent_attr = handler_input.attributes_manager.persistent_attributes
+    words = persistent_attr.get("words", [])
+    listVersion = persistent_attr.get("listVersion", 0)
+    if session_attr.get("listVersion") != listVersion:
+        session_attr["listVersion"] = listVersion
+        session_attr["numOfWords"] = len(words)
+    return words
+
+class WordList(object):
+    """A word list as an insertion-ordered set.
+    
+    words is the stored list, in the order the words were added, and positions maps each word
+    to its index in it, so checking whether a word is on the list and finding it take O(1).
+    """
+    __slots__ = ("words", "positions")
+
+    def __init__(self, words):
+        self.words = words
+        self.positions = {}
+        for index, word in enumerate(words):
+            #lists saved before they were kept as sets can hold a word twice
+            self.positions.setdefault(word, index)
+
+    def __contains__(self, word):
+        return word in self.positions
+
+    def __len__(self):
+        return len(self.words)
+
+    def __iter__(self):
+        return iter(self.words)
+
+    def __getitem__(self, index):
+        return self.words[index]
+
+    def index(self, word):
+        #String -> Int
+        return self.positions[word]
+
+def get_word_list(handler_input):
+    #handler_input -> WordList
+    """Return the user's word list (see get_words) as a WordList."""
+    return WordList(get_words(handler_input))
+
+def set_words(handler_input, words):
+    #handler_input, String list -> None
+    """Replace the user's word list and move on its version so open sessions notice the change."""
+    handler_input.attributes_manager.persistent_attributes["words"] = words
+    _move_list_version(handler_input)
+
+def _move_list_version(handler_input):
+    #handler_input -> None
+    """Move on the version of the word list after words have changed index, so open sessions notice the change."""
+    session_attr = handler_input.attributes_manager.session_attributes
+    persistent_attr = handler_input.attributes_manager.persistent_attributes
+    persistent_attr["listVersion"] = persistent_attr.get("listVersion", 0) + 1
+    session_attr["listVersion"] = persistent_attr["listVersion"]
+    session_attr["numOfWords"] = len(persistent_attr["words"])
+
+def add_words(handler_input, words):
+    #handler_input, String list -> None
+    """Add words that are not on the user's word list yet to the end of it.
+    
+    Only the new words are written (see persistence.extend), and the words already on the list
+    keep their index, so the list version, the session's test plan and any marking results stay
+    valid. New words have no report or schedule yet, so plan_test asks them first.
+    """
+    session_attr = handler_input.attributes_manager.session_attributes
+    persistent_attr = handler_input.attributes_manager.persistent_attributes
+    persistence.extend(persistent_attr, "words", words)
+    session_attr["numOfWords"] = len(persistent_attr["words"])
+
+def remove_words(handler_input, words):
+    #handler_input, String list -> (String list, String list)
+    """Take words off the user's word list, returning those that were taken off and those that were not on it.
+    
+    Only the removal of the words is written, and their counters and schedule are taken out of
+    the stats the same way. The words after them move down the list, so its version is moved
+    on. The topMissed index is dropped if it held one of them, and is built again the next time
+    it is read (see get_top_missed).
+    """
+    persistent_attr = handler_input.attributes_manager.persistent_attributes
+    word_list = get_word_list(handler_input)
+    removed = [word for word in words if word in word_list]
+    missing = [word for word in words if word not in word_list]
+    if not removed:
+        return removed, missing
+    persistence.discard(persistent_attr, "words", removed)
+    _move_list_version(handler_input)
+    for name in ("wordReport", "wordSchedule"):
+        if any(word in persistent_attr.get(name, {}) for word in removed):
+            persistence.discard(persistent_attr, name, removed)
+    if any(entry[0] in removed for entry in persistent_attr.get("topMissed") or []):
+        del persistent_attr["topMissed"]
+    return removed, missing
+
+def clear_words(handler_input):
+    #handler_input -> None
+    """Empty the user's word list, and the report and schedule of the words that were on it."""
+    persistent_attr = handler_input.attributes_manager.persistent_attributes
+    set_words(handler_input, [])
+    persistent_attr["wordReport"] = {}
+    persistent_attr["wordSchedule"] = {}
+    persistent_attr["topMissed"] = []
+
+def normalize_word(word):
+    #String -> String
+    """Return word as it is kept in a word list, None if the skill cannot spell it out.
+    
+    Words are lower case and can only contain letters and the punctuation in symbolNameDict.
+    """
+    word = word.strip().lower()
+    if not word or any(letter not in letterPhonemeDict and letter not in symbolNameDict for letter in word):
+        return None
+    return word
+
+def check_new_words(handler_input, slot_words):
+    #handler_input, String list -> (String list, String list, dict)
+    """Sort the words heard in the words slot into those to add to the word list, those already on it,
+    and those the skill does not know.
+
+    Words are normalized with normalize_word and, if the dictionary index is installed, must be in it.
+    Unknown words map to up to dictionary.MAX_SUGGESTIONS near matches from the dictionary, so a
+    misheard word is not added but the child can be told what to ask for instead.
+    """
+    word_index = dictionary.get_word_index()
+    current = get_word_list(handler_input)
+    new_words, known_words, unknown_words = [], [], {}
+    for slot_word in slot_words:
+        #the slot can hold punctuation Alexa added around the words it heard
+        word = normalize_word(slot_word.strip(",.!?;:\"()"))
+        if word is None or (word_index is not None and word not in word_index):
+            unknown_words[slot_word] = word_index.suggest(word) if word is not None and word_index is not None else []
+        elif word in current:
+            if word not in known_words:
+                known_words.append(word)
+        elif word not in new_words:
+            new_words.append(word)
+    return new_words, known_words, unknown_words
+
+def join_words(words, conjunction="and"):
+    #String list, String -> String
+    """Return words as they are said in a sentence, e.g. "ship, train and boat", escaped for SSML."""
+    words = [escape(word) for word in words]
+    if len(words) < 2:
+        return "".join(words)
+    return ", ".join(words[:-1]) + " " + conjunction + " " + words[-1]
+
+#Most words in one test, so children with a large word bank get a short test of the words they most need
+TEST_LENGTH = int(os.environ.get('TEST_LENGTH', 20))
+
+def plan_test(handler_input):
+    #handler_input -> String list
+    """Choose the words for a test, in the order they are asked, and keep them in session_attr["testPlan"].
+    
+    Words are scheduled like flash cards: a word the child got wrong is due again at the next test,
+    and a word they got right is due again after a gap that doubles each time they get it right
+    (persistent_attr["wordSchedule"]). Words are taken from a priority queue with the words due
+    soonest first, new words before any others and the words missed most often first among equals.
+    Only TEST_LENGTH words are taken from the queue, so a large word bank is never sorted.
+    
+    The plan holds the words to ask rather than their index in the word list, so words taken
+    off the list while the test runs do not move the words after them.
+    """
+    session_attr = handler_input.attributes_manager.session_attributes
+    persistent_attr = handler_input.attributes_manager.persistent_attributes
+    words = get_words(handler_input)
+    schedule = persistent_attr.get("wordSchedule", {})
+    report = persistent_attr.get("wordReport", {})
+    queue = [(schedule[word][0] if word in schedule else 0, -report.get(word, 0), index)
+             for index, word in enumerate(words)]
+    heapq.heapify(queue)
+    plan = [words[heapq.heappop(queue)[2]] for _ in range(min(TEST_LENGTH, len(queue)))]
+    session_attr["testPlan"] = plan
+    session_attr["nextWordIndex"] = 0
+    return plan
+
+def get_test_length(handler_input):
+    #handler_input -> Int
+    """Return the number of words in the test planned by plan_test."""
+    return len(handler_input.attributes_manager.session_attributes.get("testPlan") or [])
+
 def get_word_to_practise(handler_input):
     #handler_input -> String
+    """Return the next word in the test planned by plan_test and move on to the one after, None once the test is finished.
+    
+    Words taken off the list since the test was planned are skipped.
+    """
     session_attr = handler_input.attributes_manager.session_attributes
-    currentWordList = session_attr["words"]
+    plan = session_attr.get("testPlan") or []
+    currentWordList = get_word_list(handler_input)
     counter = session_attr["nextWordIndex"]
-    if len(currentWordList) == 0:
-        return "0"
-    elif counter < len(currentWordList)-1:
-        currentWord = currentWordList[counter]
+    while counter < len(plan):
+        word = plan[counter]
         counter += 1
         session_attr["nextWordIndex"] = counter
-        return currentWord
-    elif counter == len(currentWordList)-1:
-        currentWord = currentWordList[counter]
-        counter+=1
-        session_attr["nextWordIndex"] = counter
-        return currentWord
-    else:
-        return "1"
+        if word in currentWordList:
+            session_attr["wordMarked"] = False
+            return word
+    return None
+
+def record_marking_result(handler_input, correct):
+    #handler_input, Bool -> Bool
+    """Keep the result of the word last given by get_word_to_practise in the session until the marking pass is saved.
+    
+    session_attr["markingResults"] holds the listVersion the pass was marked against and two
+    bitmaps, as hex strings, with a bit set for the index in the word list of each word that was
+    marked ("marked") and each word the child got wrong ("misses").
+    Each word given is only marked once, so answering again, e.g. after the last word of a pass
+    has been saved, does not count it twice. Returns False if the result was not kept.
+    """
+    session_attr = handler_input.attributes_manager.session_attributes
+    plan = session_attr.get("testPlan") or []
+    if not 0 < session_attr.get("nextWordIndex", 0) <= len(plan) or session_attr.get("wordMarked"):
+        #no word has been given to mark, or it has been marked already
+        return False
+    word_list = get_word_list(handler_input)
+    word = plan[session_attr["nextWordIndex"] - 1]
+    if word not in word_list:
+        #taken off the list since it was given
+        return False
+    session_attr["wordMarked"] = True
+    index = word_list.index(word)
+    results = session_attr.get("markingResults")
+    if not results or results["listVersion"] != session_attr.get("listVersion", 0):
+        results = {"listVersion": session_attr.get("listVersion", 0), "marked": "0", "misses": "0"}
+    results["marked"] = format(int(results.get("marked", "0"), 16) | (1 << index), "x")
+    if not correct:
+        results["misses"] = format(int(results["misses"], 16) | (1 << index), "x")
+    session_attr["markingResults"] = results
+    return True
+
+def save_marking_results(handler_input):
+    #handler_input -> None
+    """Add the results kept in the session by record_marking_result to the persistent wordReport and wordSchedule.
+    
+    The persistent attributes are only loaded if there are results to save, and they are
+    written by SavePersistentAttributesResponseInterceptor once the response is built.
+    Results are dropped if words have been taken off the list or it has been replaced since they
+    were marked, as the bitmaps hold the words' indexes. Words added since do not move any index.
+    The results are kept in session_attr["savingMarkingResults"] until the save has succeeded
+    (see marking_results_saved), so they can be put back if it fails.
+    """
+    session_attr = handler_input.attributes_manager.session_attributes
+    if session_attr is None or not session_attr.get("markingResults"):
+        return
+    results = session_attr["markingResults"]
+    session_attr["markingResults"] = {}
+    if results.get("marked", "0") == "0" and results["misses"] == "0":
+        return
+    persistent_attr = handler_input.attributes_manager.persistent_attributes
+    if persistent_attr.get("listVersion", 0) != results["listVersion"]:
+        logging.warning("Word list changed during marking, results of the marking pass were not saved")
+        return
+    session_attr["savingMarkingResults"] = results
+    words = persistent_attr.get("words", [])
+    misses = int(results["misses"], 16)
+    marked_words, missed_words = [], []
+    #bits are read from the lowest, which is the first word in the list
+    for index, bit in enumerate(reversed(bin(int(results.get("marked", "0"), 16) | misses)[2:])):
+        if bit == "1" and index < len(words):
+            correct = not misses >> index & 1
+            schedule_word(handler_input, words[index], correct)
+            marked_words.append(words[index])
+            if words[index] not in persistent_attr.get("wordReport", {}):
+                #the report holds every word that has been marked, e.g. for tools/export_analytics.py
+                persistence.increment(persistent_attr, ("wordReport", words[index]), 0)
+            if not correct:
+                record_miss(handler_input, words[index])
+                missed_words.append(words[index])
+    if marked_words:
+        record_test_result(handler_input, marked_words, missed_words)
 
-def create_word_report(handler_input):
-    #handler_input -> dict
+def marking_results_saved(handler_input):
+    #handler_input -> None
+    """Forget the results save_marking_results took out of the session, once they are in the database."""
     session_attr = handler_input.attributes_manager.session_attributes
-    currentWordList = session_attr["words"]
-    report = session_attr["wordReport"]
-    for word in currentWordList:
-        report[word] = 0
-    return report
+    if session_attr is not None:
+        session_attr.pop("savingMarkingResults", None)
+
+def restore_marking_results(handler_input):
+    #handler_input -> None
+    """Put the results save_marking_results took out of the session back when saving them failed,
+    so they are saved with the next marking result instead of being lost.
+    """
+    session_attr = handler_input.attributes_manager.session_attributes
+    results = session_attr.pop("savingMarkingResults", None) if session_attr is not None else None
+    if not results:
+        return
+    current = session_attr.get("markingResults")
+    if current and current["listVersion"] == results["listVersion"]:
+        #words marked again since are kept as marked, and as missed if they were missed either time
+        for name in ("marked", "misses"):
+            results[name] = format(int(results.get(name, "0"), 16) | int(current.get(name, "0"), 16), "x")
+    session_attr["markingResults"] = results
+
+def schedule_word(handler_input, word, correct):
+    #handler_input, String, Bool -> None
+    """Work out which test word is next due at, see plan_test.
+    
+    Only the word's entry is written (see persistence.set_entry), so sessions marking other
+    words at the same time do not conflict.
+    """
+    persistent_attr = handler_input.attributes_manager.persistent_attributes
+    schedule = persistent_attr.get("wordSchedule", {})
+    testAttempts = persistent_attr.get("testAttempts", 0)
+    if not correct:
+        gap = 1
+    else:
+        gap = schedule[word][1] * 2 if word in schedule else 2
+    persistence.set_entry(persistent_attr, ("wordSchedule", word), [testAttempts + gap, gap])
+
+#Number of most missed words kept in persistent_attr["topMissed"]
+TOP_MISSED_SIZE = 10
 
-def sortReport(report):
+def record_miss(handler_input, word):
+    #handler_input, String -> None
+    """Increase the number of times word was got wrong and keep the most missed words index up to date."""
+    persistent_attr = handler_input.attributes_manager.persistent_attributes
+    persistence.increment(persistent_attr, ("wordReport", word))
+    misses = persistent_attr["wordReport"][word]
+    topMissed = [entry for entry in get_top_missed(handler_input) if entry[0] != word]
+    #entries are kept in report order, so the word goes after the last entry that comes before it
+    position = 0
+    while position < len(topMissed) and _report_order(topMissed[position]) < (-misses, word):
+        position += 1
+    topMissed.insert(position, [word, misses])
+    persistent_attr["topMissed"] = topMissed[:TOP_MISSED_SIZE]
+
+def get_top_missed(handler_input):
+    #handler_input -> list
+    """Return [word, misses] pairs for the words got wrong the most, in report order (see _report_order).
+    
+    The index is kept up to date by record_miss, so the whole wordReport never has to be sorted.
+    Reports saved before the index existed have it built from the wordReport once.
+    """
+    persistent_attr = handler_input.attributes_manager.persistent_attributes
+    if persistent_attr.get("topMissed") is None:
+        persistent_attr["topMissed"] = build_top_missed(persistent_attr)
+    return persistent_attr["topMissed"]
+
+def build_top_missed(attributes):
     #dict -> list
-    """ This helper function will take a given wordReport and return a list of tuple containing the individual word and the incorrect attempts. """
-    sortedReport = sorted(report.items(),key = lambda t: t[1],reverse=True)
-    #print(sortedReport)
-    return sortedReport
+    """Return the topMissed index for the wordReport in attributes, sorting only the words that go in it."""
+    report = attributes.get("wordReport", {})
+    return [[word, misses] for word, misses in heapq.nsmallest(TOP_MISSED_SIZE, report.items(), key=_report_order)
+            if misses > 0]
+
+#When another session saved the stats first, the counters are added together and the index is built again from them
+persistence.derived_attributes["topMissed"] = build_top_missed
+
+#Days of results kept in persistent_attr["resultDays"], the longest window get_recent_results is asked for
+RESULT_HISTORY_DAYS = 30
+
+def record_test_result(handler_input, marked_words, missed_words, now=None):
+    #handler_input, String list, String list, float -> None
+    """Keep the result of a marking pass as a record of its own and add it to the rolling aggregates.
+    
+    The record is appended to the profile's results (see persistence.append), which are never
+    read by the skill and expire after persistence.record_ttl_days. It is only written once the
+    attributes are saved. persistent_attr["resultDays"] holds the results of the last
+    RESULT_HISTORY_DAYS days added up per day: the number of results, the words marked and
+    missed, and the misses of each word, each a counter of its own (see _result_key). Counters
+    are increased with atomic ADDs and the counters of days that have fallen out of the window
+    are taken out one by one, so results saved by two sessions at the same time never conflict.
+    """
+    persistent_attr = handler_input.attributes_manager.persistent_attributes
+    now = time.time() if now is None else now
+    persistence.append(persistent_attr, "result", {
+        "time": int(now), "listVersion": persistent_attr.get("listVersion", 0),
+        "marked": marked_words, "missed": missed_words})
+    oldest = _result_day(now - (RESULT_HISTORY_DAYS - 1) * 86400)
+    expired = [key for key in persistent_attr.get("resultDays", {}) if key < oldest]
+    if expired:
+        persistence.discard(persistent_attr, "resultDays", expired)
+    today = _result_day(now)
+    persistence.increment(persistent_attr, ("resultDays", _result_key(today, "results")))
+    persistence.increment(persistent_attr, ("resultDays", _result_key(today, "marked")), len(marked_words))
+    persistence.increment(persistent_attr, ("resultDays", _result_key(today, "missed")), len(missed_words))
+    for word in missed_words:
+        persistence.increment(persistent_attr, ("resultDays", _result_key(today, "misses", word)))
+
+def _result_day(timestamp):
+    #float -> String
+    """Return the UTC day of timestamp as it is kept in resultDays, e.g. 2024-03-01, which sort in date order."""
+    return time.strftime("%Y-%m-%d", time.gmtime(timestamp))
+
+def _result_key(day, *names):
+    #String, String... -> String
+    """Return the key of a counter in resultDays, e.g. 2024-03-01/marked or 2024-03-01/misses/ship.
+    
+    Keys start with their day, so the counters of a day sort together and before those of later days.
+    """
+    return "/".join((day,) + names)
+
+def get_recent_results(handler_input, days, now=None):
+    #handler_input, Int, float -> dict
+    """Return the results, words marked and words missed of the last days days (at most RESULT_HISTORY_DAYS), added up."""
+    now = time.time() if now is None else now
+    oldest = _result_day(now - (days - 1) * 86400)
+    totals = {"results": 0, "marked": 0, "missed": 0}
+    for key, count in handler_input.attributes_manager.persistent_attributes.get("resultDays", {}).items():
+        day, name = key.split("/", 1)
+        if day >= oldest and name in totals:
+            totals[name] += int(count)
+    return totals
+
+#Most words get_improving_words returns for the report
+REPORT_IMPROVING_WORDS = 3
+
+def get_improving_words(handler_input, days=7, size=REPORT_IMPROVING_WORDS, now=None):
+    #handler_input, Int, Int, float -> String list
+    """Return up to size words missed in the last RESULT_HISTORY_DAYS days but not in the last days days, most missed first."""
+    now = time.time() if now is None else now
+    recent = _result_day(now - (days - 1) * 86400)
+    earlier, missed_recently = {}, set()
+    for key, misses in handler_input.attributes_manager.persistent_attributes.get("resultDays", {}).items():
+        day, name = key.split("/", 1)
+        if not name.startswith("misses/"):
+            continue
+        word = name[len("misses/"):]
+        if day >= recent:
+            missed_recently.add(word)
+        else:
+            earlier[word] = earlier.get(word, 0) + int(misses)
+    return [word for word, _ in heapq.nsmallest(
+        size, (entry for entry in earlier.items() if entry[0] not in missed_recently), key=_report_order)]
+
+def _report_order(entry):
+    #[String, Int] -> tuple
+    """Sort key of a [word, misses] pair: the most misses first, and words with as many in alphabetical order."""
+    return -entry[1], entry[0]
+
+#Most missed words spoken on each page of the report
+REPORT_PAGE_SIZE = int(os.environ.get('REPORT_PAGE_SIZE', 5))
+#Stats items whose whole report order is kept by report_order, least recently used are dropped first
+REPORT_ORDER_CACHE_SIZE = int(os.environ.get('REPORT_ORDER_CACHE_SIZE', 16))
+
+#(stats item key, version) -> (number of words in the wordReport, [word, misses] pairs, their sort keys)
+_report_orders = OrderedDict()
+_report_orders_lock = threading.Lock()
+
+def get_report_page(handler_input, cursor=None, size=REPORT_PAGE_SIZE):
+    #handler_input, list, Int -> (list, list)
+    """Return the next page of [word, misses] pairs of the report after cursor, and the cursor of the page after it.
+    
+    cursor is the last pair of the page before, None for the first page. The cursor returned is
+    None if there are no more pages. Pages that fall within the topMissed index are read from it,
+    so the first page does not depend on the size of the list. Later pages continue from the
+    cursor in the report order kept by report_order, so they do not go over the whole wordReport.
+    """
+    topMissed = get_top_missed(handler_input)
+    start = 0
+    if cursor is not None:
+        start = next((position + 1 for position, entry in enumerate(topMissed) if entry[0] == cursor[0]), None)
+    #the index holds every missed word if it is not full
+    if start is not None and (len(topMissed) - start > size or len(topMissed) < TOP_MISSED_SIZE):
+        page = topMissed[start:start + size]
+        return page, page[-1] if len(topMissed) - start > size else None
+    pairs, keys = report_order(handler_input.attributes_manager.persistent_attributes)
+    start = bisect.bisect_right(keys, _report_order(cursor)) if cursor is not None else 0
+    page = pairs[start:start + size]
+    return page, page[-1] if len(pairs) - start > size else None
+
+def report_order(persistent_attr):
+    #ShardedAttributes -> (list, list)
+    """Return [word, misses] pairs for every missed word in report order, and the sort key of each.
+    
+    The wordReport is sorted once for each saved version of the stats item, and the order is kept
+    while the parent says more, so each later page is a bisect instead of a pass over the report.
+    While counters in the stats have changes that are not saved, the order is sorted again and not kept.
+    """
+    stats = persistent_attr.shard("stats")
+    report = stats.get("wordReport", {})
+    saved = stats.exists and not (stats.increments or stats.entries or stats.discarded)
+    cache_key = (persistent_attr.shard_key("stats", persistent_attr.profile_id), stats.version)
+    with _report_orders_lock:
+        order = _report_orders.get(cache_key) if saved else None
+        if order is not None:
+            _report_orders.move_to_end(cache_key)
+    #the report is only replaced by clear_words, which empties it, and an item deleted and made
+    #again starts from the same version, so the order is checked against the number of words
+    if order is not None and order[0] == len(report):
+        return order[1], order[2]
+    pairs = sorted(([word, misses] for word, misses in report.items() if misses > 0), key=_report_order)
+    order = (len(report), pairs, [_report_order(pair) for pair in pairs])
+    if saved:
+        with _report_orders_lock:
+            _report_orders[cache_key] = order
+            while len(_report_orders) > REPORT_ORDER_CACHE_SIZE:
+                _report_orders.popitem(last=False)
+    return order[1], order[2]
+
+#Maximum number of rendered spellings kept by render_spelling, least recently used are evicted first
+SPELLING_CACHE_SIZE = int(os.environ.get('SPELLING_CACHE_SIZE', 4096))
+#Maximum number of words kept split into graphemes by segment_word, these are much smaller than rendered spellings
+SEGMENT_CACHE_SIZE = int(os.environ.get('SEGMENT_CACHE_SIZE', 16384))
 
 def get_ordinal_indicator(handler_input,counter):
     #handler_input, Int -> String
     """Return st, nd, rd, th ordinal indicators according to counter."""
-    session_attr = handler_input.attributes_manager.session_attributes
-    if len(session_attr["words"]) -1  == counter:
+    return ordinal_indicator(counter, get_test_length(handler_input))
+
+@functools.lru_cache(maxsize=256)
+def ordinal_indicator(counter, numOfWords):
+    #Int, Int -> String
+    """Return the ordinal indicator for counter in a test of numOfWords words."""
+    if numOfWords -1  == counter:
         return "last"
     counter +=1
     if counter == 1:
@@ -90,28 +654,117 @@ def get_ordinal_indicator(handler_input,counter):
     else:
         return "{}th".format(str(counter))
 
+def render_spelling(word, pronounciation):
+    #String, String -> String
+    """Return the SSML spelling of word in the given pronounciation ('letters' or phonetic).
+    
+    Results are cached, so a word that has already been rendered (e.g. by prerender_spellings
+    when it was added) is only looked up on marking turns. Phonetic spellings that play audio
+    clips hold presigned URLs, so they are only reused within a URL generation.
+    """
+    if pronounciation == "letters" or PHONEME_AUDIO_PREFIX is None:
+        return _render_spelling(word, pronounciation, None)
+    return _render_spelling(word, pronounciation, get_url_generation())
+
+@functools.lru_cache(maxsize=SPELLING_CACHE_SIZE)
+def _render_spelling(word, pronounciation, url_generation):
+    if pronounciation == "letters":
+        return get_spelling_for_word(word)
+    return get_phonetic_spelling(word)
+
+def prerender_spellings(words):
+    #String list -> None
+    """Render the spellings of words in every pronounciation so they are cached for marking."""
+    for word in words:
+        render_spelling(word, "letters")
+        render_spelling(word, "phonetic")
+
 def get_spelling_for_word(word):
     # String -> String
     #use ssml tag <break> to add pause after each letter
-    spelling = "<break time ='0.5s'></break>".join(word)
+    spelling = "<break time ='0.5s'></break>".join(escape(symbolNameDict.get(letter, letter)) for letter in word)
     #spelling = '.'.join(word)
     return spelling
 
+def get_phonemes(grapheme):
+    # String -> String
+    """Return the phonics sound of a grapheme (a letter or group of letters such as sh), None if it has none."""
+    grapheme = grapheme.lower()
+    return graphemePhonemeDict.get(grapheme) or letterPhonemeDict.get(grapheme)
+
 def get_phoenetics_for_letter(letter):
     # String -> String
-    """Helper function to get phonetic sound of individual letter in the word."""
-    phonemes =''
-    phonemes = letterPhonemeDict[letter]
+    """Helper function to get phonetic sound of individual letter, or grapheme, in the word.
+    
+    Capital letters use the sound of the lower case letter, punctuation such as hyphens and
+    apostrophes is silent and any other character is read out as it is.
+    """
+    phonemes = get_phonemes(letter)
+    if phonemes is None:
+        if letter in symbolNameDict or letter.isspace():
+            return ''
+        return escape(letter)
     return phonemes
 
+def compile_grapheme_trie(graphemes):
+    #String list -> dict
+    """Return a trie of graphemes: nested dicts keyed by letter, where the key None holds the grapheme ending there."""
+    trie = {}
+    for grapheme in graphemes:
+        node = trie
+        for letter in grapheme:
+            node = node.setdefault(letter, {})
+        node[None] = grapheme
+    return trie
+
+@functools.lru_cache(maxsize=SEGMENT_CACHE_SIZE)
+def segment_word(word):
+    #String -> tuple
+    """Split word into graphemes, e.g. ship into sh, i, p.
+    
+    The word is read once from the start, taking the longest grapheme in graphemeTrie at each
+    letter. Characters that do not start a grapheme, such as punctuation, are kept on their own.
+    """
+    lower = word.lower()
+    segments = []
+    start = 0
+    while start < len(lower):
+        node = graphemeTrie
+        end = start + 1
+        for position in range(start, len(lower)):
+            node = node.get(lower[position])
+            if node is None:
+                break
+            if None in node:
+                end = position + 1
+        segments.append(word[start:end])
+        start = end
+    return tuple(segments)
+
+def get_phoneme_audio(grapheme):
+    #String -> String
+    """Return an SSML audio tag playing the clip of the phonics sound of grapheme, None if there is no clip."""
+    grapheme = grapheme.lower()
+    if PHONEME_AUDIO_PREFIX is None or get_phonemes(grapheme) is None:
+        return None
+    url = create_presigned_url(get_phoneme_audio_key(grapheme))
+    if url is None:
+        return None
+    return '<audio src="{}"/>'.format(escape(url, {'"': "&quot;"}))
 
 def get_phonetic_spelling(word):
     #String -> String
-    """ This function will take a given word and construct a phonetic spelling which is the combination of phonetic sound of each letter in the word."""
-    spelling = ""
-    for letter in word:
-        spelling = spelling + get_phoenetics_for_letter(letter) +" <break time ='0.3s'></break>" 
-    return spelling
+    """ This function will take a given word and construct a phonetic spelling which is the combination of phonetic sound of each grapheme in the word.
+    
+    If PHONEME_AUDIO_PREFIX is set the sounds are played from the recorded clips, so they sound the same
+    every time. Words with more sounds than Alexa will play clips for in one response use the text sounds.
+    """
+    graphemes = segment_word(word)
+    if PHONEME_AUDIO_PREFIX is not None and sum(1 for grapheme in graphemes if get_phonemes(grapheme)) <= MAX_AUDIO_CLIPS:
+        phonemes = (get_phoneme_audio(grapheme) or get_phoenetics_for_letter(grapheme) for grapheme in graphemes)
+    else:
+        phonemes = (get_phoenetics_for_letter(grapheme) for grapheme in graphemes)
+    return "".join(phoneme + " <break time ='0.3s'></break>" for phoneme in phonemes if phoneme)
 
 
 
@@ -144,3 +797,48 @@ letterPhonemeDict = {
     "y": "yuh",
     "z": "zzizz"
 }
+
+#This Python Dictionary holds the phonics sound of groups of letters (digraphs and trigraphs) that make one sound.
+#Where a word could be split more than one way, the longest group is used, e.g. igh before i.
+graphemePhonemeDict = {
+    "sh": "shh",
+    "ch": "chuh",
+    "tch": "chuh",
+    "th": "thh",
+    "wh": "wuh",
+    "ph": "fuh",
+    "ng": "ng",
+    "ck": "cuh",
+    "qu": "kwuh",
+    "dge": "juh",
+    "ee": "eee",
+    "ea": "eee",
+    "oo": "ooo",
+    "ai": "ay",
+    "ay": "ay",
+    "oa": "oh",
+    "ow": "ow",
+    "ou": "ow",
+    "oi": "oy",
+    "oy": "oy",
+    "ar": "ar",
+    "or": "or",
+    "er": "er",
+    "ir": "er",
+    "ur": "er",
+    "igh": "eye",
+    "air": "air",
+    "ear": "ear",
+    "ure": "yoor",
+    "ough": "off",
+}
+
+#Every grapheme the phonics sounds are known for, compiled once for segment_word
+graphemeTrie = compile_grapheme_trie(list(letterPhonemeDict) + list(graphemePhonemeDict))
+
+#Names used when spelling out punctuation letter by letter. These are silent in phonetic spellings.
+symbolNameDict = {
+    "-": "hyphen",
+    "'": "apostrophe",
+    ".": "dot"
+}
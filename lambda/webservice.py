@@ -0,0 +1,139 @@
+"""Runs the skill as a web service on our own hosts, e.g. behind a load balancer, instead of in Lambda.
+
+`application` is a WSGI application around the same skill builder as lambda_handler. Each request's
+signature and timestamp are checked as Alexa requires of skills hosted as web services. Turn
+either check off with SKILL_VERIFY_SIGNATURE=false or SKILL_VERIFY_TIMESTAMP=false, e.g. for local
+testing. Any WSGI server can run it (e.g. gunicorn webservice:application), or it can be run with
+the pre-forked server below:
+
+    python lambda/webservice.py [--host HOST] [--port PORT] [--workers N]
+
+The server loads the skill once, then forks the worker processes, which share its listening socket.
+A worker that dies is replaced. Data is kept in DynamoDB, or with PERSISTENCE_BACKEND=local in a
+SQLite file shared by the workers (see local_persistence).
+"""
+import argparse
+import json
+import logging
+import os
+import signal
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+
+from ask_sdk_core.exceptions import AskSdkException, SerializationException
+from ask_sdk_webservice_support.verifier import VerificationException
+from ask_sdk_webservice_support.webservice_handler import WebserviceSkillHandler
+
+import local_persistence
+import persistence
+
+#Where the skill keeps its data: dynamodb, or local for a SQLite file at PERSISTENCE_LOCAL_PATH
+PERSISTENCE_BACKEND = os.environ.get('PERSISTENCE_BACKEND', 'dynamodb').lower()
+if PERSISTENCE_BACKEND == "local":
+    #replaced before lambda_function builds the skill with it
+    persistence.persistence_adapter = local_persistence.LocalPersistenceAdapter()
+elif PERSISTENCE_BACKEND != "dynamodb":
+    raise ValueError("Unknown persistence backend: {}".format(PERSISTENCE_BACKEND))
+#the requests of a session can go to any worker, and a worker would not see items another one wrote
+#in its own cache, so items are always read from the store
+persistence.persistence_adapter.cache = persistence.ItemCache(size=0)
+
+import lambda_function
+
+VERIFY_SIGNATURE = os.environ.get('SKILL_VERIFY_SIGNATURE', 'true').lower() != 'false'
+VERIFY_TIMESTAMP = os.environ.get('SKILL_VERIFY_TIMESTAMP', 'true').lower() != 'false'
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+skill_handler = WebserviceSkillHandler(lambda_function.sb.create(), verify_signature=VERIFY_SIGNATURE,
+                                       verify_timestamp=VERIFY_TIMESTAMP)
+
+
+def application(environ, start_response):
+    """WSGI entry point: verify and handle a request envelope POSTed by Alexa."""
+    if environ["REQUEST_METHOD"] != "POST":
+        return _respond(start_response, "405 Method Not Allowed", b"", [("Allow", "POST")])
+    body = environ["wsgi.input"].read(int(environ.get("CONTENT_LENGTH") or 0))
+    #the verifier looks headers up without regard to case, e.g. SignatureCertChainUrl and Signature-256
+    headers = dict((name[5:].replace("_", "-"), value) for name, value in environ.items() if name.startswith("HTTP_"))
+    try:
+        response = skill_handler.verify_request_and_dispatch(headers, body.decode("utf-8"))
+    except (VerificationException, SerializationException, UnicodeDecodeError) as e:
+        logger.warning("Rejected request: %s", e)
+        return _respond(start_response, "400 Bad Request", b"")
+    except AskSdkException as e:
+        logger.error(e, exc_info=True)
+        return _respond(start_response, "500 Internal Server Error", b"")
+    return _respond(start_response, "200 OK", json.dumps(response).encode("utf-8"),
+                    [("Content-Type", "application/json;charset=UTF-8")])
+
+
+def _respond(start_response, status, body, headers=()):
+    start_response(status, [("Content-Length", str(len(body)))] + list(headers))
+    return [body]
+
+
+class _Server(WSGIServer):
+    #connections wait here while every worker is busy, the default of 5 is too few behind a load balancer
+    request_queue_size = 128
+
+
+class _QuietRequestHandler(WSGIRequestHandler):
+    """Leaves access logs to the load balancer, so workers do not spend time writing them."""
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(host, port, workers):
+    #str, int, int -> None
+    """Serve application on host:port with workers pre-forked processes until SIGTERM or SIGINT."""
+    server = make_server(host, port, application, server_class=_Server, handler_class=_QuietRequestHandler)
+    children = set()
+    stopping = []
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            try:
+                server.serve_forever()
+            finally:
+                os._exit(0)
+        children.add(pid)
+
+    def stop(signum, frame):
+        stopping.append(signum)
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for _ in range(workers):
+        spawn()
+    logger.info("Serving on %s:%d with %d workers", host, port, workers)
+    while children:
+        try:
+            pid, _ = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        children.discard(pid)
+        if not stopping:
+            logger.warning("Worker %d exited, starting another", pid)
+            spawn()
+    server.server_close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig()
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="0.0.0.0", help="address to listen on")
+    parser.add_argument("--port", type=int, default=8080, help="port to listen on")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="worker processes, one per core by default")
+    args = parser.parse_args()
+    serve(args.host, args.port, args.workers)
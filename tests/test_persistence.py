@@ -0,0 +1,150 @@
+"""Tests of TrackedAttributes and of saving items against the in-memory DynamoDB stand-in.
+
+Run with: python -m pytest tests   (or python -m unittest discover tests)
+"""
+import os
+import sys
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(ROOT, "lambda"), os.path.join(ROOT, "benchmarks")]
+
+import persistence
+from fakes import InMemoryDynamoDbResource
+from persistence import PersistenceConflictException, TrackedAttributes
+
+KEY = "user#sam#stats"
+
+
+class TrackedAttributesTest(unittest.TestCase):
+    def test_counters_and_entries_are_not_changed_keys(self):
+        attributes = TrackedAttributes({"report": {"a": 1}, "schedule": {}}, exists=True)
+        attributes.increment(("report", "a"), 2)
+        attributes.set_entry(("schedule", "a"), [3, 2])
+        self.assertEqual(attributes.changed_keys(), [])
+        self.assertEqual(attributes.increments, {("report", "a"): 2})
+        self.assertEqual(attributes.entries, {("schedule", "a"): [3, 2]})
+
+    def test_rebase_merges_entries_changed_on_both_sides(self):
+        attributes = TrackedAttributes({"profiles": {"sam": {"userName": "Sam"}}}, exists=True, version=1)
+        attributes["profiles"]["alex"] = {"userName": "Alex"}
+        newer = TrackedAttributes({"profiles": {"sam": {"userName": "Sam"}, "kim": {"userName": "Kim"}}},
+                                  exists=True, version=2)
+        self.assertEqual(attributes.rebase(newer), [])
+        self.assertEqual(sorted(attributes["profiles"]), ["alex", "kim", "sam"])
+        self.assertEqual(attributes.version, 2)
+
+    def test_rebase_reports_an_entry_changed_differently_on_both_sides(self):
+        attributes = TrackedAttributes({"profiles": {"sam": {"userName": "Sam"}}}, exists=True)
+        attributes["profiles"]["sam"]["userName"] = "Samuel"
+        newer = TrackedAttributes({"profiles": {"sam": {"userName": "Sammy"}}}, exists=True)
+        self.assertEqual(attributes.rebase(newer), ["profiles"])
+        #nothing is changed when there is a conflict
+        self.assertEqual(attributes["profiles"]["sam"]["userName"], "Samuel")
+
+    def test_rebase_redoes_counters_inside_a_merged_map(self):
+        attributes = TrackedAttributes({"report": {"a": 1, "b": 0}}, exists=True)
+        attributes.increment(("report", "a"))
+        attributes["report"]["c"] = 0
+        newer = TrackedAttributes({"report": {"a": 5, "b": 2}}, exists=True)
+        self.assertEqual(attributes.rebase(newer), [])
+        self.assertEqual(attributes["report"], {"a": 6, "b": 2, "c": 0})
+
+    def test_rebase_builds_derived_attributes_again(self):
+        persistence.derived_attributes["top"] = lambda attributes: max(attributes["report"], key=attributes["report"].get)
+        self.addCleanup(persistence.derived_attributes.pop, "top")
+        attributes = TrackedAttributes({"report": {"a": 1, "b": 1}, "top": "a"}, exists=True)
+        attributes.increment(("report", "b"))
+        attributes["top"] = "b"
+        newer = TrackedAttributes({"report": {"a": 4, "b": 1}, "top": "a"}, exists=True)
+        self.assertEqual(attributes.rebase(newer), [])
+        self.assertEqual(attributes["top"], "a")
+
+    def test_discard_after_extend_only_drops_the_new_value(self):
+        attributes = TrackedAttributes({"words": ["a", "b"]}, exists=True)
+        attributes.extend("words", ["c"])
+        attributes.discard("words", ["c"])
+        self.assertEqual(attributes["words"], ["a", "b"])
+        self.assertEqual(attributes.list_changes([], []), ({}, {}))
+
+    def test_list_extended_and_discarded_is_written_whole(self):
+        attributes = TrackedAttributes({"words": ["a", "b"]}, exists=True)
+        attributes.extend("words", ["c"])
+        attributes.discard("words", ["a"])
+        changed = attributes.changed_keys()
+        self.assertEqual(attributes.list_changes(changed, []), ({}, {}))
+        self.assertEqual(changed, ["words"])
+
+    def test_discard_drops_counters_and_entries_of_the_member(self):
+        attributes = TrackedAttributes({"report": {"a": 1}, "schedule": {"a": [1, 1]}}, exists=True)
+        attributes.increment(("report", "a"))
+        attributes.set_entry(("schedule", "a"), [2, 2])
+        attributes.discard("report", ["a"])
+        attributes.discard("schedule", ["a"])
+        self.assertEqual((attributes.increments, attributes.entries), ({}, {}))
+        self.assertEqual(attributes.list_changes([], []), ({}, {"report": ["a"], "schedule": ["a"]}))
+
+
+class SaveItemTest(unittest.TestCase):
+    def setUp(self):
+        resource = InMemoryDynamoDbResource()
+        persistence.configure(resource)
+        self.table = resource.Table(persistence.persistence_adapter.table_name or persistence.ddb_table_name)
+        self.adapter = self.new_adapter()
+        self.adapter.save_item(KEY, TrackedAttributes(
+            {"report": {"a": 0, "b": 0}, "schedule": {}, "words": ["a", "b"]}, exists=False))
+
+    def new_adapter(self):
+        #-> DynamoDbPersistenceAdapter
+        """An adapter that does not cache, standing in for another Lambda container."""
+        return persistence.DynamoDbPersistenceAdapter(cache=persistence.ItemCache(size=0))
+
+    def stored(self):
+        return self.table.items[KEY]["attributes"]
+
+    def test_counters_saved_by_two_sessions_add_up(self):
+        first, second = self.adapter.get_item(KEY), self.new_adapter().get_item(KEY)
+        first.increment(("report", "a"))
+        second.increment(("report", "a"), 2)
+        second.increment(("report", "b"))
+        self.new_adapter().save_item(KEY, second)
+        self.adapter.save_item(KEY, first)
+        self.assertEqual(self.stored()["report"], {"a": 3, "b": 1})
+
+    def test_entries_set_by_two_sessions_are_both_kept(self):
+        first, second = self.adapter.get_item(KEY), self.new_adapter().get_item(KEY)
+        first.set_entry(("schedule", "a"), [2, 2])
+        second.set_entry(("schedule", "b"), [1, 1])
+        self.new_adapter().save_item(KEY, second)
+        self.adapter.save_item(KEY, first)
+        self.assertEqual(self.stored()["schedule"], {"a": [2, 2], "b": [1, 1]})
+        self.assertEqual(self.table.calls.get("put_item"), 1)
+
+    def test_counter_inside_a_value_written_whole_is_not_added_twice(self):
+        attributes = self.adapter.get_item(KEY)
+        attributes.increment(("report", "a"))
+        attributes["report"]["c"] = 0
+        self.adapter.save_item(KEY, attributes)
+        self.assertEqual(self.stored()["report"], {"a": 1, "b": 0, "c": 0})
+
+    def test_values_set_by_two_sessions_conflict(self):
+        first, second = self.adapter.get_item(KEY), self.new_adapter().get_item(KEY)
+        first["words"] = ["x"]
+        second["words"] = ["y"]
+        self.new_adapter().save_item(KEY, second)
+        with self.assertRaises(PersistenceConflictException):
+            self.adapter.save_item(KEY, first)
+        self.assertEqual(self.stored()["words"], ["y"])
+
+    def test_saving_again_writes_nothing(self):
+        attributes = self.adapter.get_item(KEY)
+        attributes.increment(("report", "a"))
+        self.adapter.save_item(KEY, attributes)
+        updates = self.table.calls.get("update_item", 0)
+        self.adapter.save_item(KEY, attributes)
+        self.assertEqual(self.table.calls.get("update_item", 0), updates)
+        self.assertEqual(self.stored()["report"]["a"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,108 @@
+"""Tests of whole conversations with the skill, against the in-memory DynamoDB stand-in.
+
+Run with: python -m pytest tests   (or python -m unittest discover tests)
+"""
+import os
+import re
+import sys
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(ROOT, "lambda"), os.path.join(ROOT, "benchmarks")]
+
+import lambda_function
+import persistence
+import utils
+from envelopes import DEFAULT_USER_ID, build_request
+from fakes import InMemoryDynamoDbResource, seed_user
+
+
+class SkillTest(unittest.TestCase):
+    def setUp(self):
+        resource = InMemoryDynamoDbResource()
+        persistence.configure(resource)
+        self.table = resource.Table(persistence.persistence_adapter.table_name or persistence.ddb_table_name)
+        self.session_attributes = {}
+
+    def send(self, request_type, intent_name=None, slots=None):
+        #str, str, dict -> str
+        """Send one request in the current session and return the speech of the response."""
+        output = lambda_function.lambda_handler(
+            build_request(request_type, intent_name, slots, self.session_attributes), None)
+        self.session_attributes = output.get("sessionAttributes") or {}
+        return output["response"].get("outputSpeech", {}).get("ssml", "")
+
+    def attributes(self, name):
+        #str -> dict
+        """Return the stored attributes of the user's item name, e.g. 'sam#words', or '' for the account."""
+        key = "#".join(part for part in (DEFAULT_USER_ID, name) if part)
+        return self.table.items[key]["attributes"]
+
+    def test_new_user_is_asked_who_is_practising_before_adding_words(self):
+        speech = self.send("IntentRequest", "AddSpellingIntent", {"words": "ship train"})
+        self.assertIn("who is practising", speech)
+        self.assertEqual(self.session_attributes["state"], "ADDUSER")
+        self.send("IntentRequest", "GetUsernameIntent", {"userName": "Sam"})
+        self.send("IntentRequest", "AddSpellingIntent", {"words": "ship train"})
+        self.assertEqual(self.attributes("sam#words")["words"], ["ship", "train"])
+
+    def test_every_intent_before_a_profile_is_answered(self):
+        for intent_name in ("RemoveSpellingIntent", "BeginQuizIntent", "BeginMarkingIntent",
+                            "ChildPractiseReportIntent", "MostIncorrectWordIntent", "ClearSpellingListIntent"):
+            speech = self.send("IntentRequest", intent_name)
+            self.assertNotIn("Sorry", speech, intent_name)
+
+    def test_answering_again_after_the_last_word_does_not_mark_it_twice(self):
+        self.send("LaunchRequest")
+        self.send("IntentRequest", "GetUsernameIntent", {"userName": "Sam"})
+        self.send("IntentRequest", "AddSpellingIntent", {"words": "ship train boat"})
+        self.send("IntentRequest", "BeginMarkingIntent")
+        self.send("IntentRequest", "ConfirmWordIntent", {"yesNo": "yes"})
+        self.send("IntentRequest", "TellAnswerIntent")
+        self.send("IntentRequest", "ConfirmWordIntent", {"yesNo": "yes"})
+        self.send("IntentRequest", "TellAnswerIntent")
+        self.send("IntentRequest", "ConfirmWordIntent", {"yesNo": "no"})
+        stats, history = self.attributes("sam#stats"), self.attributes("sam#history")
+        self.send("IntentRequest", "ConfirmWordIntent", {"yesNo": "no"})
+        self.assertEqual((self.attributes("sam#stats"), self.attributes("sam#history")), (stats, history))
+        self.assertEqual([value for key, value in history["resultDays"].items() if key.endswith("/marked")], [3])
+        self.assertEqual(len([key for key in self.table.items if "#result#" in key]), 1)
+        self.assertEqual(self.session_attributes["correctAnswers"], 2)
+
+    def report(self):
+        #-> list
+        """Return the words of the report in the order they are spoken, asking for more until the end."""
+        speech = self.send("IntentRequest", "ChildPractiseReportIntent")
+        words = re.findall(r"the word (\w+) wrong", speech)
+        while "reportCursor" in self.session_attributes:
+            words += re.findall(r"the word (\w+) wrong", self.send("IntentRequest", "AMAZON.MoreIntent"))
+        return words
+
+    def test_report_pages_follow_the_saved_report(self):
+        report = dict(("word{:02}".format(i), 1 + i % 4) for i in range(23))
+        seed_user(DEFAULT_USER_ID, "Sam", sorted(report), report, 1)
+        self.send("LaunchRequest")
+        #the first report also saves the topMissed index, the second is read from the saved stats
+        for _ in range(2):
+            self.assertEqual(self.report(), sorted(report, key=lambda word: (-report[word], word)))
+        #another session saves more misses
+        item = self.table.items[DEFAULT_USER_ID + "#sam#stats"]
+        item["attributes"]["wordReport"] = report = dict((word, 5 - misses) for word, misses in report.items())
+        item["attributes"]["topMissed"] = utils.build_top_missed(item["attributes"])
+        item["version"] += 1
+        persistence.persistence_adapter.cache.clear()
+        self.assertEqual(self.report(), sorted(report, key=lambda word: (-report[word], word)))
+
+    def test_legacy_item_without_a_name_moves_into_the_first_profile(self):
+        self.table.put_item(Item={"id": DEFAULT_USER_ID, "attributes": {
+            "words": ["cat"], "wordReport": {"cat": 2}, "testAttempts": 1}})
+        self.send("LaunchRequest")
+        self.send("IntentRequest", "GetUsernameIntent", {"userName": "Bo"})
+        self.assertEqual(self.attributes("")["profiles"], {"bo": {"userName": "Bo"}})
+        self.assertNotIn("words", self.attributes(""))
+        self.assertEqual(self.attributes("bo#words")["words"], ["cat"])
+        self.assertEqual(self.attributes("bo#stats")["wordReport"], {"cat": 2})
+
+
+if __name__ == "__main__":
+    unittest.main()
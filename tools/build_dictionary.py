@@ -0,0 +1,44 @@
+"""Build the dictionary index the skill checks added words against.
+
+Reads a word list with one word per line, most common words first if near matches
+should be suggested in that order. Anything after the first space or tab on a line
+(e.g. a frequency count) is ignored, as are words the skill cannot spell out. The
+index is written to lambda/dictionary.idx, or the path given with --output, and is
+deployed with the skill's code.
+
+Usage: python tools/build_dictionary.py WORD_LIST [--output FILE]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "lambda"))
+
+import dictionary
+import utils
+
+
+def read_word_list(path):
+    #str -> iterator of str
+    """Yield the normalized words of the word list at path, in the order they are listed."""
+    with open(path, encoding="utf-8") as word_list:
+        for line in word_list:
+            fields = line.split()
+            word = utils.normalize_word(fields[0]) if fields else None
+            if word is not None:
+                yield word
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("path", help="word list, one word per line")
+    parser.add_argument("--output", default=dictionary.DICTIONARY_PATH, help="index file to write, DICTIONARY_PATH by default")
+    args = parser.parse_args()
+    started = time.perf_counter()
+    index = dictionary.build_index(read_word_list(args.path))
+    with open(args.output, "wb") as index_file:
+        index_file.write(index)
+    word_index = dictionary.WordIndex(args.output)
+    print("Wrote {} words ({} bytes) to {} in {:.2f}s".format(
+        len(word_index), len(index), args.output, time.perf_counter() - started))
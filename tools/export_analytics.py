@@ -0,0 +1,199 @@
+"""Offline export of spelling performance across every child in the skill's DynamoDB table.
+
+The table is read with parallel segmented scans and each item is passed through a
+pipeline of generators, so only a page of items per segment is held in memory whatever
+the size of the table. Misses and attempts are added up per word, so the aggregates grow
+with the number of different words practised, not the number of children.
+
+Writes to the output folder:
+    profiles.csv: test attempts, words and misses of each child, written as they are read
+    words.csv: misses and miss rate of each word, most missed first
+    word_lengths.csv: misses and miss rate by the number of letters in the word
+    letter_patterns.csv: misses and miss rate by the pattern of consonants and vowels (e.g. ship is CCVC)
+
+misses are the times the word was got wrong, from the children's reports. A test only asks
+some of a child's words, so the miss rate is worked out from the marking results instead
+(see utils.record_test_result): marked is the times the word was marked, missed the times it
+was got wrong then, and miss_rate is missed over marked. Results are deleted after
+persistence.record_ttl_days, so these only cover that many days.
+
+Usage: python tools/export_analytics.py OUTPUT_FOLDER [--segments N] [--page-size N]
+                                                      [--table NAME] [--endpoint-url URL]
+"""
+import argparse
+import csv
+import heapq
+import os
+import queue
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "lambda"))
+
+import persistence
+
+VOWELS = "aeiou"
+#Marks the end of a segment on the queue the scanning threads share
+_SEGMENT_DONE = object()
+
+
+def scan_table(adapter, segments=4, page_size=None):
+    #DynamoDbPersistenceAdapter, int, int -> iterator of (str, dict)
+    """Yield the key and attributes of every item, reading each segment of the table in its own thread.
+
+    The threads wait once a few pages are queued, so the table is read no faster than it is processed.
+    """
+    items = queue.Queue(maxsize=(page_size or 100) * segments)
+    errors = []
+
+    def scan_segment(segment):
+        try:
+            for item in adapter.scan_items(segment, segments, page_size):
+                items.put(item)
+        except Exception as e:
+            errors.append(e)
+        finally:
+            items.put(_SEGMENT_DONE)
+
+    for segment in range(segments):
+        threading.Thread(target=scan_segment, args=(segment,), daemon=True).start()
+    remaining = segments
+    while remaining:
+        item = items.get()
+        if item is _SEGMENT_DONE:
+            remaining -= 1
+        else:
+            yield item
+    if errors:
+        raise errors[0]
+
+
+def profile_stats(items):
+    #iterator of (str, dict) -> iterator of (str, str, int, dict)
+    """Yield the user id, profile id, test attempts and wordReport of each child's stats item.
+
+    Accounts saved before profiles were added keep their stats in the account item, these are
+    reported under the profile they will be moved to.
+    """
+    for key, attributes in items:
+        if key.endswith("#stats"):
+            user_id, profile_id, _ = key.rsplit("#", 2)
+        elif "#" not in key and "wordReport" in attributes and "profiles" not in attributes:
+            user_id, profile_id = key, persistence.profile_id_for(attributes.get("userName") or "")
+        else:
+            continue
+        yield user_id, profile_id, int(attributes.get("testAttempts", 0)), attributes.get("wordReport", {})
+
+
+def add_results(items, aggregates):
+    #iterator of (str, dict), Aggregates -> iterator of (str, dict)
+    """Add the marking results among items to aggregates, and yield the other items."""
+    for key, attributes in items:
+        #user id#profile id#result#time#number, see persistence.ShardedAttributes.append
+        if key.rsplit("#", 3)[1:2] == ["result"]:
+            aggregates.add_result(attributes.get("marked", []), attributes.get("missed", []))
+        else:
+            yield key, attributes
+
+
+def letter_pattern(word):
+    #str -> str
+    """Return the consonant and vowel pattern of word, e.g. CCVC for ship. Punctuation is kept as it is."""
+    return "".join("V" if letter in VOWELS else "C" if letter.isalpha() else letter for letter in word)
+
+
+class Aggregates(object):
+    """Misses, and times marked and missed in the marking results, per word, from which the totals
+    per word length and letter pattern are worked out.
+    """
+    def __init__(self):
+        #word -> [misses, marked, missed]
+        self.words = {}
+        self.profiles = 0
+        self.results = 0
+
+    def _counts(self, word):
+        #str -> list
+        counts = self.words.get(word)
+        if counts is None:
+            counts = self.words[word] = [0, 0, 0]
+        return counts
+
+    def add(self, word_report):
+        #dict -> None
+        self.profiles += 1
+        for word, misses in word_report.items():
+            self._counts(word)[0] += int(misses)
+
+    def add_result(self, marked_words, missed_words):
+        #str list, str list -> None
+        self.results += 1
+        for word in marked_words:
+            self._counts(word)[1] += 1
+        for word in missed_words:
+            self._counts(word)[2] += 1
+
+    def totals_by(self, key):
+        #function -> dict
+        """Add up the counts of the words that key maps to the same value."""
+        totals = {}
+        for word, counts in self.words.items():
+            total = totals.setdefault(key(word), [0, 0, 0])
+            for index, count in enumerate(counts):
+                total[index] += count
+        return totals
+
+
+def miss_rate(missed, marked):
+    #int, int -> str
+    return "{:.3f}".format(missed / float(marked)) if marked else ""
+
+
+def write_totals(path, heading, rows):
+    #str, str, iterable of (key, [misses, marked, missed]) -> None
+    with open(path, "w", newline="") as totals_file:
+        writer = csv.writer(totals_file)
+        writer.writerow([heading, "misses", "marked", "missed", "miss_rate"])
+        for key, (misses, marked, missed) in rows:
+            writer.writerow([key, misses, marked, missed, miss_rate(missed, marked)])
+
+
+def export_analytics(adapter, output, segments=4, page_size=None):
+    #DynamoDbPersistenceAdapter, str, int, int -> Aggregates
+    """Scan the table, write the CSV files to the output folder and return the aggregates."""
+    os.makedirs(output, exist_ok=True)
+    aggregates = Aggregates()
+    with open(os.path.join(output, "profiles.csv"), "w", newline="") as profiles_file:
+        writer = csv.writer(profiles_file)
+        writer.writerow(["userId", "profile", "test_attempts", "words", "misses"])
+        items = add_results(scan_table(adapter, segments, page_size), aggregates)
+        for user_id, profile_id, test_attempts, word_report in profile_stats(items):
+            writer.writerow([user_id, profile_id, test_attempts, len(word_report),
+                             sum(int(misses) for misses in word_report.values())])
+            aggregates.add(word_report)
+    write_totals(os.path.join(output, "words.csv"), "word",
+                 sorted(aggregates.words.items(), key=lambda t: t[1][0], reverse=True))
+    write_totals(os.path.join(output, "word_lengths.csv"), "length", sorted(aggregates.totals_by(len).items()))
+    write_totals(os.path.join(output, "letter_patterns.csv"), "pattern",
+                 sorted(aggregates.totals_by(letter_pattern).items(), key=lambda t: t[1][0], reverse=True))
+    return aggregates
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("output", help="folder to write the CSV files to")
+    parser.add_argument("--segments", type=int, default=4, help="number of segments scanned at the same time")
+    parser.add_argument("--page-size", type=int, help="items read in each scan request")
+    parser.add_argument("--table", default=persistence.ddb_table_name, help="DynamoDB table, DYNAMODB_PERSISTENCE_TABLE_NAME by default")
+    parser.add_argument("--endpoint-url", help="DynamoDB endpoint, e.g. http://localhost:8000 for DynamoDB Local")
+    args = parser.parse_args()
+    if args.endpoint_url:
+        persistence.configure(endpoint_url=args.endpoint_url)
+    started = time.perf_counter()
+    aggregates = export_analytics(persistence.DynamoDbPersistenceAdapter(table_name=args.table),
+                                  args.output, args.segments, args.page_size)
+    print("Exported {} profiles, {} marking results and {} words in {:.2f}s".format(
+        aggregates.profiles, aggregates.results, len(aggregates.words), time.perf_counter() - started))
+    for word, (misses, marked, missed) in heapq.nlargest(10, aggregates.words.items(), key=lambda t: t[1][0]):
+        print("{:<20} {:>8} misses, {:>8} of the last {:>8} times marked".format(word, misses, missed, marked))
@@ -0,0 +1,67 @@
+"""Record a clip of the phonics sound of each grapheme and upload it to the skill's S3 bucket.
+
+Each entry in utils.letterPhonemeDict and utils.graphemePhonemeDict is spoken by Amazon
+Polly and stored as PREFIX<grapheme>.mp3 in the MP3 format Alexa plays in SSML <audio> tags. Clips whose
+text and voice have not changed since they were uploaded are skipped, so the tool
+can be run again after the dictionary changes. Set PHONEME_AUDIO_PREFIX to the same
+prefix in the skill's environment to play the clips in phonetic spellings.
+
+Usage: python tools/generate_phoneme_audio.py [--bucket NAME] [--prefix PREFIX] [--voice NAME]
+"""
+import argparse
+import hashlib
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "lambda"))
+
+import utils
+
+DEFAULT_PREFIX = "phonemes/"
+DEFAULT_VOICE = "Amy"
+#Alexa only plays MP3 clips sampled at 16000, 22050 or 24000 Hz
+SAMPLE_RATE = "24000"
+
+
+def phoneme_ssml(phoneme):
+    #str -> str
+    return '<speak><prosody rate="slow">{}</prosody></speak>'.format(phoneme)
+
+
+def generate_phoneme_audio(polly, s3, bucket, prefix=DEFAULT_PREFIX, voice=DEFAULT_VOICE):
+    #Polly.Client, S3.Client, str, str, str -> (int, int)
+    """Upload a clip for every grapheme whose clip is missing or out of date.
+
+    Returns the number of clips uploaded and the number that were already up to date.
+    """
+    from botocore.exceptions import ClientError
+    uploaded = skipped = 0
+    graphemes = dict(utils.letterPhonemeDict, **utils.graphemePhonemeDict)
+    for grapheme, phoneme in sorted(graphemes.items()):
+        ssml = phoneme_ssml(phoneme)
+        source = hashlib.sha256("{}\n{}\n{}".format(voice, SAMPLE_RATE, ssml).encode("utf-8")).hexdigest()
+        key = "{}{}.mp3".format(prefix, grapheme)
+        try:
+            if s3.head_object(Bucket=bucket, Key=key).get("Metadata", {}).get("source") == source:
+                skipped += 1
+                continue
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") not in ("404", "NoSuchKey"):
+                raise
+        speech = polly.synthesize_speech(Text=ssml, TextType="ssml", OutputFormat="mp3",
+                                         SampleRate=SAMPLE_RATE, VoiceId=voice)
+        s3.put_object(Bucket=bucket, Key=key, Body=speech["AudioStream"].read(),
+                      ContentType="audio/mpeg", Metadata={"source": source})
+        uploaded += 1
+    return uploaded, skipped
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--bucket", default=os.environ.get("S3_PERSISTENCE_BUCKET"), help="S3 bucket, S3_PERSISTENCE_BUCKET by default")
+    parser.add_argument("--prefix", default=os.environ.get("PHONEME_AUDIO_PREFIX", DEFAULT_PREFIX), help="folder in the bucket for the clips")
+    parser.add_argument("--voice", default=DEFAULT_VOICE, help="Amazon Polly voice to record the clips with")
+    args = parser.parse_args()
+    import boto3
+    uploaded, skipped = generate_phoneme_audio(boto3.client("polly"), utils.get_s3_client(), args.bucket, args.prefix, args.voice)
+    print("Uploaded {} clips, {} were already up to date".format(uploaded, skipped))
@@ -0,0 +1,300 @@
+"""Bulk import of pupils' word lists into the skill's DynamoDB table.
+
+Reads word lists from a CSV file with the columns userId, child and words (the words
+separated by spaces, as they are when added with AddSpellingIntent) or from a JSON file
+holding a list of objects with the same keys, or one object per line. Each list replaces
+the word list of that child's profile and resets their report, as if the list had been
+cleared and the words added by voice. Profiles that do not exist yet are created.
+
+Lists are read from the file as they are needed, a row or, for a JSON array, a chunk at a
+time, so large files are never held in memory. The file is read twice: the first pass adds
+any new profiles to the users' accounts, reading them BATCH_GET_SIZE at a time, the second
+writes the word lists in BatchWriteItem requests sent by a bounded pool of threads.
+Rows that cannot be imported are reported (and written to --rejects if given) and skipped.
+
+Usage: python tools/import_word_lists.py FILE [--format csv|json] [--workers N]
+                                              [--table NAME] [--endpoint-url URL]
+                                              [--rejects FILE]
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "lambda"))
+
+import persistence
+import utils
+from ask_sdk_core.exceptions import PersistenceException
+
+#Characters of a JSON array read at a time, see read_json_array
+JSON_CHUNK_SIZE = 1 << 16
+
+
+class ImportReport(object):
+    """Counts of what an import did and how long it took."""
+    def __init__(self, rejects=None):
+        self.rejects = rejects
+        self.rows = 0
+        self.lists = 0
+        self.words = 0
+        self.rejected_rows = 0
+        self.rejected_words = 0
+        self.accounts = 0
+        self.items_written = 0
+        self.started = time.perf_counter()
+
+    def reject(self, line, reason, value=""):
+        #int, str, str -> None
+        if self.rejects is not None:
+            self.rejects.writerow([line, reason, value])
+
+    def print_summary(self):
+        elapsed = time.perf_counter() - self.started
+        print("Read {} rows in {:.2f}s".format(self.rows, elapsed))
+        print("Imported {} word lists ({} words) for {} accounts, {:.0f} lists/s".format(
+            self.lists, self.words, self.accounts, self.lists / elapsed if elapsed else 0))
+        print("Wrote {} items".format(self.items_written))
+        print("Rejected {} rows and {} words".format(self.rejected_rows, self.rejected_words))
+
+
+def read_rows(path, file_format):
+    #str, str -> iterator of (int, dict)
+    """Yield the line number and contents of each row in a CSV or JSON file."""
+    with open(path, newline="") as rows_file:
+        if file_format == "csv":
+            reader = csv.DictReader(rows_file)
+            for row in reader:
+                yield reader.line_num, row
+            return
+        first = rows_file.read(1)
+        while first.isspace():
+            first = rows_file.read(1)
+        rows_file.seek(0)
+        if first == "[":
+            for index, row in enumerate(read_json_array(rows_file)):
+                yield index + 1, row
+            return
+        for line, text in enumerate(rows_file, 1):
+            if text.strip():
+                yield line, json.loads(text)
+
+
+def read_json_array(rows_file, chunk_size=JSON_CHUNK_SIZE):
+    #file, int -> iterator of object
+    """Yield the values of the JSON array in rows_file one at a time, reading the file a chunk at a time."""
+    decoder = json.JSONDecoder()
+    text, position, at_end = "", 0, False
+
+    def read_more():
+        nonlocal text, position, at_end
+        more = rows_file.read(chunk_size)
+        at_end = not more
+        #what has been read already is dropped, so only the value being read is held
+        text, position = text[position:] + more, 0
+
+    def next_character():
+        #-> str
+        nonlocal position
+        while True:
+            while position < len(text) and text[position].isspace():
+                position += 1
+            if position < len(text):
+                return text[position]
+            if at_end:
+                raise ValueError("JSON array is not closed")
+            read_more()
+
+    if next_character() != "[":
+        raise ValueError("File does not hold a JSON array")
+    position += 1
+    if next_character() == "]":
+        return
+    while True:
+        next_character()
+        #a number cut off by the end of a chunk decodes, but only as far as the end of the chunk
+        while True:
+            try:
+                value, end = decoder.raw_decode(text, position)
+                if at_end or text[end:].strip("0123456789.eE+-"):
+                    break
+            except ValueError:
+                if at_end:
+                    raise
+            read_more()
+        yield value
+        position = end
+        separator = next_character()
+        position += 1
+        if separator == "]":
+            return
+        if separator != ",":
+            raise ValueError("Expected , or ] between the values of the JSON array, found " + separator)
+
+
+def read_word_lists(path, file_format, report=None):
+    #str, str, ImportReport -> iterator of (str, str, str list)
+    """Yield the user id, child's name and normalized words of each list that can be imported.
+
+    Words the skill cannot spell out are dropped, repeated words are only kept once, and a
+    child listed more than once for the same user is only imported the first time.
+    """
+    seen = set()
+    for line, row in read_rows(path, file_format):
+        if report is not None:
+            report.rows += 1
+        if not isinstance(row, dict):
+            reason = "row is not an object"
+        else:
+            user_id = str(row.get("userId") or "").strip()
+            name = " ".join(str(row.get("child") or "").split())
+            words = row.get("words") or []
+            if isinstance(words, str):
+                words = words.split()
+            reason = None
+            if not user_id:
+                reason = "missing userId"
+            elif not name:
+                reason = "missing child"
+            elif (user_id, persistence.profile_id_for(name)) in seen:
+                reason = "child listed more than once"
+        if reason is None:
+            normalized = []
+            for word in words:
+                normalized_word = utils.normalize_word(str(word))
+                if normalized_word is None:
+                    if report is not None:
+                        report.rejected_words += 1
+                        report.reject(line, "word cannot be spelt", str(word))
+                elif normalized_word not in normalized:
+                    normalized.append(normalized_word)
+            if not normalized:
+                reason = "no words"
+        if reason is not None:
+            if report is not None:
+                report.rejected_rows += 1
+                report.reject(line, reason)
+            continue
+        seen.add((user_id, persistence.profile_id_for(name)))
+        yield user_id, name, normalized
+
+
+def add_profiles(adapter, accounts):
+    #DynamoDbPersistenceAdapter, dict -> None
+    """Add the profiles in accounts (user id -> {profile id -> child's name}) to the accounts that do not have them.
+
+    The accounts, at most BATCH_GET_SIZE of them, are read with one BatchGetItem request. Accounts
+    that do not exist yet are written BATCH_WRITE_SIZE at a time with BatchWriteItem, which cannot
+    check that the skill has not made the account in the moment since it was read. The accounts
+    that exist are updated one at a time with a version check, and only if a profile is missing.
+    """
+    stored = adapter.get_items(list(accounts))
+    new_accounts = []
+    for user_id, names in accounts.items():
+        attributes = stored[user_id]
+        if not attributes.exists:
+            new_accounts.append((user_id, {
+                "profiles": dict((profile_id, {"userName": name}) for profile_id, name in names.items()),
+                "activeProfile": next(iter(names)),
+            }))
+        elif not set(names) <= set(attributes.get("profiles", {})) or attributes.get("activeProfile") is None:
+            add_account_profiles(adapter, user_id, names)
+    for start in range(0, len(new_accounts), persistence.BATCH_WRITE_SIZE):
+        adapter.put_items(new_accounts[start:start + persistence.BATCH_WRITE_SIZE])
+
+
+def add_account_profiles(adapter, user_id, names):
+    #DynamoDbPersistenceAdapter, str, dict -> None
+    """Add the profiles in names (profile id -> child's name) to an account that does not have them."""
+    for attempt in range(persistence.max_write_attempts):
+        attributes = persistence.ShardedAttributes(adapter, user_id)
+        profiles = dict(attributes.get("profiles", {}))
+        for profile_id, name in names.items():
+            profiles.setdefault(profile_id, {"userName": name})
+        attributes["profiles"] = profiles
+        if attributes.get("activeProfile") is None:
+            attributes["activeProfile"] = next(iter(names))
+        try:
+            adapter.save_attributes(None, attributes)
+            return
+        except PersistenceException:
+            #the account was changed by the skill while it was being updated, read it again
+            if attempt == persistence.max_write_attempts - 1:
+                raise
+
+
+def import_word_lists(path, file_format, adapter, workers=16, rejects=None):
+    #str, str, DynamoDbPersistenceAdapter, int, csv.writer -> ImportReport
+    """Import every word list in the file at path and return a report of the import."""
+    report = ImportReport(rejects)
+    accounts = {}
+    for user_id, name, _ in read_word_lists(path, file_format):
+        accounts.setdefault(user_id, {})[persistence.profile_id_for(name)] = name
+    report.accounts = len(accounts)
+    accounts = list(accounts.items())
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for future in [pool.submit(add_profiles, adapter, dict(accounts[start:start + persistence.BATCH_GET_SIZE]))
+                       for start in range(0, len(accounts), persistence.BATCH_GET_SIZE)]:
+            future.result()
+
+        #a new list version that no open session can have seen, see utils.set_words
+        list_version = int(time.time() * 1000)
+        pending = set()
+        batch = []
+
+        def flush():
+            pending.add(pool.submit(adapter.put_items, list(batch)))
+            report.items_written += len(batch)
+            del batch[:]
+            #bound the number of batches waiting for a thread, so the file is read no faster than it is written
+            while len(pending) >= workers * 2:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    pending.discard(future)
+                    future.result()
+
+        for user_id, name, words in read_word_lists(path, file_format, report):
+            shards = persistence.ShardedAttributes(adapter, user_id)
+            profile_id = persistence.profile_id_for(name)
+            batch.append((shards.shard_key("words", profile_id), {"words": words, "listVersion": list_version}))
+            batch.append((shards.shard_key("stats", profile_id), {
+                "wordReport": dict((word, 0) for word in words),
+                "testAttempts": 0,
+                "topMissed": [],
+            }))
+            report.lists += 1
+            report.words += len(words)
+            if len(batch) > persistence.BATCH_WRITE_SIZE - 2:
+                flush()
+        if batch:
+            flush()
+        for future in pending:
+            future.result()
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("path", help="CSV or JSON file of word lists")
+    parser.add_argument("--format", choices=["csv", "json"], help="format of the file, taken from its extension if not given")
+    parser.add_argument("--workers", type=int, default=16, help="number of writes sent to DynamoDB at the same time")
+    parser.add_argument("--table", default=persistence.ddb_table_name, help="DynamoDB table, DYNAMODB_PERSISTENCE_TABLE_NAME by default")
+    parser.add_argument("--endpoint-url", help="DynamoDB endpoint, e.g. http://localhost:8000 for DynamoDB Local")
+    parser.add_argument("--rejects", help="write the line number and reason for every rejected row or word to this CSV file")
+    args = parser.parse_args()
+    if args.endpoint_url:
+        persistence.configure(endpoint_url=args.endpoint_url)
+    file_format = args.format or ("csv" if args.path.lower().endswith(".csv") else "json")
+    #other containers keep their own copies, so there is nothing for the importer to cache
+    adapter = persistence.DynamoDbPersistenceAdapter(table_name=args.table, cache=persistence.ItemCache(size=0))
+    rejects_file = open(args.rejects, "w", newline="") if args.rejects else None
+    try:
+        report = import_word_lists(args.path, file_format, adapter, args.workers,
+                                   csv.writer(rejects_file) if rejects_file is not None else None)
+    finally:
+        if rejects_file is not None:
+            rejects_file.close()
+    report.print_summary()
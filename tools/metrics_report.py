@@ -0,0 +1,107 @@
+"""Per-handler latency and DynamoDB usage report from the skill's metric log lines.
+
+Reads a log file holding the lines the skill writes in the CloudWatch embedded metric
+format (see lambda/metrics.py), e.g. exported from CloudWatch Logs or written by
+benchmarks/load_test.py --metrics. Other lines are skipped, and anything before the
+first "{" of a line, such as a timestamp added by the log export, is ignored.
+
+For each handler it prints the number of turns, cold starts and errors, p50/p95/p99
+handler time, the mean DynamoDB reads, writes and bytes, and the mean size of the
+response SSML, followed by a histogram of its handler times.
+
+Usage: python tools/metrics_report.py FILE [--state STATE] [--warm | --cold]
+"""
+import argparse
+import bisect
+import json
+import math
+import sys
+
+#Upper bounds in milliseconds of the histogram buckets, the last bucket has no upper bound
+BUCKETS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000]
+HISTOGRAM_WIDTH = 40
+
+
+def read_metrics(lines):
+    #iterable of str -> iterator of dict
+    """Yield each metric record in lines."""
+    for line in lines:
+        start = line.find("{")
+        if start < 0:
+            continue
+        try:
+            record = json.loads(line[start:])
+        except ValueError:
+            continue
+        if isinstance(record, dict) and "_aws" in record and "Handler" in record:
+            yield record
+
+
+def percentile(samples, percent):
+    #float list, int -> float
+    ordered = sorted(samples)
+    return ordered[max(0, int(math.ceil(percent / 100.0 * len(ordered))) - 1)]
+
+
+def mean(records, name):
+    #dict list, str -> float
+    return sum(record.get(name, 0) for record in records) / float(len(records))
+
+
+def histogram(times):
+    #float list -> str list
+    """Return the lines of a histogram of times in log-scale buckets."""
+    counts = [0] * (len(BUCKETS) + 1)
+    for time in times:
+        counts[bisect.bisect_left(BUCKETS, time)] += 1
+    lines = []
+    largest = max(counts)
+    for index, count in enumerate(counts):
+        label = "<= {} ms".format(BUCKETS[index]) if index < len(BUCKETS) else "> {} ms".format(BUCKETS[-1])
+        bar = "#" * int(math.ceil(HISTOGRAM_WIDTH * count / float(largest))) if count else ""
+        lines.append("  {:>11} {:>7} {}".format(label, count, bar))
+    return lines
+
+
+def report(records, out=sys.stdout):
+    #dict list, file -> None
+    by_handler = {}
+    for record in records:
+        by_handler.setdefault(record["Handler"], []).append(record)
+    out.write("{:<38} {:>6} {:>5} {:>5} {:>9} {:>9} {:>9} {:>6} {:>6} {:>9} {:>9} {:>7}\n".format(
+        "handler", "turns", "cold", "errs", "p50 ms", "p95 ms", "p99 ms",
+        "reads", "writes", "B read", "B written", "SSML B"))
+    for handler, turns in sorted(by_handler.items()):
+        times = [turn["HandlerTime"] for turn in turns]
+        out.write("{:<38} {:>6} {:>5} {:>5} {:>9.2f} {:>9.2f} {:>9.2f} {:>6.2f} {:>6.2f} {:>9.0f} {:>9.0f} {:>7.0f}\n".format(
+            handler, len(turns), sum(1 for turn in turns if turn.get("ColdStart")),
+            sum(1 for turn in turns if turn.get("Error")),
+            percentile(times, 50), percentile(times, 95), percentile(times, 99),
+            mean(turns, "PersistenceReads"), mean(turns, "PersistenceWrites"),
+            mean(turns, "BytesRead"), mean(turns, "BytesWritten"), mean(turns, "SsmlBytes")))
+    for handler, turns in sorted(by_handler.items()):
+        out.write("\n{}\n".format(handler))
+        for line in histogram([turn["HandlerTime"] for turn in turns]):
+            out.write(line + "\n")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("path", help="log file of metric lines, - for standard input")
+    parser.add_argument("--state", help="only report turns taken in this session state, e.g. TEST")
+    start = parser.add_mutually_exclusive_group()
+    start.add_argument("--warm", action="store_true", help="only report turns on a warm container")
+    start.add_argument("--cold", action="store_true", help="only report the first turn of each container")
+    args = parser.parse_args()
+    log_file = sys.stdin if args.path == "-" else open(args.path)
+    try:
+        records = [record for record in read_metrics(log_file)
+                   if (args.state is None or record.get("State") == args.state)
+                   and not (args.warm and record.get("ColdStart"))
+                   and not (args.cold and not record.get("ColdStart"))]
+    finally:
+        if log_file is not sys.stdin:
+            log_file.close()
+    if not records:
+        sys.exit("No metric lines found in " + args.path)
+    report(records)